@@ -0,0 +1,156 @@
+"""
+Query-plan benchmark for the hot dashboard / EMR export queries.
+
+Fills a scratch SQLite database (never the project database) with synthetic
+check-ins and questionnaires, then prints SQLite's plan and the median time of
+each query with the created_at indexes (migration 0002) and again without them.
+
+    python benchmark_query_plans.py                  # 1M check-ins
+    python benchmark_query_plans.py --rows 200000 --keep
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'llm_ppd.settings')
+sys.path.insert(0, os.path.dirname(__file__))
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--rows', type=int, default=1_000_000, help='DailyMoodCheckIn rows (default: 1,000,000)')
+parser.add_argument('--questionnaires', type=int, help='PostpartumQuestionnaire rows (default: rows / 10)')
+parser.add_argument('--users', type=int, default=1000, help='distinct user_identifier values (default: 1000)')
+parser.add_argument('--db', help='scratch SQLite file (default: a temporary file)')
+parser.add_argument('--keep', action='store_true', help='keep the scratch database afterwards')
+parser.add_argument('--repeat', type=int, default=5, help='timed runs per query (default: 5)')
+args = parser.parse_args()
+
+from django.conf import settings
+
+db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='llm_ppd_bench_'), 'bench.sqlite3')
+settings.DATABASES['default']['NAME'] = db_path
+django.setup()
+
+from django.core.management import call_command
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from web.models import DailyMoodCheckIn, DailyMoodRollup, PostpartumQuestionnaire
+from web.pdf_generator import partition_queryset, _month
+from web.rollups import _day_checkins, rebuild_all_rollups
+
+BATCH = 5000
+DAYS = 730
+
+print(f"Scratch database: {db_path}")
+call_command('migrate', verbosity=0)
+
+rng = random.Random(42)
+now = timezone.now()
+users = [f"user_{i:05d}" for i in range(args.users)]
+
+
+def _user():
+    # ~5% anonymous rows, split between NULL and ''
+    return rng.choice((None, '')) if rng.random() < 0.05 else rng.choice(users)
+
+
+def _created_at():
+    return now - timedelta(seconds=rng.randint(0, DAYS * 86400))
+
+
+def _fill(model_class, count, make):
+    if model_class.objects.count() >= count:
+        return
+    t0 = time.perf_counter()
+    for start in range(0, count, BATCH):
+        model_class.objects.bulk_create([make() for _ in range(min(BATCH, count - start))])
+    print(f"   {model_class.__name__}: {count:,} rows in {time.perf_counter() - t0:.1f}s")
+
+
+print("\nGenerating data...")
+_fill(DailyMoodCheckIn, args.rows, lambda: DailyMoodCheckIn(
+    created_at=_created_at(), user_identifier=_user(), mood_rating=rng.randint(1, 10),
+    hours_of_sleep=rng.choice(['less_than_3', '3_4', '4_5', '5_6', 'more_than_6']),
+    energy_level=rng.choice(['very_low', 'low', 'moderate', 'good', 'high']),
+    stress_level=rng.choice(['calm', 'slightly_stressed', 'moderately_stressed', 'very_stressed', 'overwhelmed']),
+    intrusive_thoughts=rng.choice(['no', 'mild', 'moderate', 'severe']),
+))
+_fill(PostpartumQuestionnaire, args.questionnaires or args.rows // 10, lambda: PostpartumQuestionnaire(
+    created_at=_created_at(), user_identifier=_user(),
+    **{f.name: rng.choice(f.choices)[0] for f in PostpartumQuestionnaire._meta.fields if f.name.startswith('q')},
+))
+if not DailyMoodRollup.objects.exists():
+    t0 = time.perf_counter()
+    print(f"   DailyMoodRollup: {rebuild_all_rollups():,} rows in {time.perf_counter() - t0:.1f}s")
+
+# A typical user and month, taken from the data
+user, month = users[0], _month(now - timedelta(days=45))
+today = timezone.localdate()
+day = DailyMoodCheckIn.objects.filter(user_identifier=user).values_list('created_at', flat=True).first()
+day = timezone.localtime(day).date()
+
+QUERIES = [
+    ('dashboard: latest 30 check-ins',
+     lambda: DailyMoodCheckIn.objects.order_by('-created_at')[:30]),
+    ('dashboard: latest 10 questionnaires',
+     lambda: PostpartumQuestionnaire.objects.order_by('-created_at')[:10]),
+    ('dashboard: daily totals of the last 4 weeks',
+     lambda: DailyMoodRollup.objects.filter(day__gte=today - timedelta(days=28)).order_by()
+     .values('day').annotate(n=Sum('checkin_count'), total=Sum('mood_total'))),
+    (f'export: check-ins of {user} in {month}',
+     lambda: partition_queryset(DailyMoodCheckIn, user, month).order_by('-created_at').values()),
+    (f'export: anonymous check-ins in {month}',
+     lambda: partition_queryset(DailyMoodCheckIn, None, month).order_by('-created_at').values()),
+    (f'export: questionnaires of {user} in {month}',
+     lambda: partition_queryset(PostpartumQuestionnaire, user, month).order_by('-created_at').values()),
+    (f'rollup rebuild: {user} on {day}',
+     lambda: _day_checkins(user, day)),
+    # The query behind list_partitions()
+    ('export: list check-in partitions',
+     lambda: DailyMoodCheckIn.objects.annotate(month=TruncMonth('created_at')).order_by()
+     .values_list('user_identifier', 'month').distinct()),
+]
+
+
+def measure():
+    timings = {}
+    for title, build in QUERIES:
+        runs = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            rows = list(build())
+            runs.append(time.perf_counter() - t0)
+        timings[title] = statistics.median(runs)
+        print(f"\n{title}  ({len(rows):,} rows, median {timings[title] * 1000:.1f} ms)")
+        for line in build().explain().splitlines():
+            print(f"   {line}")
+    return timings
+
+
+print("\n" + "=" * 70)
+print("With the created_at indexes")
+print("=" * 70)
+indexed = measure()
+
+call_command('migrate', 'web', '0001', verbosity=0)
+print("\n" + "=" * 70)
+print("Without them (migrated back to web 0001)")
+print("=" * 70)
+unindexed = measure()
+call_command('migrate', 'web', verbosity=0)
+
+print("\n" + "=" * 70)
+print(f"{'query':<52} {'indexed':>10} {'no index':>10}")
+for title, _ in QUERIES:
+    print(f"{title[:52]:<52} {indexed[title] * 1000:>8.1f}ms {unindexed[title] * 1000:>8.1f}ms")
+
+if not args.keep and not args.db:
+    os.remove(db_path)
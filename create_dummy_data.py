@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 django.setup()
 
 from web.models import DailyMoodCheckIn, PostpartumQuestionnaire
+from web.emr_export import bulk_import, flush_pdf_regeneration
 from django.utils import timezone
 
 print("Creating dummy data...")
@@ -38,28 +39,30 @@ mood_descriptions = [
     ""
 ]
 
-for days_ago in range(30):
-    date = timezone.now() - timedelta(days=days_ago)
+# Bulk import: skip the per-row EMR PDF rebuild; the PDF is rebuilt once afterwards
+with bulk_import():
+    for days_ago in range(30):
+        date = timezone.now() - timedelta(days=days_ago)
 
-    # Create 1 check-in per day
-    mood_rating = random.randint(4, 9)  # Range from 4 to 9
+        # Create 1 check-in per day
+        mood_rating = random.randint(4, 9)  # Range from 4 to 9
 
-    checkin = DailyMoodCheckIn.objects.create(
-        mood_rating=mood_rating,
-        mood_description=random.choice(mood_descriptions),
-        hours_of_sleep=random.choice(['less_than_3', '3_4', '4_5', '5_6', 'more_than_6']),
-        baby_wake_count=random.choice(['0_1', '2_3', '4_5', '6_plus', '']),
-        energy_level=random.choice(['very_low', 'low', 'moderate', 'good', 'high']),
-        stress_level=random.choice(['calm', 'slightly_stressed', 'moderately_stressed', 'very_stressed', 'overwhelmed']),
-        intrusive_thoughts=random.choice(['no', 'no', 'no', 'mild', 'mild']),  # Mostly "no"
-        notes=f"Day {days_ago} check-in" if days_ago % 5 == 0 else ""
-    )
+        checkin = DailyMoodCheckIn.objects.create(
+            mood_rating=mood_rating,
+            mood_description=random.choice(mood_descriptions),
+            hours_of_sleep=random.choice(['less_than_3', '3_4', '4_5', '5_6', 'more_than_6']),
+            baby_wake_count=random.choice(['0_1', '2_3', '4_5', '6_plus', '']),
+            energy_level=random.choice(['very_low', 'low', 'moderate', 'good', 'high']),
+            stress_level=random.choice(['calm', 'slightly_stressed', 'moderately_stressed', 'very_stressed', 'overwhelmed']),
+            intrusive_thoughts=random.choice(['no', 'no', 'no', 'mild', 'mild']),  # Mostly "no"
+            notes=f"Day {days_ago} check-in" if days_ago % 5 == 0 else ""
+        )
 
-    # Set the created_at to the specific date
-    checkin.created_at = date
-    checkin.save()
+        # Set the created_at to the specific date
+        checkin.created_at = date
+        checkin.save()
 
-    print(f"[OK] Created check-in for {date.strftime('%Y-%m-%d')} - Mood: {mood_rating}/10")
+        print(f"[OK] Created check-in for {date.strftime('%Y-%m-%d')} - Mood: {mood_rating}/10")
 
 print(f"\nTotal daily check-ins created: {DailyMoodCheckIn.objects.count()}")
 
@@ -188,17 +191,22 @@ sample_responses = [
     },
 ]
 
-for i, date in enumerate(questionnaire_dates):
-    responses = sample_responses[i]
+# Bulk import: skip the per-row EMR PDF rebuild; the PDF is rebuilt once afterwards
+with bulk_import():
+    for i, date in enumerate(questionnaire_dates):
+        responses = sample_responses[i]
 
-    q = PostpartumQuestionnaire.objects.create(**responses)
-    q.created_at = date
-    q.save()
+        q = PostpartumQuestionnaire.objects.create(**responses)
+        q.created_at = date
+        q.save()
 
-    print(f"[OK] Created questionnaire for {date.strftime('%Y-%m-%d')} - Score: {q.total_score}/48 - Risk: {q.risk_level}")
+        print(f"[OK] Created questionnaire for {date.strftime('%Y-%m-%d')} - Score: {q.total_score}/48 - Risk: {q.risk_level}")
 
 print(f"\nTotal questionnaires created: {PostpartumQuestionnaire.objects.count()}")
 
+print("\nRegenerating EMR PDFs...")
+flush_pdf_regeneration()
+
 print("\n" + "=" * 60)
 print("✅ Dummy data creation complete!")
 print("=" * 60)
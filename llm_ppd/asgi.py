@@ -3,6 +3,15 @@ ASGI config for llm_ppd project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through this entry point (e.g. ``uvicorn llm_ppd.asgi:application``) for
+the streaming chat endpoint (/chat/stream/): its Server-Sent Events are only
+flushed token by token under ASGI. The chat views are async, so under ASGI a
+conversation waiting on the LLM holds no thread and one process can serve many.
+
+Django doesn't handle the ASGI lifespan protocol, so ``application`` answers it
+here: startup opens the pooled async LLM client on the server's event loop and
+shutdown closes it.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -13,4 +22,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'llm_ppd.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+
+    from web.rag.llm import close_async_client, open_async_client
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            open_async_client()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
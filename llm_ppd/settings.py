@@ -10,11 +10,17 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Database and feature switches below may come from .env (see .env.example)
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -73,12 +79,56 @@ WSGI_APPLICATION = 'llm_ppd.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default, tuned for concurrent writers. Set DATABASE_ENGINE=postgres
+# (and the POSTGRES_* variables) to use PostgreSQL with a psycopg connection pool.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'llm_ppd'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'OPTIONS': {
+                # Needs psycopg[pool]; the pool replaces CONN_MAX_AGE (must stay 0)
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', '10')),
+                    'timeout': float(os.environ.get('POSTGRES_POOL_TIMEOUT', '10')),
+                },
+            },
+        }
     }
-}
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Keep connections (and their pragmas/page cache) across requests
+            'CONN_MAX_AGE': int(os.environ.get('SQLITE_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked"
+                'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+                # Take the write lock at BEGIN: a deferred transaction that reads and then
+                # writes can't wait for the lock and fails immediately instead
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets the export/dashboard reads run alongside a writer
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
+    }
+else:
+    raise RuntimeError(f"Unknown DATABASE_ENGINE {DATABASE_ENGINE!r} (expected 'sqlite' or 'postgres')")
 
 
 # Password validation
@@ -116,3 +166,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# RAG
+# Set RAG_WARMUP=1 to preload the sentence encoder and FAISS index when the app starts
+RAG_WARMUP = os.environ.get('RAG_WARMUP', '') == '1'
+
+
+# EMR PDF exports
+# A burst of saves is rebuilt once, EMR_PDF_DEBOUNCE_SECONDS after the last save
+# (and no later than EMR_PDF_MAX_DELAY_SECONDS after the first)
+EMR_PDF_DEBOUNCE_SECONDS = float(os.environ.get('EMR_PDF_DEBOUNCE_SECONDS', '2'))
+EMR_PDF_MAX_DELAY_SECONDS = float(os.environ.get('EMR_PDF_MAX_DELAY_SECONDS', '30'))
+# Queue an incremental RAG ingest of the re-rendered partitions (web/EMR) after each batch
+EMR_RAG_INGEST = os.environ.get('EMR_RAG_INGEST', '1') == '1'
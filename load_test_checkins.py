@@ -0,0 +1,160 @@
+"""
+Concurrency load test for check-in submissions.
+
+Worker processes POST daily check-ins to /daily-checkin/ in parallel (the full
+request path: the row, its rollup update and the debounced EMR PDF exports that
+read back from the database). It reports write throughput, latency and failed
+submissions ("database is locked") for:
+
+    tuned     - the SQLite settings from llm_ppd/settings.py (WAL, busy timeout,
+                IMMEDIATE transactions, persistent connections)
+    baseline  - Django's default SQLite settings
+    configured - the database configured in settings as-is (e.g. DATABASE_ENGINE=postgres);
+                its load-test rows are deleted afterwards
+
+SQLite profiles run against a fresh scratch database, never the project one.
+
+    python load_test_checkins.py                       # tuned vs baseline, 8 processes
+    python load_test_checkins.py --processes 16 --requests 100
+    DATABASE_ENGINE=postgres python load_test_checkins.py --profile configured
+"""
+import argparse
+import html
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+LOAD_TEST_NOTE = 'load_test'
+
+
+def _setup(profile, workdir):
+    """Configure Django for a profile; runs in each spawned process"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'llm_ppd.settings')
+    from pathlib import Path
+    from django.conf import settings
+
+    if profile != 'configured':
+        if profile == 'baseline':
+            settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3'}
+        settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'db.sqlite3')
+    # EMR PDFs go to the scratch directory as well
+    settings.BASE_DIR = Path(workdir)
+
+    import django
+    django.setup()
+
+
+def _migrate(profile, workdir):
+    _setup(profile, workdir)
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def _worker(profile, workdir, requests, seed, start_at):
+    _setup(profile, workdir)
+    from django.test import Client
+    from web.emr_export import flush_pdf_regeneration
+
+    rng = random.Random(seed)
+    client = Client()
+    latencies, failures = [], []
+    while time.time() < start_at:
+        time.sleep(0.001)
+
+    for _ in range(requests):
+        data = {
+            'mood_rating': rng.randint(1, 10),
+            'hours_of_sleep': rng.choice(['less_than_3', '3_4', '4_5', '5_6', 'more_than_6']),
+            'energy_level': rng.choice(['very_low', 'low', 'moderate', 'good', 'high']),
+            'stress_level': rng.choice(['calm', 'slightly_stressed', 'very_stressed']),
+            'intrusive_thoughts': rng.choice(['no', 'mild']),
+            'notes': LOAD_TEST_NOTE,
+        }
+        t0 = time.perf_counter()
+        response = client.post('/daily-checkin/', data)
+        latencies.append(time.perf_counter() - t0)
+        # Success redirects to /history/; the view re-renders the form with the error otherwise
+        if response.status_code != 302:
+            failures.append(_error_message(response))
+
+    # Forked/spawned workers skip atexit, so render their pending exports now
+    flush_pdf_regeneration(120)
+    return latencies, failures
+
+
+def _error_message(response):
+    match = re.search(r'Error submitting check-in: ([^<]*)', response.content.decode('utf-8', 'replace'))
+    return html.unescape(match.group(1).strip()) if match else f'HTTP {response.status_code}'
+
+
+def _count_and_cleanup(profile, workdir):
+    _setup(profile, workdir)
+    from web.models import DailyMoodCheckIn
+    from web.rollups import rebuild_all_rollups
+
+    rows = DailyMoodCheckIn.objects.filter(notes=LOAD_TEST_NOTE)
+    count = rows.count()
+    if profile == 'configured':
+        rows.delete()
+        rebuild_all_rollups()
+    return count
+
+
+def run(profile, processes, requests):
+    workdir = tempfile.mkdtemp(prefix=f'llm_ppd_load_{profile}_')
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ctx.Pool(1) as pool:
+            pool.apply(_migrate, (profile, workdir))
+
+        with ctx.Pool(processes) as pool:
+            # Start everyone at the same moment, after the interpreters are up
+            start_at = time.time() + 3 + processes * 0.5
+            jobs = [pool.apply_async(_worker, (profile, workdir, requests, seed, start_at)) for seed in range(processes)]
+            results = [job.get() for job in jobs]
+            elapsed = time.time() - start_at
+
+        with ctx.Pool(1) as pool:
+            stored = pool.apply(_count_and_cleanup, (profile, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(l for lats, _ in results for l in lats)
+    failures = [f for _, fails in results for f in fails]
+    ok = len(latencies) - len(failures)
+    print(f"\n{profile}: {processes} processes x {requests} check-ins")
+    print(f"   committed    {ok:,} ({stored:,} rows stored), failed {len(failures):,}")
+    print(f"   throughput   {ok / elapsed:,.1f} check-ins/s over {elapsed:.1f}s (incl. final PDF exports)")
+    print(f"   latency      p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    for error in sorted(set(failures))[:3]:
+        print(f"   error        {error} (x{failures.count(error)})")
+    return ok / elapsed, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel check-in submission load test')
+    parser.add_argument('--processes', type=int, default=8, help='parallel client processes (default: 8)')
+    parser.add_argument('--requests', type=int, default=50, help='check-ins per process (default: 50)')
+    parser.add_argument('--profile', action='append', choices=['tuned', 'baseline', 'configured'],
+                        help='repeatable (default: tuned and baseline)')
+    args = parser.parse_args()
+
+    summary = {profile: run(profile, args.processes, args.requests) for profile in args.profile or ['tuned', 'baseline']}
+
+    print("\n" + "=" * 60)
+    print(f"{'profile':<12} {'check-ins/s':>12} {'failed':>8}")
+    for profile, (throughput, failed) in summary.items():
+        print(f"{profile:<12} {throughput:>12.1f} {failed:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -19,17 +19,14 @@ print(f"\nCurrent database state:")
 print(f"   - DailyMoodCheckIn records: {mood_count}")
 print(f"   - PostpartumQuestionnaire records: {quest_count}")
 
-print(f"\nGenerating PDFs...")
-mood_pdf, quest_pdf = regenerate_all_pdfs()
+print(f"\nGenerating PDFs (one per user per month)...")
+generated = regenerate_all_pdfs()
 
 print(f"\n[OK] PDFs generated successfully!")
-print(f"\n   Daily Mood Check-In PDF:")
-print(f"      Path: {mood_pdf}")
-print(f"      Size: {os.path.getsize(mood_pdf):,} bytes")
-
-print(f"\n   Postpartum Questionnaire PDF:")
-print(f"      Path: {quest_pdf}")
-print(f"      Size: {os.path.getsize(quest_pdf):,} bytes")
+for label, paths in generated.items():
+    print(f"\n   {label}: {len(paths)} partition PDFs")
+    for path in paths:
+        print(f"      {os.path.basename(path)} ({os.path.getsize(path):,} bytes)")
 
 print("\n" + "=" * 70)
-print("Done! You can now open these PDFs to view all records in JSON format.")
+print("Done! You can now open these PDFs to view the records in JSON format.")
@@ -33,8 +33,7 @@ mood_checkin = DailyMoodCheckIn.objects.create(
     notes="Had a good conversation with my partner about sharing responsibilities."
 )
 print(f"   [OK] Created DailyMoodCheckIn with ID: {mood_checkin.id}")
-print(f"   [OK] This should regenerate daily_mood_checking_all_records.pdf")
-print(f"        with ALL {DailyMoodCheckIn.objects.count()} mood check-in records")
+print(f"   [OK] This should regenerate test_user_001's PDF for this month")
 
 # Test 2: Create a PostpartumQuestionnaire entry
 print("\n2. Creating a new PostpartumQuestionnaire entry...")
@@ -64,18 +63,22 @@ questionnaire = PostpartumQuestionnaire.objects.create(
 print(f"   [OK] Created PostpartumQuestionnaire with ID: {questionnaire.id}")
 print(f"   [OK] Total Score: {questionnaire.total_score}")
 print(f"   [OK] Risk Level: {questionnaire.risk_level}")
-print(f"   [OK] This should regenerate postpartum_questionnaire_all_records.pdf")
-print(f"        with ALL {PostpartumQuestionnaire.objects.count()} questionnaire records")
+print(f"   [OK] This should regenerate test_user_001's PDF for this month")
+
+# PDFs are rebuilt in the background after a short debounce; wait for them
+from web.emr_export import flush_pdf_regeneration
+flush_pdf_regeneration()
 
 # Check if PDFs were created
-pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web', 'data', 'pdfs')
+from web.pdf_generator import get_pdf_directory, partition_filename, partition_key
+pdf_dir = get_pdf_directory()
 print(f"\n3. Checking PDF directory: {pdf_dir}")
 
 if os.path.exists(pdf_dir):
-    # Look for the specific all_records PDFs
+    # Look for the user/month partition PDFs of the two new records
     expected_files = [
-        'daily_mood_checking_all_records.pdf',
-        'postpartum_questionnaire_all_records.pdf'
+        partition_filename(DailyMoodCheckIn, *partition_key(mood_checkin)),
+        partition_filename(PostpartumQuestionnaire, *partition_key(questionnaire)),
     ]
 
     print(f"\n   Expected PDF files:")
@@ -103,5 +106,6 @@ else:
 
 print("\n" + "-" * 70)
 print("Test complete!")
-print("\nNOTE: Each PDF now contains ALL records from its respective table in JSON format.")
-print("      Every time a new record is added, the entire PDF is regenerated with all data.")
+print("\nNOTE: Each PDF contains one user's records for one month, in JSON format.")
+print("      New records mark their user/month PDF stale; it is rebuilt in the background,")
+print("      once per burst of saves.")
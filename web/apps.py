@@ -1,4 +1,10 @@
+import logging
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class WebConfig(AppConfig):
@@ -6,3 +12,30 @@ class WebConfig(AppConfig):
 
     def ready(self):
         import web.signals
+
+        if getattr(settings, 'RAG_WARMUP', False):
+            # Preload the encoder + FAISS index off the main thread; the first request
+            # waits on the same load lock instead of starting a second one
+            threading.Thread(target=self._warm_rag, name='rag-warmup', daemon=True).start()
+
+    @staticmethod
+    def _warm_rag():
+        from .rag.context import CHARS_PER_TOKEN, CONTEXT_TOKENIZER, load_tokenizer
+        from .rag.pipeline import INDEX_DIR
+        from .rag.retrieve import warmup
+        from .rag.survey_index import available_surveys, get_survey
+
+        try:
+            info = warmup(INDEX_DIR)
+            logger.info('RAG warmup done: %s', info)
+        except Exception:
+            logger.exception('RAG warmup failed')
+        # Prompt budgets are measured with the chat model's tokenizer; fetch tokenizer.json
+        # here, off the request path, if it isn't there yet
+        if load_tokenizer(fetch=True) is not None:
+            logger.info('Prompt budgets measured with %s', CONTEXT_TOKENIZER)
+        else:
+            logger.info('Prompt budgets estimated at %d chars/token', CHARS_PER_TOKEN)
+        # Survey matrices for the PPD scoring evidence
+        for name in available_surveys():
+            get_survey(name)
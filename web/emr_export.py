@@ -0,0 +1,196 @@
+"""
+Debounced, off-request regeneration of the EMR PDFs.
+
+EMR PDFs are partitioned per (model, user_identifier, month). A saved row only
+marks its partition dirty (once the transaction commits). A background thread
+re-renders the dirty partitions after no further saves arrived for
+EMR_PDF_DEBOUNCE_SECONDS, or at the latest EMR_PDF_MAX_DELAY_SECONDS after the
+first pending save, so a burst of saves costs one render per partition.
+
+The RAG index ingests the partition PDFs (rag.ingest.EMR_DIR): after a batch,
+an incremental ingest job is queued for the background worker, which
+re-embeds only the partition files that changed.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .pdf_generator import regenerate_partition_pdf
+from .rag.worker import JOBS_DB_NAME, IngestQueue, ensure_worker
+
+logger = logging.getLogger(__name__)
+
+
+class PdfRegenerationScheduler:
+    def __init__(self, debounce=2.0, max_delay=30.0):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._dirty = {}  # (model label, user_identifier, month) -> model class
+        self._first_at = None
+        self._last_at = None
+        self._flushing = False
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def mark_dirty(self, model_class, partition):
+        with self._cond:
+            now = time.monotonic()
+            user_identifier, month = partition
+            self._dirty[(model_class._meta.label, user_identifier, month)] = model_class
+            self._last_at = now
+            if self._first_at is None:
+                self._first_at = now
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return sorted(self._dirty, key=lambda k: (k[0], k[1] or '', k[2]))
+
+    def flush(self, timeout=None):
+        """Run pending rebuilds now and wait for them. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._dirty:
+                self._flushing = True
+                self._ensure_thread()
+                self._cond.notify_all()
+            while self._dirty or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='emr-pdf', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        with self._cond:
+            while True:
+                wait = None
+                if self._dirty:
+                    if self._flushing:
+                        wait = 0
+                    else:
+                        due = min(self._last_at + self.debounce, self._first_at + self.max_delay)
+                        wait = due - time.monotonic()
+                    if wait <= 0:
+                        batch = self._dirty
+                        self._dirty = {}
+                        self._first_at = self._last_at = None
+                        self._flushing = False
+                        self._busy = True
+                        return batch
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._regenerate(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _regenerate(self, batch):
+        close_old_connections()
+        changed = 0
+        try:
+            for (label, user_identifier, month), model_class in batch.items():
+                t0 = time.perf_counter()
+                try:
+                    path = regenerate_partition_pdf(model_class, user_identifier, month)
+                    changed += 1
+                    logger.info('Regenerated %s PDF for %s/%s in %.2fs: %s',
+                                label, user_identifier, month, time.perf_counter() - t0, path)
+                except Exception:
+                    logger.exception('Regenerating the %s PDF for %s/%s failed', label, user_identifier, month)
+        finally:
+            # This thread's own DB connection; don't leave it open between batches
+            connection.close()
+        if changed:
+            queue_emr_ingest()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_bulk = threading.local()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = PdfRegenerationScheduler(
+                    debounce=getattr(settings, 'EMR_PDF_DEBOUNCE_SECONDS', 2.0),
+                    max_delay=getattr(settings, 'EMR_PDF_MAX_DELAY_SECONDS', 30.0),
+                )
+                # Scripts exit right after their last save; don't drop the pending rebuild
+                atexit.register(_scheduler.flush, 120)
+    return _scheduler
+
+
+def queue_emr_ingest():
+    """
+    Queue an incremental RAG ingest so re-rendered (or removed) partition PDFs
+    reach the index; returns the job id, or None when disabled or it failed.
+    """
+    if not getattr(settings, 'EMR_RAG_INGEST', True):
+        return None
+    web_dir = os.path.join(settings.BASE_DIR, 'web')
+    try:
+        queue = IngestQueue(os.path.join(web_dir, 'rag_index', JOBS_DB_NAME))
+        # Same params as the chat export's job, so the two coalesce while pending
+        job_id = queue.enqueue('ingest', {'incremental': True})
+        ensure_worker(queue, cwd=web_dir)
+        return job_id
+    except Exception:
+        logger.exception('Could not queue the RAG ingest for the EMR PDFs')
+        return None
+
+
+def schedule_pdf_regeneration(model_class, partition):
+    """Mark one (user_identifier, month) partition PDF stale; it is re-rendered in the background after commit."""
+    touched = getattr(_bulk, 'touched', None)
+    if touched is not None:
+        touched.add((model_class, partition))
+        return
+    transaction.on_commit(lambda: get_scheduler().mark_dirty(model_class, partition))
+
+
+def flush_pdf_regeneration(timeout=None):
+    return get_scheduler().flush(timeout)
+
+
+@contextmanager
+def bulk_import(regenerate=True):
+    """
+    Skip per-row PDF regeneration for saves made in this thread inside the
+    block; each touched partition is re-rendered once when it exits.
+    """
+    outer = getattr(_bulk, 'touched', None)
+    if outer is not None:
+        # Nested: the outermost block does the rebuild
+        yield
+        return
+
+    _bulk.touched = set()
+    try:
+        yield
+    finally:
+        touched, _bulk.touched = _bulk.touched, None
+        if regenerate:
+            for model_class, partition in touched:
+                schedule_pdf_regeneration(model_class, partition)
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.models import DailyMoodCheckIn
+from web.rollups import rebuild_all_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the DailyMoodRollup table from every DailyMoodCheckIn. Run once "
+        "after adding the table, and after bulk loads that bypass signals "
+        "(loaddata, bulk_create)."
+    )
+
+    def handle(self, *args, **options):
+        t0 = time.perf_counter()
+        checkins = DailyMoodCheckIn.objects.count()
+        rollups = rebuild_all_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {checkins} check-ins into {rollups} daily rollups in {time.perf_counter() - t0:.1f}s.'
+        ))
@@ -0,0 +1,112 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from web.emr_export import queue_emr_ingest
+from web.pdf_generator import PDF_EXPORTS, list_partitions, prune_partition_pdfs, regenerate_partition_pdf
+
+
+def _init_worker():
+    # Forked workers inherit the parent's Django state; spawned ones need setup.
+    # Either way each worker opens its own DB connection on first query.
+    import django
+    django.setup()
+
+
+def _render_partition(label, user_identifier, month):
+    model_class = apps.get_model(label)
+    t0 = time.perf_counter()
+    path = regenerate_partition_pdf(model_class, user_identifier, month)
+    return label, user_identifier, month, path, time.perf_counter() - t0
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render every EMR partition PDF (one per table, user and month), "
+        "fanning the ReportLab work out to a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='worker processes (default: CPU count; 1 renders in-process)')
+        parser.add_argument('--model', action='append', choices=sorted(PDF_EXPORTS),
+                            help='only this model label (repeatable; default: all)')
+        parser.add_argument('--user', help='only partitions of this user_identifier')
+        parser.add_argument('--benchmark', metavar='N[,N...]',
+                            help='time a full regeneration for each worker count, e.g. 1,2,4,8')
+
+    def handle(self, *args, **options):
+        labels = options['model'] or sorted(PDF_EXPORTS)
+        tasks = self._partitions(labels, options['user'])
+        if not tasks:
+            self.stdout.write('No EMR partitions to render.')
+            return
+
+        if options['benchmark']:
+            try:
+                counts = [int(n) for n in options['benchmark'].split(',')]
+            except ValueError:
+                raise CommandError('--benchmark expects comma-separated worker counts, e.g. 1,2,4')
+            self._benchmark(tasks, counts)
+            return
+
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        seconds, results = self._render(tasks, options['workers'], progress=options['verbosity'] >= 1)
+        # Only a full run knows which partitions no longer exist
+        if not options['user']:
+            for label in labels:
+                prune_partition_pdfs(apps.get_model(label), [r[3] for r in results if r[0] == label])
+
+        rendered = sum(1 for r in results if r[3])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} partition PDFs in {seconds:.1f}s with {options["workers"]} worker(s).'
+        ))
+        job_id = queue_emr_ingest()
+        if job_id is not None:
+            self.stdout.write(f'Queued RAG ingest job {job_id} for the changed partitions.')
+
+    def _partitions(self, labels, user_identifier=None):
+        tasks = []
+        for label in labels:
+            for user, month in list_partitions(apps.get_model(label)):
+                if user_identifier is None or user == user_identifier:
+                    tasks.append((label, user, month))
+        return tasks
+
+    def _render(self, tasks, workers, progress=True):
+        t0 = time.perf_counter()
+        results = []
+
+        def report(result):
+            results.append(result)
+            if progress:
+                label, user, month, path, seconds = result
+                name = os.path.basename(path) if path else 'removed (no rows)'
+                self.stdout.write(f'[{len(results)}/{len(tasks)}] {label} {user or "-"} {month}: {name} ({seconds:.2f}s)')
+
+        if workers == 1:
+            for task in tasks:
+                report(_render_partition(*task))
+        else:
+            # Don't hand an open DB connection to forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_render_partition, *task) for task in tasks]
+                for future in as_completed(futures):
+                    report(future.result())
+        return time.perf_counter() - t0, results
+
+    def _benchmark(self, tasks, counts):
+        self.stdout.write(f'{len(tasks)} partitions, {os.cpu_count()} CPUs')
+        self.stdout.write(f'{"workers":>8} {"seconds":>9} {"speedup":>8}')
+        baseline = None
+        for workers in counts:
+            seconds, _ = self._render(tasks, workers, progress=False)
+            baseline = baseline or seconds
+            self.stdout.write(f'{workers:>8} {seconds:>9.2f} {baseline / seconds:>7.2f}x')
@@ -0,0 +1,90 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMoodCheckIn',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user_identifier', models.CharField(blank=True, max_length=255, null=True)),
+                ('mood_rating', models.IntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5'), (6, '6'), (7, '7'), (8, '8'), (9, '9'), (10, '10')])),
+                ('mood_description', models.TextField(blank=True, null=True)),
+                ('hours_of_sleep', models.CharField(choices=[('less_than_3', 'Less than 3'), ('3_4', '3-4'), ('4_5', '4-5'), ('5_6', '5-6'), ('more_than_6', 'More than 6')], max_length=20)),
+                ('baby_wake_count', models.CharField(blank=True, choices=[('0_1', '0-1'), ('2_3', '2-3'), ('4_5', '4-5'), ('6_plus', '6+')], max_length=20, null=True)),
+                ('energy_level', models.CharField(choices=[('very_low', 'Very low'), ('low', 'Low'), ('moderate', 'Moderate'), ('good', 'Good'), ('high', 'High')], max_length=20)),
+                ('stress_level', models.CharField(choices=[('calm', 'Calm'), ('slightly_stressed', 'Slightly stressed'), ('moderately_stressed', 'Moderately stressed'), ('very_stressed', 'Very stressed'), ('overwhelmed', 'Overwhelmed')], max_length=20)),
+                ('intrusive_thoughts', models.CharField(choices=[('no', 'No'), ('mild', 'Mild'), ('moderate', 'Moderate'), ('severe', 'Severe')], max_length=20)),
+                ('notes', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Mood Check-Ins',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostpartumQuestionnaire',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user_identifier', models.CharField(blank=True, max_length=255, null=True)),
+                ('q1_interest_pleasure', models.IntegerField(choices=[(0, 'Not at all'), (1, 'Several days'), (2, 'More than half the days'), (3, 'Nearly every day')])),
+                ('q2_depressed_hopeless', models.IntegerField(choices=[(0, 'Not at all'), (1, 'Several days'), (2, 'More than half the days'), (3, 'Nearly every day')])),
+                ('q3_anxious_worried', models.IntegerField(choices=[(0, 'Not at all'), (1, 'Several days'), (2, 'More than half the days'), (3, 'Nearly every day')])),
+                ('q4_irritable_angry', models.IntegerField(choices=[(0, 'Not at all'), (1, 'Several days'), (2, 'More than half the days'), (3, 'Nearly every day')])),
+                ('q5_difficulty_enjoying_motherhood', models.IntegerField(choices=[(0, 'Never'), (1, 'Sometimes'), (2, 'Often'), (3, 'Almost always')])),
+                ('q6_thoughts_not_good_mother', models.IntegerField(choices=[(0, 'Never'), (1, 'Sometimes'), (2, 'Often'), (3, 'Almost always')])),
+                ('q7_thoughts_harming_self', models.IntegerField(choices=[(0, 'Never'), (1, 'Rarely'), (2, 'Sometimes'), (3, 'Often')])),
+                ('q8_sleep_when_baby_sleeps', models.IntegerField(choices=[(0, 'Easily'), (1, 'Sometimes'), (2, 'Rarely'), (3, 'Never')])),
+                ('q9_worried_baby_health', models.IntegerField(choices=[(0, 'Not at all'), (1, 'Sometimes'), (2, 'Often'), (3, 'Always')])),
+                ('q10_physically_exhausted', models.IntegerField(choices=[(0, 'No'), (1, 'Mild'), (2, 'Moderate'), (3, 'Severe')])),
+                ('q11_relationship_partner', models.IntegerField(choices=[(0, 'Very supportive'), (1, 'Somewhat supportive'), (2, 'Neutral'), (3, 'Strained')])),
+                ('q12_emotional_support', models.IntegerField(choices=[(0, 'Strong support'), (1, 'Moderate'), (2, 'Minimal'), (3, 'None')])),
+                ('q13_confide_in_someone', models.IntegerField(choices=[(0, 'Yes, always'), (1, 'Sometimes'), (2, 'Rarely'), (3, 'No')])),
+                ('q14_depression_before_pregnancy', models.IntegerField(choices=[(0, 'No'), (2, 'Yes')])),
+                ('q15_depression_during_pregnancy', models.IntegerField(choices=[(0, 'No'), (2, 'Yes')])),
+                ('q16_family_history_mental_illness', models.IntegerField(choices=[(0, 'No'), (1, 'Yes')])),
+                ('q17_experienced_abuse', models.IntegerField(choices=[(0, 'No'), (2, 'Yes')])),
+                ('q18_unplanned_pregnancy', models.IntegerField(choices=[(0, 'No'), (1, 'Yes')])),
+                ('q19_delivery_complications', models.IntegerField(choices=[(0, 'No'), (1, 'Yes')])),
+                ('q20_baby_health_problems', models.IntegerField(choices=[(0, 'No'), (1, 'Yes')])),
+                ('total_score', models.IntegerField(default=0)),
+                ('risk_level', models.CharField(choices=[('low', 'Low Risk'), ('moderate', 'Moderate Risk'), ('high', 'High Risk'), ('critical', 'Critical - Immediate Support Needed')], default='low', max_length=20)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyMoodRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_identifier', models.CharField(blank=True, default='', max_length=255)),
+                ('day', models.DateField()),
+                ('checkin_count', models.IntegerField(default=0)),
+                ('mood_total', models.IntegerField(default=0)),
+                ('first_at', models.DateTimeField(null=True)),
+                ('first_sleep', models.CharField(blank=True, choices=[('less_than_3', 'Less than 3'), ('3_4', '3-4'), ('4_5', '4-5'), ('5_6', '5-6'), ('more_than_6', 'More than 6')], default='', max_length=20)),
+                ('last_at', models.DateTimeField(null=True)),
+                ('last_mood', models.IntegerField(null=True)),
+                ('sleep_counts', models.JSONField(default=dict)),
+                ('energy_counts', models.JSONField(default=dict)),
+                ('stress_counts', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='mood_rollup_day')],
+                'constraints': [models.UniqueConstraint(fields=('user_identifier', 'day'), name='unique_mood_rollup_per_user_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailymoodcheckin',
+            index=models.Index(fields=['user_identifier', 'created_at'], name='checkin_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='dailymoodcheckin',
+            index=models.Index(fields=['created_at'], name='checkin_created'),
+        ),
+        migrations.AddIndex(
+            model_name='postpartumquestionnaire',
+            index=models.Index(fields=['user_identifier', 'created_at'], name='questionnaire_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='postpartumquestionnaire',
+            index=models.Index(fields=['created_at'], name='questionnaire_created'),
+        ),
+    ]
@@ -50,6 +50,11 @@ class PostpartumQuestionnaire(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-user history and EMR partition exports (user, month range, newest first)
+            models.Index(fields=['user_identifier', 'created_at'], name='questionnaire_user_created'),
+            models.Index(fields=['created_at'], name='questionnaire_created'),
+        ]
 
     def calculate_score(self):
         """Calculate total depression risk score"""
@@ -140,6 +145,46 @@ class DailyMoodCheckIn(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Daily Mood Check-Ins'
+        indexes = [
+            # Per-user history, rollup rebuilds and EMR partition exports
+            models.Index(fields=['user_identifier', 'created_at'], name='checkin_user_created'),
+            models.Index(fields=['created_at'], name='checkin_created'),
+        ]
 
     def __str__(self):
         return f"Mood Check-In {self.created_at.strftime('%Y-%m-%d')} - Rating: {self.mood_rating}/10"
+
+
+class DailyMoodRollup(models.Model):
+    """Per-user, per-day aggregate of DailyMoodCheckIn rows, maintained by web.rollups"""
+    user_identifier = models.CharField(max_length=255, blank=True, default='')
+    day = models.DateField()
+
+    checkin_count = models.IntegerField(default=0)
+    mood_total = models.IntegerField(default=0)
+
+    # First and latest check-in of the day (dashboard sleep label and "today" mood)
+    first_at = models.DateTimeField(null=True)
+    first_sleep = models.CharField(max_length=20, blank=True, default='',
+                                   choices=DailyMoodCheckIn._meta.get_field('hours_of_sleep').choices)
+    last_at = models.DateTimeField(null=True)
+    last_mood = models.IntegerField(null=True)
+
+    # Distributions: choice value -> number of check-ins
+    sleep_counts = models.JSONField(default=dict)
+    energy_counts = models.JSONField(default=dict)
+    stress_counts = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user_identifier', 'day'], name='unique_mood_rollup_per_user_day'),
+        ]
+        indexes = [models.Index(fields=['day'], name='mood_rollup_day')]
+
+    @property
+    def avg_mood(self):
+        return round(self.mood_total / self.checkin_count, 1) if self.checkin_count else None
+
+    def __str__(self):
+        return f"Mood Rollup {self.user_identifier or 'anonymous'} {self.day} - {self.checkin_count} check-ins"
@@ -1,5 +1,9 @@
 import os
+import re
 import json
+import zlib
+import hashlib
+import itertools
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -7,8 +11,29 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen import canvas
 from django.conf import settings
 from django.core.serializers import serialize
+from django.db.models import Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+# EMR exports are partitioned per (user_identifier, month):
+# model label -> (file prefix, title)
+PDF_EXPORTS = {
+    'web.DailyMoodCheckIn': ('daily_mood_checkins', 'Daily Mood Check-In'),
+    'web.PostpartumQuestionnaire': ('postpartum_questionnaires', 'Postpartum Questionnaire'),
+}
+
+ANONYMOUS_USER = 'anonymous'
+
+# Rows fetched per database round trip when streaming an export
+ITERATOR_CHUNK_SIZE = 2000
+
+# Flowables buffered ahead of the ReportLab layout engine
+STORY_LOOKAHEAD = 32
 
 
 def get_pdf_directory():
@@ -18,6 +43,67 @@ def get_pdf_directory():
     return pdf_dir
 
 
+def _month(dt):
+    if timezone.is_aware(dt):
+        dt = timezone.localtime(dt)
+    return dt.strftime('%Y-%m')
+
+
+def partition_key(instance):
+    """(user_identifier or None, 'YYYY-MM') of the EMR partition a row belongs to"""
+    return (instance.user_identifier or None, _month(instance.created_at))
+
+
+def _user_slug(user_identifier):
+    if not user_identifier:
+        return ANONYMOUS_USER
+    # No "__" inside a slug: it separates the parts of the file name (and so of the
+    # RAG source prefix that selects one user's partitions)
+    slug = re.sub(r'[^A-Za-z0-9_.-]+|_{2,}', '-', user_identifier).strip('-.')[:64]
+    if slug != user_identifier:
+        # Keep sanitised names distinct
+        slug = f"{slug}-{hashlib.sha1(user_identifier.encode('utf-8')).hexdigest()[:8]}"
+    return slug
+
+
+def partition_filename(model_class, user_identifier, month):
+    """Flat, unique per partition, so it is also a stable RAG source name"""
+    prefix, _ = PDF_EXPORTS[model_class._meta.label]
+    return f"{prefix}__{_user_slug(user_identifier)}__{month}.pdf"
+
+
+def partition_source_prefixes(user_identifier):
+    """
+    RAG source prefixes of every partition of one user, across tables: pass as
+    retrieve(..., source_prefix=...) to search only that user's EMR records
+    """
+    slug = _user_slug(user_identifier)
+    return tuple(f"{prefix}__{slug}__" for prefix, _ in PDF_EXPORTS.values())
+
+
+def partition_queryset(model_class, user_identifier, month):
+    start = timezone.make_aware(datetime.strptime(month, '%Y-%m'))
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    qs = model_class.objects.filter(created_at__gte=start, created_at__lt=end)
+    if user_identifier:
+        return qs.filter(user_identifier=user_identifier)
+    return qs.filter(Q(user_identifier__isnull=True) | Q(user_identifier=''))
+
+
+def list_partitions(model_class):
+    """Every (user_identifier or None, 'YYYY-MM') partition that has rows"""
+    # order_by(): Meta.ordering would add created_at to the DISTINCT columns
+    rows = (
+        model_class.objects
+        .annotate(month=TruncMonth('created_at'))
+        .order_by()
+        .values_list('user_identifier', 'month')
+        .distinct()
+    )
+    partitions = {(user or None, _month(month)) for user, month in rows}
+    return sorted(partitions, key=lambda p: (p[0] or '', p[1]))
+
+
 def model_to_dict(instance):
     """Convert a model instance to a dictionary with formatted datetime"""
     data = {}
@@ -34,23 +120,90 @@ def model_to_dict(instance):
     return data
 
 
-def generate_table_pdf(model_class, filename, title):
-    """Generate a single PDF for all rows in a table with JSON formatting"""
+def _json_default(value):
+    # .values() rows hold raw datetimes/dates; same ISO format as model_to_dict
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class _CompressingCanvas(canvas.Canvas):
+    """
+    ReportLab keeps every finished page's raw operator stream until save();
+    deflate each page as soon as it is done so a long export only holds
+    (roughly) the compressed output.
+    """
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.compression and page.stream and not page.Contents:
+            contents = pdfdoc.PDFStream(content=zlib.compress(page.stream.encode('utf8')))
+            contents.dictionary['Filter'] = pdfdoc.PDFArray([pdfdoc.PDFName(pdfdoc.PDFZCompress.pdfname)])
+            contents.__Comment__ = 'page stream'
+            page.Contents = contents
+            page.stream = None
+
+
+class _FlowableStream(list):
+    """
+    Story for SimpleDocTemplate.build() that is filled lazily from an iterator.
+    build() consumes flowables from the front and checks len() before each one,
+    so only a small look-ahead window (and the current page) is ever in memory.
+    """
+
+    def __init__(self, flowables, lookahead=STORY_LOOKAHEAD):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        n = super().__len__()
+        while self._source is not None and n < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+                break
+            n += 1
+        return n
+
+
+def _record_flowables(rows, styles, json_style):
+    """One header + JSON block per row; the record count is appended at the end"""
+    count = 0
+    for count, row in enumerate(rows, 1):
+        yield Paragraph(f"Record {count} (ID: {row['id']})", styles['Heading3'])
+        json_str = json.dumps(row, indent=2, ensure_ascii=False, default=_json_default)
+        yield Preformatted(json_str, json_style)
+        yield Spacer(1, 0.2*inch)
+    yield Paragraph(f"Total Records: {count}", styles['Normal'])
+
+
+def generate_table_pdf(model_class, filename, title, queryset=None):
+    """
+    Generate a single PDF for all rows in a table (or in queryset) with JSON formatting.
+    Rows are streamed as plain dicts (.values().iterator()) and laid out as they
+    arrive, so memory stays bounded regardless of the row count.
+    """
     pdf_dir = get_pdf_directory()
     filepath = os.path.join(pdf_dir, filename)
+    # Render to a temp file and swap it in, so readers never see a half-written PDF
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
 
     # Get all records from the table
-    all_records = model_class.objects.all().order_by('-created_at')
+    if queryset is None:
+        queryset = model_class.objects.all()
+    rows = queryset.order_by('-created_at').values().iterator(chunk_size=ITERATOR_CHUNK_SIZE)
 
     doc = SimpleDocTemplate(
-        filepath,
+        tmp_path,
         pagesize=letter,
         rightMargin=0.5*inch,
         leftMargin=0.5*inch,
         topMargin=0.5*inch,
         bottomMargin=0.5*inch
     )
-    story = []
     styles = getSampleStyleSheet()
 
     # Custom styles
@@ -75,50 +228,64 @@ def generate_table_pdf(model_class, filename, title):
     )
 
     # Title
-    story.append(Paragraph(title, title_style))
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    story.append(Paragraph(f"Generated: {timestamp}", styles['Normal']))
-    story.append(Paragraph(f"Total Records: {all_records.count()}", styles['Normal']))
-    story.append(Spacer(1, 0.3*inch))
+    header = [
+        Paragraph(title, title_style),
+        Paragraph(f"Generated: {timestamp}", styles['Normal']),
+        Spacer(1, 0.3*inch),
+    ]
 
-    # Add each record as JSON
-    for idx, record in enumerate(all_records, 1):
-        # Convert record to dictionary
-        record_dict = model_to_dict(record)
+    # Build PDF
+    try:
+        story = _FlowableStream(itertools.chain(header, _record_flowables(rows, styles, json_style)))
+        doc.build(story, canvasmaker=_CompressingCanvas)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return filepath
 
-        # Format as pretty JSON
-        json_str = json.dumps(record_dict, indent=2, ensure_ascii=False)
 
-        # Add record header
-        header_text = f"Record {idx} (ID: {record.id})"
-        story.append(Paragraph(header_text, styles['Heading3']))
+def regenerate_partition_pdf(model_class, user_identifier, month):
+    """
+    Re-render one (user, month) partition. A partition with no rows left has
+    its PDF removed; returns the PDF path, or None in that case.
+    """
+    filename = partition_filename(model_class, user_identifier, month)
+    queryset = partition_queryset(model_class, user_identifier, month)
+    if not queryset.exists():
+        path = os.path.join(get_pdf_directory(), filename)
+        if os.path.exists(path):
+            os.remove(path)
+        return None
 
-        # Add JSON as preformatted text
-        json_para = Preformatted(json_str, json_style)
-        story.append(json_para)
-        story.append(Spacer(1, 0.2*inch))
+    _, title = PDF_EXPORTS[model_class._meta.label]
+    title = f"{title} - {user_identifier or ANONYMOUS_USER} - {month}"
+    return generate_table_pdf(model_class, filename, title, queryset=queryset)
 
-    # Build PDF
-    doc.build(story)
-    return filepath
 
+def prune_partition_pdfs(model_class, keep):
+    """Remove a model's partition PDFs whose path is not in keep"""
+    prefix, _ = PDF_EXPORTS[model_class._meta.label]
+    keep = {os.path.basename(p) for p in keep if p}
+    pdf_dir = get_pdf_directory()
+    for name in os.listdir(pdf_dir):
+        if name.startswith(f"{prefix}__") and name.endswith('.pdf') and name not in keep:
+            os.remove(os.path.join(pdf_dir, name))
 
-def regenerate_all_pdfs():
-    """Regenerate both table PDFs with all current data"""
-    from .models import DailyMoodCheckIn, PostpartumQuestionnaire
 
-    # Generate DailyMoodCheckIn PDF
-    mood_pdf = generate_table_pdf(
-        DailyMoodCheckIn,
-        'daily_mood_checking_all_records.pdf',
-        'Daily Mood Check-In - All Records'
-    )
+def regenerate_model_pdfs(model_class):
+    """Re-render every partition of a model and drop PDFs of partitions that no longer exist"""
+    paths = [regenerate_partition_pdf(model_class, user, month) for user, month in list_partitions(model_class)]
+    prune_partition_pdfs(model_class, paths)
+    return [p for p in paths if p]
 
-    # Generate PostpartumQuestionnaire PDF
-    questionnaire_pdf = generate_table_pdf(
-        PostpartumQuestionnaire,
-        'postpartum_questionnaire_all_records.pdf',
-        'Postpartum Questionnaire - All Records'
-    )
 
-    return mood_pdf, questionnaire_pdf
+def regenerate_all_pdfs():
+    """Regenerate every partition PDF of both tables; returns {model label: [paths]}"""
+    from .models import DailyMoodCheckIn, PostpartumQuestionnaire
+
+    return {
+        model._meta.label: regenerate_model_pdfs(model)
+        for model in (DailyMoodCheckIn, PostpartumQuestionnaire)
+    }
@@ -0,0 +1,191 @@
+"""
+Semantic answer cache for stand-alone chat questions.
+
+Many questions are paraphrases of the same few FAQs. A question asked without
+chat history is embedded with the retrieval encoder (the embedding is reused by
+retrieval on a miss) and matched against a small in-memory vector index of past
+(question, answer, sources); at ANSWER_CACHE_SIMILARITY or above the stored
+answer is returned without retrieval or an LLM call.
+
+- capacity-bounded: the least recently used answer makes room, entries expire after a TTL
+- answers are tied to the index snapshot version they were generated from; a new
+  published version empties the cache
+- opt-in (RAG_ANSWER_CACHE=1); messages that mention self-harm, suicide or harm
+  to the baby always get a fresh reply
+"""
+import os
+import re
+import time
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .retrieve import _copy_results, _encode_queries, _executor, _load_resources
+
+ANSWER_CACHE = os.environ.get("RAG_ANSWER_CACHE", "0") == "1"
+# Cosine similarity between questions at which a stored answer is reused
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("RAG_ANSWER_CACHE_SIMILARITY", "0.9"))
+ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.environ.get("RAG_ANSWER_CACHE_TTL", str(24 * 3600)))
+
+# A crisis message must be answered for what it says, never with a paraphrase's answer
+_SAFETY_RE = re.compile(
+    r"\b(suicid\w*|kill(?:ing)? (?:myself|me|my ?self|the baby|my baby)|end(?:ing)? (?:my|it) (?:life|all)|"
+    r"take my (?:own )?life|self[- ]?harm\w*|hurt(?:ing)? (?:myself|the baby|my baby)|harm(?:ing)? (?:the|my) baby|"
+    r"cut(?:ting)? myself|overdos\w*|want to die|better off dead|psychosis|hearing voices)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    k: int
+    created_at: float
+    last_used: float
+    hits: int = 0
+
+
+@dataclass
+class Probe:
+    """A looked-up question: its embedding and index version, for storing the answer on a miss"""
+    question: str
+    vector: np.ndarray
+    version: Optional[str]
+    k: int
+    similarity: float = 0.0
+    hit: Optional[CachedAnswer] = None
+
+
+class AnswerCache:
+    """
+    Fixed-size matrix of normalized question embeddings (one row per slot) searched
+    by brute-force inner product; a few hundred rows take microseconds.
+    """
+
+    def __init__(self, capacity: int, threshold: float, ttl: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[CachedAnswer]] = [None] * capacity
+        self._lock = threading.Lock()
+
+    def _sync_version(self, version: Optional[str]) -> None:
+        # Caller holds the lock
+        if version != self.version:
+            self._entries = [None] * self.capacity
+            self.version = version
+
+    def _expire(self, now: float) -> None:
+        for i, e in enumerate(self._entries):
+            if e is not None and now - e.created_at >= self.ttl:
+                self._entries[i] = None
+
+    def lookup(self, probe: Probe) -> Probe:
+        now = time.time()
+        with self._lock:
+            self._sync_version(probe.version)
+            self._expire(now)
+            live = [i for i, e in enumerate(self._entries) if e is not None and e.k == probe.k]
+            if live:
+                scores = self._vectors[live] @ probe.vector
+                best = int(np.argmax(scores))
+                probe.similarity = float(scores[best])
+                if probe.similarity >= self.threshold:
+                    entry = self._entries[live[best]]
+                    entry.last_used = now
+                    entry.hits += 1
+                    probe.hit = entry
+            if probe.hit is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return probe
+
+    def add(self, probe: Probe, answer: str, sources: List[Dict[str, Any]], live_version: Optional[str]) -> None:
+        # Generated from a snapshot that has since been replaced: don't keep it
+        if probe.version != live_version:
+            return
+        now = time.time()
+        with self._lock:
+            self._sync_version(live_version)
+            if self._vectors is None or self._vectors.shape[1] != probe.vector.shape[0]:
+                self._vectors = np.zeros((self.capacity, probe.vector.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.capacity
+            free = [i for i, e in enumerate(self._entries) if e is None]
+            slot = free[0] if free else min(range(self.capacity), key=lambda i: self._entries[i].last_used)
+            self._vectors[slot] = probe.vector
+            self._entries[slot] = CachedAnswer(
+                question=probe.question,
+                answer=answer,
+                sources=_copy_results(sources),
+                k=probe.k,
+                created_at=now,
+                last_used=now,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = [None] * self.capacity
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = sum(e is not None for e in self._entries)
+            return {"size": size, "hits": self.hits, "misses": self.misses, "version": self.version}
+
+
+_ANSWERS = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_TTL)
+
+
+def cacheable(question: str) -> bool:
+    """Whether the answer cache may serve (and store) an answer to this stand-alone question"""
+    return ANSWER_CACHE and _SAFETY_RE.search(question) is None
+
+
+def lookup(question: str, index_dir: str, k: int, model_name: str = "all-MiniLM-L6-v2") -> Probe:
+    """Embed question with the retrieval encoder and look it up; probe.hit is the cached answer, if any"""
+    entry = _load_resources(index_dir, model_name)
+    vector = _encode_queries(entry["model"], model_name, [question])[0]
+    return _ANSWERS.lookup(Probe(question=question, vector=vector, version=entry["version"], k=k))
+
+
+async def alookup(question: str, index_dir: str, k: int, model_name: str = "all-MiniLM-L6-v2") -> Probe:
+    # Encoding is CPU work: same bounded pool as retrieval
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), lookup, question, index_dir, k, model_name)
+
+
+def hit_result(probe: Probe):
+    """(answer, sources) of a hit; sources copied since callers store them in the session"""
+    return probe.hit.answer, _copy_results(probe.hit.sources)
+
+
+def remember(
+    probe: Probe,
+    answer: str,
+    sources: List[Dict[str, Any]],
+    index_dir: str,
+    model_name: str = "all-MiniLM-L6-v2",
+) -> None:
+    # An empty (e.g. cut-off stream) answer would be served to every paraphrase
+    if not answer.strip():
+        return
+    _ANSWERS.add(probe, answer, sources, _load_resources(index_dir, model_name)["version"])
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _ANSWERS.stats()
+
+
+def clear_answer_cache() -> None:
+    _ANSWERS.clear()
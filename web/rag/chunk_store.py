@@ -0,0 +1,133 @@
+import os
+import json
+import mmap
+import pickle
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+import numpy as np
+
+OFFSETS_NAME = "chunks.offsets.npy"
+TEXT_NAME = "chunks.text"
+META_NAME = "chunks.meta.npy"
+LOOKUP_NAME = "chunks.lookup.json"
+LEGACY_NAME = "chunks.pkl"
+
+# Packed per-chunk metadata; -1 means "not set" (e.g. no page for a CSV row)
+META_DTYPE = np.dtype([("source", "<i4"), ("type", "<i2"), ("page", "<i4"), ("row", "<i4")])
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped chunk store:
+    - chunks.offsets.npy: int64 byte offsets (n + 1) into chunks.text
+    - chunks.text:        all chunk texts as one UTF-8 blob
+    - chunks.meta.npy:    packed (source_id, type_id, page, row) per chunk
+    - chunks.lookup.json: id -> name tables for sources and types
+
+    Workers share the pages through the OS cache, and store[i] only decodes chunk i.
+    """
+
+    def __init__(self, snap_dir: str):
+        self.offsets = np.load(os.path.join(snap_dir, OFFSETS_NAME), mmap_mode="r")
+        self.meta = np.load(os.path.join(snap_dir, META_NAME), mmap_mode="r")
+        with open(os.path.join(snap_dir, LOOKUP_NAME), "r", encoding="utf-8") as f:
+            lookup = json.load(f)
+        self.sources: List[str] = lookup["sources"]
+        self.types: List[str] = lookup["types"]
+
+        self._file = open(os.path.join(snap_dir, TEXT_NAME), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap refuses empty files
+        self._text = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def meta_dict(self, i: int) -> Dict[str, Any]:
+        m = self.meta[i]
+        out: Dict[str, Any] = {"source": self.sources[m["source"]], "type": self.types[m["type"]]}
+        if m["page"] >= 0:
+            out["page"] = int(m["page"])
+        if m["row"] >= 0:
+            out["row"] = int(m["row"])
+        return out
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return {"text": self.text(i), "meta": self.meta_dict(i)}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self) -> None:
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._file.close()
+
+
+def write_chunk_store(snap_dir: str, chunks: Sequence[Dict[str, Any]]) -> None:
+    sources: Dict[str, int] = {}
+    types: Dict[str, int] = {}
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    meta = np.full(len(chunks), -1, dtype=META_DTYPE)
+
+    with open(os.path.join(snap_dir, TEXT_NAME), "wb") as f:
+        pos = 0
+        for i, c in enumerate(chunks):
+            data = (c.get("text") or "").encode("utf-8")
+            f.write(data)
+            pos += len(data)
+            offsets[i + 1] = pos
+
+            m = c.get("meta", {})
+            meta["source"][i] = sources.setdefault(str(m.get("source", "unknown")), len(sources))
+            meta["type"][i] = types.setdefault(str(m.get("type", "")), len(types))
+            if m.get("page") is not None:
+                meta["page"][i] = int(m["page"])
+            if m.get("row") is not None:
+                meta["row"][i] = int(m["row"])
+
+    np.save(os.path.join(snap_dir, OFFSETS_NAME), offsets)
+    np.save(os.path.join(snap_dir, META_NAME), meta)
+    with open(os.path.join(snap_dir, LOOKUP_NAME), "w", encoding="utf-8") as f:
+        json.dump({"sources": list(sources), "types": list(types)}, f)
+
+
+def has_chunks(snap_dir: str) -> bool:
+    return os.path.exists(os.path.join(snap_dir, OFFSETS_NAME)) or os.path.exists(os.path.join(snap_dir, LEGACY_NAME))
+
+
+def load_chunks(snap_dir: str) -> Union[ChunkStore, List[Dict[str, Any]]]:
+    """
+    Open the chunk store in snap_dir. Falls back to a legacy pickled
+    chunks.pkl list so indexes built before the store existed keep working.
+    """
+    if os.path.exists(os.path.join(snap_dir, OFFSETS_NAME)):
+        return ChunkStore(snap_dir)
+    with open(os.path.join(snap_dir, LEGACY_NAME), "rb") as f:
+        return pickle.load(f)
+
+
+def migrate_legacy(snap_dir: str) -> int:
+    """Convert a legacy chunks.pkl in snap_dir into the columnar store. Returns the chunk count."""
+    with open(os.path.join(snap_dir, LEGACY_NAME), "rb") as f:
+        chunks = pickle.load(f)
+    write_chunk_store(snap_dir, chunks)
+    return len(chunks)
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "rag_index"
+    n = migrate_legacy(target)
+    print(f"Migrated {n} chunks in {os.path.abspath(target)}")
@@ -0,0 +1,238 @@
+"""
+Token-budgeted assembly of the "Retrieved Documents" block for RAG prompts.
+
+Retrieved chunks are:
+1) grouped per citation tag ([source p.page]) and stitched back together where
+   they overlap (ingest cuts neighbouring chunks with 150 characters in common),
+2) deduplicated: a passage that is nearly the same text as a better-ranked one
+   is dropped and its citation tag is carried over to the kept passage,
+3) packed best-first until a token budget is used up, measured with the chat
+   model's tokenizer (a local tokenizer.json), or with a characters-per-token
+   estimate when that can't be loaded.
+
+Run `python -m rag.context` from web/ to fetch the tokenizer.json.
+"""
+import os
+import re
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Token budgets for the Retrieved Documents block
+CHAT_CONTEXT_TOKENS = int(os.environ.get("RAG_CHAT_CONTEXT_TOKENS", "1000"))
+PPD_CONTEXT_TOKENS = int(os.environ.get("RAG_PPD_CONTEXT_TOKENS", "2000"))
+
+# Tokenizer that measures the budget: a local tokenizer.json, which the warmup (or
+# `python -m rag.context`) fetches from CONTEXT_TOKENIZER_HUB when it's missing.
+# Requests only read the local file. Set to "", or when it can't be loaded, the
+# budget is estimated at CHARS_PER_TOKEN.
+CONTEXT_TOKENIZER = os.environ.get(
+    "RAG_CONTEXT_TOKENIZER",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag_index", "tokenizer.json"))
+CONTEXT_TOKENIZER_HUB = os.environ.get("RAG_CONTEXT_TOKENIZER_HUB", "deepseek-ai/DeepSeek-V3-0324")
+CHARS_PER_TOKEN = 4
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 40
+# Word-trigram Jaccard similarity at which two passages count as duplicates
+DUPLICATE_SIMILARITY = 0.85
+# Don't start a truncated passage with less room than this
+MIN_PASSAGE_TOKENS = 48
+
+_TOKENIZER: Any = None
+_TOKENIZER_LOADED = False
+_TOKENIZER_LOCK = threading.Lock()
+
+
+@dataclass
+class Passage:
+    text: str
+    tags: List[str]
+    score: float
+    shingles: frozenset = field(default=frozenset(), repr=False)
+
+
+def load_tokenizer(fetch: bool = False):
+    """
+    Load the budget tokenizer from CONTEXT_TOKENIZER; None means the chars/token estimate.
+    With fetch, a missing tokenizer.json is first downloaded from CONTEXT_TOKENIZER_HUB
+    and saved there, and a load that failed before is retried.
+    """
+    global _TOKENIZER, _TOKENIZER_LOADED
+    if fetch and CONTEXT_TOKENIZER and not os.path.isfile(CONTEXT_TOKENIZER):
+        # Outside the lock: requests keep estimating while the download runs
+        try:
+            from tokenizers import Tokenizer
+            os.makedirs(os.path.dirname(CONTEXT_TOKENIZER) or ".", exist_ok=True)
+            tmp = f"{CONTEXT_TOKENIZER}.{os.getpid()}.tmp"
+            Tokenizer.from_pretrained(CONTEXT_TOKENIZER_HUB).save(tmp)
+            os.replace(tmp, CONTEXT_TOKENIZER)
+        except Exception as e:
+            logger.warning("Could not fetch tokenizer %s (%s)", CONTEXT_TOKENIZER_HUB, e)
+    with _TOKENIZER_LOCK:
+        if _TOKENIZER is None and CONTEXT_TOKENIZER and (fetch or not _TOKENIZER_LOADED):
+            try:
+                from tokenizers import Tokenizer
+                _TOKENIZER = Tokenizer.from_file(CONTEXT_TOKENIZER)
+            except Exception as e:
+                logger.warning("Tokenizer %s unavailable (%s); estimating %d chars/token",
+                               CONTEXT_TOKENIZER, e, CHARS_PER_TOKEN)
+        _TOKENIZER_LOADED = True
+    return _TOKENIZER
+
+
+def _tokenizer():
+    if _TOKENIZER_LOADED:
+        return _TOKENIZER
+    return load_tokenizer()
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = _tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens (including the " …" marker), at a word boundary where possible"""
+    if max_tokens <= 0:
+        return ""
+    tokenizer = _tokenizer()
+    if tokenizer is None:
+        if len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        cut = (max_tokens - 2) * CHARS_PER_TOKEN
+    else:
+        offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+        if len(offsets) <= max_tokens:
+            return text
+        cut = offsets[max(max_tokens - 3, 0)][1]
+    if cut <= 0:
+        return ""
+    space = text.rfind(" ", 0, cut)
+    return (text[:space] if space > cut // 2 else text[:cut]).rstrip() + " …"
+
+
+def citation_tag(meta: Dict[str, Any]) -> str:
+    return f"[{meta.get('source', 'unknown')} p.{meta.get('page', '?')}]"
+
+
+def _stitch(a: str, b: str) -> Optional[str]:
+    """a and b joined if one contains the other or a's tail is b's head; otherwise None"""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    head = b[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return None
+    pos = a.find(head)
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return a + b[len(a) - pos:]
+        pos = a.find(head, pos + 1)
+    return None
+
+
+def _shingles(text: str) -> frozenset:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return frozenset(words)
+    return frozenset(zip(words, words[1:], words[2:]))
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def merge_results(rag_results: List[Dict[str, Any]]) -> List[Passage]:
+    """
+    Merge overlapping/adjacent chunks that share a citation tag into contiguous
+    spans, then drop near-duplicates. Keeps retrieval rank order (best first).
+    """
+    groups: Dict[str, List[Passage]] = {}
+    for r in rag_results:
+        text = r.get("text") or ""
+        if not text.strip():
+            continue
+        tag = citation_tag(r.get("meta") or {})
+        groups.setdefault(tag, []).append(Passage(text=text, tags=[tag], score=float(r.get("score", 0.0))))
+
+    passages: List[Passage] = []
+    for group in groups.values():
+        merged = True
+        while merged and len(group) > 1:
+            merged = False
+            for i in range(len(group)):
+                for j in range(len(group)):
+                    if i == j:
+                        continue
+                    joined = _stitch(group[i].text, group[j].text)
+                    if joined is not None:
+                        group[i] = Passage(joined, group[i].tags, max(group[i].score, group[j].score))
+                        del group[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        passages.extend(group)
+
+    passages.sort(key=lambda p: p.score, reverse=True)
+
+    kept: List[Passage] = []
+    for p in passages:
+        p.shingles = _shingles(p.text)
+        for k in kept:
+            if _similarity(p.shingles, k.shingles) >= DUPLICATE_SIMILARITY:
+                # Same evidence from another source: keep citing it
+                k.tags.extend(t for t in p.tags if t not in k.tags)
+                break
+        else:
+            kept.append(p)
+    return kept
+
+
+def pack_context(
+    rag_results: List[Dict[str, Any]],
+    max_tokens: int,
+    max_passage_tokens: Optional[int] = None,
+) -> Tuple[str, List[Passage]]:
+    """
+    Build the Retrieved Documents block within max_tokens.
+    Each passage gets at most max_passage_tokens (default: half the budget), so
+    one long span can't crowd out the rest.
+    Returns: (block, passages used)
+    """
+    if max_passage_tokens is None:
+        max_passage_tokens = max(max_tokens // 2, MIN_PASSAGE_TOKENS)
+
+    blocks: List[str] = []
+    used: List[Passage] = []
+    remaining = max_tokens
+    for p in merge_results(rag_results):
+        prefix = " ".join(p.tags) + " "
+        room = min(remaining - count_tokens(prefix), max_passage_tokens)
+        if room < MIN_PASSAGE_TOKENS:
+            continue
+        text = truncate_to_tokens(p.text, room)
+        block = prefix + text
+        cost = count_tokens(block) + (2 if blocks else 0)  # "\n\n" separator
+        if cost > remaining:
+            continue
+        blocks.append(block)
+        used.append(p)
+        remaining -= cost
+    return "\n\n".join(blocks), used
+
+
+if __name__ == "__main__":
+    tokenizer = load_tokenizer(fetch=True)
+    if tokenizer is None:
+        raise SystemExit(f"Could not load {CONTEXT_TOKENIZER} (see the warning above)")
+    print(f"{CONTEXT_TOKENIZER}: {tokenizer.get_vocab_size()} tokens")
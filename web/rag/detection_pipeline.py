@@ -1,13 +1,33 @@
 import os
 import json
+import asyncio
 from typing import Any, Dict, List, Optional, Tuple
 
-from .retrieve import retrieve
-from .llm import call_featherless
+from .context import PPD_CONTEXT_TOKENS, pack_context
+from .memory import trim_history
+from .retrieve import aretrieve, retrieve
+from .survey_index import survey_evidence
+from .llm import acall_featherless, call_featherless
+from .llm_cache import shared_cache
 
-INDEX_DIR = "web/rag_index"
+# Absolute, so the index cache key is the same whatever the server's cwd (and matches warmup)
+INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag_index")
 print(os.getcwd())
 
+# Scoring should be reproducible: greedy decoding, and replies cached so re-scoring
+# an unchanged user costs no upstream call (RAG_PPD_LLM_CACHE=0 to turn off)
+PPD_TEMPERATURE = 0.0
+PPD_LLM_CACHE = os.environ.get("RAG_PPD_LLM_CACHE", "1") == "1"
+
+
+def _llm_cache():
+    return shared_cache() if PPD_LLM_CACHE else None
+
+
+def _valid_reply(raw_reply: str) -> bool:
+    # Don't pin a malformed reply in the cache
+    return "error" not in _parse_ppd_reply(raw_reply)
+
 
 def generate_ppd_score(
     user_text: str,
@@ -46,26 +66,71 @@ def generate_ppd_score(
             [],
         )
 
+    rag_results = retrieve(_retrieval_query(user_text), INDEX_DIR, k=k)
+    raw_reply = call_featherless(
+        build_ppd_messages(user_text, chat_history, rag_results),
+        temperature=PPD_TEMPERATURE,
+        cache=_llm_cache(),
+        accept=_valid_reply,
+    )
+    return _parse_ppd_reply(raw_reply), rag_results
+
+
+async def agenerate_ppd_score(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    k: int = 10,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Async generate_ppd_score; same inputs and result format."""
+    user_text = (user_text or "").strip()
+    if not user_text:
+        return (
+            {
+                "error": "empty_input",
+                "message": "Please provide symptoms, thoughts/feelings, or context so I can assess PPD risk.",
+            },
+            [],
+        )
+
+    rag_results = await aretrieve(_retrieval_query(user_text), INDEX_DIR, k=k)
+    messages = await asyncio.to_thread(build_ppd_messages, user_text, chat_history, rag_results)
+    raw_reply = await acall_featherless(
+        messages, temperature=PPD_TEMPERATURE, cache=_llm_cache(), accept=_valid_reply
+    )
+    return _parse_ppd_reply(raw_reply), rag_results
+
+
+def _retrieval_query(user_text: str) -> str:
     # Retrieval query tuned to pull:
     # - the symptoms->category dataset chunk(s)
     # - category definitions, thresholds, mappings
     # - any clinical guidance text you indexed
-    retrieval_query = (
+    # The prefix is embedded together with the user text each time; only a
+    # re-score of the same text hits the query embedding cache.
+    return (
         "postpartum depression symptoms dataset categories mapping thresholds "
         "severity levels five categories rubric + "
         + user_text
     )
 
-    rag_results = retrieve(retrieval_query, INDEX_DIR, k=k)
 
-    # Build a concise RAG block (truncate each chunk to control prompt size)
-    rag_lines: List[str] = []
-    for r in rag_results:
-        src = r.get("meta", {}).get("source", "unknown")
-        page = r.get("meta", {}).get("page", "?")
-        chunk = (r.get("text") or "")[:1400]
-        rag_lines.append(f"[{src} p.{page}] {chunk}")
-    rag_block = "\n\n".join(rag_lines)
+def build_ppd_messages(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]],
+    rag_results: List[Dict[str, Any]],
+) -> List[Dict[str, str]]:
+    # Nearest respondents in the survey datasets, matched on the answers the user's
+    # messages give; their raw CSV rows then don't need to take up the context budget
+    said = [user_text] + [m.get("content") or "" for m in chat_history or [] if m.get("role") == "user"]
+    survey_block, survey_results = survey_evidence("\n".join(said))
+    surveyed = {r["survey"] for r in survey_results}
+    rag_results = [
+        r for r in rag_results
+        if not ((r.get("meta") or {}).get("type") == "csv" and (r.get("meta") or {}).get("source") in surveyed)
+    ]
+
+    # Overlapping chunks merged, duplicates dropped, packed to a token budget
+    rag_block, _ = pack_context(rag_results, PPD_CONTEXT_TOKENS)
 
     # System prompt: make the model behave like a scorer + classifier, not a chatbot
     messages: List[Dict[str, str]] = [
@@ -94,8 +159,8 @@ def generate_ppd_score(
     ]
 
     if chat_history:
-        # For scoring, we only need recent context; but keep as-is if you want full history.
-        messages.extend(chat_history)
+        # For scoring, recent context is enough: the newest messages within the history budget
+        messages.extend(trim_history(chat_history))
 
     # User prompt: enforce the exact output schema and evidence behavior
     messages.append(
@@ -112,7 +177,9 @@ def generate_ppd_score(
                 "Evidence rules:\n"
                 "- Include up to 5 evidence items.\n"
                 "- Each evidence item must include a short quote and its exact citation tag.\n"
-                "- If the docs do not define categories clearly, set confidence <= 0.4 and explain what is missing.\n\n"
+                "- If the docs do not define categories clearly, set confidence <= 0.4 and explain what is missing.\n"
+                "- Survey Dataset Evidence shows how survey respondents who answered like the user were labelled "
+                "(PHQ9/EPDS results); weigh it when choosing the category and cite its [... neighbours] tag.\n\n"
                 "Return JSON with exactly these keys:\n"
                 "{\n"
                 '  "category": string,\n'
@@ -126,14 +193,18 @@ def generate_ppd_score(
                 '  "safety_flag": {"risk": "none"|"urgent", "reason": string, "recommended_action": string}\n'
                 "}\n\n"
                 f"USER_TEXT:\n{user_text}\n\n"
+                "Survey Dataset Evidence:\n"
+                f"{survey_block if survey_block else '(none)'}\n\n"
                 "Retrieved Documents:\n"
                 f"{rag_block if rag_block else '(none)'}\n"
             ),
         }
     )
 
-    raw_reply = call_featherless(messages)
+    return messages
+
 
+def _parse_ppd_reply(raw_reply: str) -> Dict[str, Any]:
     # Try parsing strict JSON. If the model returns extra text, do a best-effort extraction.
     result: Dict[str, Any]
     try:
@@ -156,4 +227,4 @@ def generate_ppd_score(
                 "raw_reply": raw_reply,
             }
 
-    return result, rag_results
\ No newline at end of file
+    return result
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(_normalize(text).encode("utf-8")).hexdigest()
+
+
+# Row keys are fixed-width hex digests, one per line, so a row's byte offset in
+# keys.txt is known without reading it
+_KEY_LINE = len(text_hash("")) + 1
+
+
+class EmbeddingCache:
+    """
+    On-disk, append-only embedding store for one model:
+    - vectors.f32: raw float32 matrix (n_rows x dim), appended to and read through np.memmap
+    - keys.txt:    the text hash of each row, one per line, appended in step with vectors.f32
+    - meta.json:   {"dim": int}
+
+    Keys are hashes of whitespace-normalized chunk text, so re-chunking or
+    re-ingesting identical text reuses the stored vectors. add() only appends the
+    new rows, so its cost follows the change, not the size of the cache. Rows
+    that only made it into one of the two files (an interrupted add) are ignored
+    and overwritten by the next add. A cache in the older rows.json layout
+    ({"dim", "rows": {text_hash: row}}) is converted on first open.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        safe_model = model_name.replace("/", "__")
+        self.dir = os.path.join(cache_dir, safe_model)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.keys_path = os.path.join(self.dir, "keys.txt")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.legacy_rows_path = os.path.join(self.dir, "rows.json")
+
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self.n_rows = 0
+        try:
+            if not os.path.exists(self.keys_path) and os.path.exists(self.legacy_rows_path):
+                self._convert_legacy()
+            self._load()
+        except (OSError, ValueError):
+            self.dim, self.rows, self.n_rows = None, {}, 0
+
+    def _load(self) -> None:
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f).get("dim")
+        if not self.dim or not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "r", encoding="ascii") as f:
+            keys = f.read().split()
+        n_vectors = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        self.n_rows = min(len(keys), n_vectors)
+        for row, key in enumerate(keys[:self.n_rows]):
+            self.rows.setdefault(key, row)
+
+    def _convert_legacy(self) -> None:
+        with open(self.legacy_rows_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        rows = data.get("rows", {})
+        keys = sorted(rows, key=rows.get)
+        with open(self.keys_path + ".tmp", "w", encoding="ascii") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        self._write_meta(data.get("dim"))
+        os.replace(self.keys_path + ".tmp", self.keys_path)
+        os.remove(self.legacy_rows_path)
+
+    def _write_meta(self, dim: Optional[int]) -> None:
+        with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": dim}, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _matrix(self) -> Optional[np.ndarray]:
+        if not self.n_rows or not self.dim or not os.path.exists(self.vectors_path):
+            return None
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.n_rows, self.dim))
+
+    def lookup(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Returns ({position: vector} for cached texts, [positions of missing texts]).
+        """
+        hits: Dict[int, np.ndarray] = {}
+        missing: List[int] = []
+        mat = self._matrix()
+
+        for pos, text in enumerate(texts):
+            row = self.rows.get(text_hash(text)) if mat is not None else None
+            if row is None:
+                missing.append(pos)
+            else:
+                hits[pos] = np.array(mat[row])
+        return hits, missing
+
+    def add(self, texts: List[str], vectors: np.ndarray) -> None:
+        if not texts:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        os.makedirs(self.dir, exist_ok=True)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._write_meta(self.dim)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim mismatch: cache has {self.dim}, got {vectors.shape[1]}")
+
+        fresh: List[int] = []
+        keys: List[str] = []
+        for i, text in enumerate(texts):
+            key = text_hash(text)
+            if key not in self.rows:
+                self.rows[key] = self.n_rows + len(fresh)
+                fresh.append(i)
+                keys.append(key)
+        if not fresh:
+            return
+
+        # Drop any tail left by an interrupted add before appending
+        for path, size in ((self.vectors_path, self.n_rows * self.dim * 4), (self.keys_path, self.n_rows * _KEY_LINE)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+        # Vectors first: a key is only ever read back once its vector is on disk
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors[fresh].tobytes())
+        with open(self.keys_path, "a", encoding="ascii") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        self.n_rows += len(fresh)
+
+
+def encode_with_cache(texts: List[str], model_name: str, cache_dir: str, model=None) -> np.ndarray:
+    """
+    Embed texts, reusing cached vectors and sending only unseen text through the model.
+    The encoder is only loaded when there is at least one cache miss, and then
+    it is the process-wide one from retrieve.get_encoder (loading a model takes
+    seconds; worker jobs and index rebuilds must not pay that per call).
+    """
+    cache = EmbeddingCache(cache_dir, model_name)
+    hits, missing = cache.lookup(texts)
+
+    fresh = None
+    if missing:
+        if model is None:
+            from .retrieve import get_encoder
+            model = get_encoder(model_name)
+        missing_texts = [texts[i] for i in missing]
+        fresh = model.encode(missing_texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+        cache.add(missing_texts, fresh)
+
+    dim = cache.dim if cache.dim is not None else 0
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for pos, vec in hits.items():
+        out[pos] = vec
+    if fresh is not None:
+        out[missing] = fresh
+    return out
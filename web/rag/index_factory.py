@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+INDEX_PARAMS_NAME = "index_params.json"
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+DEFAULT_CONFIG: Dict[str, Any] = {"type": "flat"}
+
+
+def _default_nlist(n_vectors: int) -> int:
+    # Rule of thumb: ~4 * sqrt(N) lists, with enough training points per list
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39 or 1))
+
+
+def _default_pq_m(dim: int) -> int:
+    # Largest sub-quantizer count <= dim / 8 that divides dim
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def resolve_config(config: Optional[Dict[str, Any]], dim: int, n_vectors: int) -> Dict[str, Any]:
+    """
+    Fill in defaults for an index config. Falls back to "flat" when there are
+    too few vectors to train the requested index type.
+    """
+    cfg = dict(DEFAULT_CONFIG)
+    cfg.update(config or {})
+    kind = cfg["type"]
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Expected one of {INDEX_TYPES}")
+
+    if kind in ("ivf_flat", "ivf_pq"):
+        cfg.setdefault("nlist", _default_nlist(n_vectors))
+        cfg.setdefault("nprobe", max(1, cfg["nlist"] // 16))
+        min_train = cfg["nlist"]
+        if kind == "ivf_pq":
+            cfg.setdefault("m", _default_pq_m(dim))
+            cfg.setdefault("nbits", 8)
+            min_train = max(min_train, 1 << cfg["nbits"])
+        if n_vectors < min_train:
+            return dict(DEFAULT_CONFIG)
+    elif kind == "hnsw":
+        cfg.setdefault("M", 32)
+        cfg.setdefault("ef_construction", 200)
+        cfg.setdefault("ef_search", 64)
+    return cfg
+
+
+def make_index(config: Dict[str, Any], embeddings: np.ndarray, train_sample: int = 50_000, seed: int = 0):
+    """
+    Build and fill an inner-product index of the configured type.
+    IVF indexes are trained on a random sample of at most train_sample vectors.
+    Returns (index, resolved_config).
+    """
+    n, dim = embeddings.shape
+    cfg = resolve_config(config, dim, n)
+    kind = cfg["type"]
+
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, cfg["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = cfg["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, cfg["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, cfg["nlist"], cfg["m"], cfg["nbits"], faiss.METRIC_INNER_PRODUCT)
+
+        sample = embeddings
+        if n > train_sample:
+            rng = np.random.default_rng(seed)
+            sample = embeddings[rng.choice(n, train_sample, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+
+    apply_search_params(index, cfg)
+    index.add(embeddings)
+    return index, cfg
+
+
+def apply_search_params(index, config: Dict[str, Any]) -> None:
+    if "nprobe" in config and hasattr(index, "nprobe"):
+        index.nprobe = int(config["nprobe"])
+    if "ef_search" in config and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(config["ef_search"])
+
+
+def search_subset(index, queries: np.ndarray, k: int, ids: np.ndarray):
+    """
+    index.search restricted to the vectors with the given ids (sorted int64).
+    Flat and IVF indexes take an id selector (IVF then probes every list, since
+    the few allowed vectors can sit anywhere). HNSW graph walks lose recall under
+    a sparse filter, so its subset is scored exactly from the stored vectors.
+    """
+    if not len(ids):
+        return np.full((len(queries), k), -np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)
+
+    if hasattr(index, "hnsw"):
+        vectors = index.reconstruct_batch(ids)
+        scores = queries @ vectors.T
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        out_scores[:, :top.shape[1]] = np.take_along_axis(scores, top, axis=1)
+        out_ids[:, :top.shape[1]] = ids[top]
+        return out_scores, out_ids
+
+    selector = faiss.IDSelectorBatch(ids)
+    if hasattr(index, "nprobe"):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=int(index.nlist))
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
+
+
+def supports_compacting_remove(index) -> bool:
+    # IndexFlat renumbers ids on remove_ids; IVF keeps the old labels and HNSW can't remove at all
+    return isinstance(index, faiss.IndexFlat)
+
+
+def save_index(index, snap_dir: str, config: Dict[str, Any]) -> None:
+    faiss.write_index(index, os.path.join(snap_dir, "index.faiss"))
+    with open(os.path.join(snap_dir, INDEX_PARAMS_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+
+
+def load_index_config(snap_dir: str) -> Dict[str, Any]:
+    path = os.path.join(snap_dir, INDEX_PARAMS_NAME)
+    if not os.path.exists(path):
+        return dict(DEFAULT_CONFIG)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index(snap_dir: str):
+    """Read index.faiss and re-apply the persisted nprobe/efSearch."""
+    index = faiss.read_index(os.path.join(snap_dir, "index.faiss"))
+    apply_search_params(index, load_index_config(snap_dir))
+    return index
+
+
+# ---------- Recall vs latency report ----------
+def recall_latency_report(
+    embeddings: np.ndarray,
+    configs: List[Dict[str, Any]],
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Compare index configs against exact flat search.
+    Queries are a random sample of the corpus vectors with small noise added.
+    """
+    rng = np.random.default_rng(seed)
+    n, dim = embeddings.shape
+    q_ids = rng.choice(n, min(n_queries, n), replace=False)
+    queries = embeddings[q_ids] + rng.normal(0, 0.05, size=(len(q_ids), dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(embeddings)
+    _, truth = exact.search(queries, k)
+
+    rows: List[Dict[str, Any]] = []
+    for config in configs:
+        t0 = time.perf_counter()
+        index, cfg = make_index(config, embeddings, seed=seed)
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for q in queries:
+            index.search(q[None, :], k)
+        latency_ms = (time.perf_counter() - t0) / len(queries) * 1000
+
+        _, found = index.search(queries, k)
+        hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+        rows.append({
+            "config": cfg,
+            "recall_at_k": hits / float(truth.size),
+            "latency_ms": latency_ms,
+            "build_s": build_s,
+        })
+    return rows
+
+
+def _corpus_embeddings(index_dir: str, model_name: str) -> np.ndarray:
+    from .chunk_store import load_chunks
+    from .embed_cache import encode_with_cache
+    from .snapshots import current_snapshot_dir
+
+    chunks = load_chunks(current_snapshot_dir(index_dir))
+    texts = [c["text"] for c in chunks]
+    return encode_with_cache(texts, model_name, os.path.join(index_dir, "embed_cache"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency report for RAG index types")
+    parser.add_argument("--index-dir", default="rag_index")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    emb = _corpus_embeddings(args.index_dir, args.model_name)
+    configs = [
+        {"type": "flat"},
+        {"type": "ivf_flat", "nprobe": 1},
+        {"type": "ivf_flat", "nprobe": 8},
+        {"type": "ivf_flat", "nprobe": 32},
+        {"type": "ivf_pq", "nprobe": 8},
+        {"type": "ivf_pq", "nprobe": 32},
+        {"type": "hnsw", "ef_search": 16},
+        {"type": "hnsw", "ef_search": 64},
+        {"type": "hnsw", "ef_search": 128},
+    ]
+
+    print(f"{len(emb)} vectors, dim={emb.shape[1]}, k={args.k}")
+    print(f"{'config':<55} {'recall@k':>9} {'ms/query':>9} {'build s':>8}")
+    for row in recall_latency_report(emb, configs, k=args.k, n_queries=args.queries):
+        cfg = json.dumps(row["config"], sort_keys=True)
+        print(f"{cfg:<55} {row['recall_at_k']:>9.3f} {row['latency_ms']:>9.3f} {row['build_s']:>8.2f}")
@@ -1,14 +1,38 @@
 import os
 import glob
 import csv
-import pickle
+import json
+import hashlib
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Sequence, Tuple, Optional
+
+import argparse
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script (python web/rag/ingest.py): re-run as the rag.ingest module
+    # so the package-relative imports below resolve
+    import sys
+    import runpy
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    runpy.run_module("rag.ingest", run_name="__main__", alter_sys=True)
+    sys.exit()
 
 import numpy as np
-import faiss
 from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
+
+from .embed_cache import encode_with_cache
+from .chunk_store import has_chunks, load_chunks, write_chunk_store
+from .snapshots import current_snapshot_dir, new_snapshot_dir, publish_snapshot
+from .index_factory import (
+    INDEX_TYPES,
+    DEFAULT_CONFIG,
+    load_index,
+    load_index_config,
+    make_index,
+    save_index,
+    supports_compacting_remove,
+)
 
 
 @dataclass
@@ -117,28 +141,191 @@ def load_csv_chunks(
     return out
 
 
+def _write_snapshot(
+    index_dir: str,
+    index: Any,
+    index_config: Dict[str, Any],
+    chunks: List[Dict[str, Any]],
+    manifest: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Write index + chunks (+ manifest) into a fresh snapshot directory and flip
+    the CURRENT pointer to it, so readers always see a matching index/chunks pair.
+    Returns the published snapshot version.
+    """
+    snap_dir = new_snapshot_dir(index_dir)
+    save_index(index, snap_dir, index_config)
+    write_chunk_store(snap_dir, chunks)
+
+    if manifest is not None:
+        _save_manifest(snap_dir, manifest)
+    return publish_snapshot(index_dir, snap_dir)
+
+
+def _embed_cache_dir(index_dir: str, cache_dir: Optional[str]) -> str:
+    return cache_dir or os.path.join(index_dir, "embed_cache")
+
+
 def build_faiss_index(
     chunks: List[Chunk],
     index_dir: str,
     model_name: str = "all-MiniLM-L6-v2",
-) -> None:
+    cache_dir: Optional[str] = None,
+    manifest: Optional[Dict[str, Any]] = None,
+    index_config: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Embed all chunks and publish a new snapshot with an index of the configured
+    type (flat, ivf_flat, ivf_pq or hnsw; see index_factory). Returns the snapshot version.
+    """
     os.makedirs(index_dir, exist_ok=True)
 
-    model = SentenceTransformer(model_name)
     texts = [c.text for c in chunks]
 
-    embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+    # Unchanged chunk text is served from the embedding cache; only new text hits the model
+    embeddings = encode_with_cache(texts, model_name, _embed_cache_dir(index_dir, cache_dir))
+
+    index, resolved = make_index(index_config or DEFAULT_CONFIG, embeddings)
+
+    serializable = [{"text": c.text, "meta": c.meta} for c in chunks]
+    return _write_snapshot(index_dir, index, resolved, serializable, manifest)
+
+
+def update_faiss_index(
+    new_chunks: List[Chunk],
+    index_dir: str,
+    model_name: str = "all-MiniLM-L6-v2",
+    stale_sources: Optional[List[str]] = None,
+    cache_dir: Optional[str] = None,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Derive a new snapshot from the current one:
+    - drop every vector/chunk whose meta["source"] is in stale_sources
+    - embed only new_chunks and append them with index.add
+    Returns the total number of chunks in the updated index.
+    """
+    src_dir = current_snapshot_dir(index_dir)
+    index = load_index(src_dir)
+    config = load_index_config(src_dir)
+    chunks: List[Dict[str, Any]] = list(load_chunks(src_dir))
+    embed_dir = _embed_cache_dir(index_dir, cache_dir)
+
+    stale = set(stale_sources or [])
+    drop_ids = [i for i, c in enumerate(chunks) if c["meta"].get("source") in stale]
+    if drop_ids:
+        chunks = [c for c in chunks if c["meta"].get("source") not in stale]
+        if supports_compacting_remove(index):
+            # IndexFlat compacts ids on removal, which keeps them aligned with the filtered chunk list
+            index.remove_ids(np.asarray(drop_ids, dtype=np.int64))
+        else:
+            index = None
+
+    chunks.extend({"text": c.text, "meta": c.meta} for c in new_chunks)
+    if not chunks:
+        raise RuntimeError("No text chunks left in the index after removing stale sources.")
+
+    if index is None:
+        # IVF/HNSW can't drop vectors without breaking id alignment: rebuild from cached embeddings
+        embeddings = encode_with_cache([c["text"] for c in chunks], model_name, embed_dir)
+        index, config = make_index(config, embeddings)
+    elif new_chunks:
+        index.add(encode_with_cache([c.text for c in new_chunks], model_name, embed_dir))
+
+    _write_snapshot(index_dir, index, config, chunks, manifest)
+    return len(chunks)
+
+
+# ---------- Manifest (incremental ingest) ----------
+MANIFEST_NAME = "manifest.json"
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
 
-    faiss.write_index(index, os.path.join(index_dir, "index.faiss"))
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
-    # Save as plain dicts (avoid pickle class-path issues)
-    with open(os.path.join(index_dir, "chunks.pkl"), "wb") as f:
-        serializable = [{"text": c.text, "meta": c.meta} for c in chunks]
-        pickle.dump(serializable, f)
+
+def _load_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(current_snapshot_dir(index_dir), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(snap_dir: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(snap_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# Fingerprints refreshed after a no-change run (touched files); kept next to CURRENT
+# because published snapshots are never modified
+FILE_STATS_NAME = "file_stats.json"
+
+
+def _load_file_stats(index_dir: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(os.path.join(index_dir, FILE_STATS_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_file_stats(index_dir: str, stats: Dict[str, Dict[str, Any]]) -> None:
+    path = os.path.join(index_dir, FILE_STATS_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _file_entry(path: str, *previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fingerprint a source file. The content hash is only recomputed when
+    mtime/size differ from every previous entry given.
+    """
+    st = os.stat(path)
+    for prev in previous:
+        if prev and prev.get("mtime") == st.st_mtime and prev.get("size") == st.st_size:
+            return {"sha256": prev["sha256"], "mtime": st.st_mtime, "size": st.st_size}
+    return {"sha256": _file_sha256(path), "mtime": st.st_mtime, "size": st.st_size}
+
+
+# Per-user/month EMR partition PDFs written by web/pdf_generator.py (relative to web/,
+# like data/pdfs). Their flat, unique names are the chunks' meta["source"], so
+# retrieval can target one user's partitions by source prefix.
+EMR_DIR = "EMR"
+
+
+def _list_source_files(data_dir: str, extra_dirs: Sequence[str] = ()) -> List[str]:
+    paths: List[str] = []
+    for ext in ("pdf", "csv", "txt", "md"):
+        paths.extend(sorted(glob.glob(os.path.join(data_dir, f"*.{ext}"))))
+    for d in extra_dirs:
+        paths.extend(sorted(glob.glob(os.path.join(d, "*.pdf"))))
+    return paths
+
+
+def _load_file_chunks(
+    path: str,
+    chunk_size: int = 900,
+    overlap: int = 150,
+    csv_max_rows: Optional[int] = None,
+) -> List[Chunk]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        return load_pdf_chunks(path, chunk_size=chunk_size, overlap=overlap)
+    if ext == ".csv":
+        return load_csv_chunks(path, chunk_size=chunk_size, overlap=overlap, max_rows=csv_max_rows)
+    return load_textfile_chunks(path, chunk_size=chunk_size, overlap=overlap)
 
 
 def ingest_docs(
@@ -148,35 +335,127 @@ def ingest_docs(
     chunk_size: int = 900,
     overlap: int = 150,
     csv_max_rows: Optional[int] = None,
+    incremental: bool = False,
+    index_config: Optional[Dict[str, Any]] = None,
+    extra_dirs: Sequence[str] = (EMR_DIR,),
 ) -> Tuple[int, int]:
     """
-    Ingest PDFs + CSVs + TXT/MD into one shared vector index.
-    """
-    pdf_paths = sorted(glob.glob(os.path.join(data_dir, "*.pdf")))
-    csv_paths = sorted(glob.glob(os.path.join(data_dir, "*.csv")))
-    txt_paths = sorted(glob.glob(os.path.join(data_dir, "*.txt")))
-    md_paths = sorted(glob.glob(os.path.join(data_dir, "*.md")))
+    Ingest PDFs + CSVs + TXT/MD from data_dir, and the PDFs in extra_dirs (the
+    EMR partitions by default), into one shared vector index.
 
-    all_chunks: List[Chunk] = []
+    With incremental=True, files already recorded in the index manifest with an
+    unchanged content hash are skipped; only new/changed files are embedded and
+    appended, and chunks of changed/deleted files are removed. Falls back to a
+    full rebuild when there is no usable manifest or the ingest settings changed.
 
-    for p in pdf_paths:
-        all_chunks.extend(load_pdf_chunks(p, chunk_size=chunk_size, overlap=overlap))
+    index_config selects the FAISS index type (see index_factory); when omitted
+    the config recorded by the previous build is kept.
+    Returns (num_files_processed, num_chunks_written).
+    """
+    paths = _list_source_files(data_dir, extra_dirs)
+    previous = _load_manifest(index_dir)
+    if index_config is None:
+        index_config = (previous or {}).get("settings", {}).get("index", DEFAULT_CONFIG)
+
+    settings = {
+        "model_name": model_name,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "csv_max_rows": csv_max_rows,
+        "index": index_config,
+    }
+
+    manifest = previous if incremental else None
+    src_dir = current_snapshot_dir(index_dir)
+    can_update = (
+        manifest is not None
+        and manifest.get("settings") == settings
+        and os.path.exists(os.path.join(src_dir, "index.faiss"))
+        and has_chunks(src_dir)
+    )
+
+    if can_update:
+        known: Dict[str, Dict[str, Any]] = manifest.get("files", {})
+        file_stats = _load_file_stats(index_dir)
+        files: Dict[str, Dict[str, Any]] = {}
+        changed: List[str] = []
+
+        for p in paths:
+            name = os.path.basename(p)
+            entry = _file_entry(p, known.get(name), file_stats.get(name))
+            prev = known.get(name)
+            if prev is None or prev.get("sha256") != entry["sha256"]:
+                changed.append(p)
+            else:
+                entry["chunks"] = prev.get("chunks", 0)
+            files[name] = entry
+
+        stale = [name for name in known if name not in files]
+        stale.extend(os.path.basename(p) for p in changed if os.path.basename(p) in known)
+
+        if not changed and not stale:
+            # Remember mtimes that changed without a content change, so the files
+            # aren't hashed again next time (outside the published snapshot)
+            fresh = {name: {k: e[k] for k in ("sha256", "mtime", "size")} for name, e in files.items()}
+            if fresh != file_stats:
+                _save_file_stats(index_dir, fresh)
+            return 0, 0
+
+        new_chunks: List[Chunk] = []
+        for p in changed:
+            file_chunks = _load_file_chunks(p, chunk_size=chunk_size, overlap=overlap, csv_max_rows=csv_max_rows)
+            files[os.path.basename(p)]["chunks"] = len(file_chunks)
+            new_chunks.extend(file_chunks)
+
+        update_faiss_index(
+            new_chunks,
+            index_dir=index_dir,
+            model_name=model_name,
+            stale_sources=stale,
+            manifest={"settings": settings, "files": files},
+        )
+        return len(changed), len(new_chunks)
 
-    for p in csv_paths:
-        all_chunks.extend(load_csv_chunks(p, chunk_size=chunk_size, overlap=overlap, max_rows=csv_max_rows))
+    all_chunks: List[Chunk] = []
+    files = {}
 
-    for p in txt_paths + md_paths:
-        all_chunks.extend(load_textfile_chunks(p, chunk_size=chunk_size, overlap=overlap))
+    for p in paths:
+        file_chunks = _load_file_chunks(p, chunk_size=chunk_size, overlap=overlap, csv_max_rows=csv_max_rows)
+        entry = _file_entry(p)
+        entry["chunks"] = len(file_chunks)
+        files[os.path.basename(p)] = entry
+        all_chunks.extend(file_chunks)
 
     if not all_chunks:
         raise RuntimeError(f"No text chunks extracted. Check files in: {data_dir}")
 
-    build_faiss_index(all_chunks, index_dir=index_dir, model_name=model_name)
+    build_faiss_index(
+        all_chunks,
+        index_dir=index_dir,
+        model_name=model_name,
+        manifest={"settings": settings, "files": files},
+        index_config=index_config,
+    )
 
-    num_files = len(pdf_paths) + len(csv_paths) + len(txt_paths) + len(md_paths)
-    return num_files, len(all_chunks)
+    return len(paths), len(all_chunks)
 
 
 if __name__ == "__main__":
-    n_files, n_chunks = ingest_docs()
-    print(f"Ingested {n_files} files into {n_chunks} chunks. Index saved to {os.path.abspath('rag_index')}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest documents into the RAG index")
+    parser.add_argument("--incremental", action="store_true", help="only embed new/changed files")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, help="default: keep the previous index type")
+    parser.add_argument("--nlist", type=int, help="IVF: number of inverted lists")
+    parser.add_argument("--nprobe", type=int, help="IVF: lists scanned per query")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ: number of sub-quantizers")
+    parser.add_argument("--ef-search", type=int, help="HNSW: search depth")
+    args = parser.parse_args()
+
+    index_config = None
+    if args.index_type:
+        index_config = {"type": args.index_type}
+        for key, value in (("nlist", args.nlist), ("nprobe", args.nprobe), ("m", args.pq_m), ("ef_search", args.ef_search)):
+            if value is not None:
+                index_config[key] = value
+
+    n_files, n_chunks = ingest_docs(incremental=args.incremental, index_config=index_config)
+    print(f"Ingested {n_files} files into {n_chunks} chunks. Index saved to {os.path.abspath('rag_index')}")
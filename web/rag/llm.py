@@ -1,33 +1,130 @@
 import os
-import requests
+import asyncio
 
 from dotenv import load_dotenv
 load_dotenv()
 
+from .llm_client import LLMError, async_client_from_env, client_from_env
+
 FEATHERLESS_API_KEY = os.getenv("FEATHERLESS_API_KEY")
-API_URL = "https://api.featherless.ai/v1/chat/completions"
+API_URL = os.getenv("FEATHERLESS_API_URL", "https://api.featherless.ai/v1/chat/completions")
+
+# Shared pooled client (keep-alive, retries, circuit breaker); see llm_client.py
+_client = client_from_env()
+
+
+# httpx clients are tied to the event loop that opened them. Under ASGI the server's
+# loop lives for the whole process: the lifespan handler (llm_ppd/asgi.py) opens one
+# pooled async client on it and closes it on shutdown. Elsewhere (WSGI/runserver runs
+# each async view in a throwaway loop) async calls use the sync client on a thread.
+_async_client = None
+_async_loop = None
+
+
+def get_client():
+    return _client
+
+
+def open_async_client():
+    """Open the shared async client on the running (long-lived) loop"""
+    global _async_client, _async_loop
+    _async_loop = asyncio.get_running_loop()
+    _async_client = async_client_from_env(breaker=_client.breaker)
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client, _async_loop
+    client, _async_client, _async_loop = _async_client, None, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_async_client():
+    """The shared async client if it belongs to the running loop, else None"""
+    global _async_client, _async_loop
+    if _async_client is None:
+        return None
+    if _async_loop.is_closed():
+        # Server loop gone without a lifespan shutdown; its connections went with it
+        _async_client = _async_loop = None
+        return None
+    return _async_client if asyncio.get_running_loop() is _async_loop else None
+
+
+async def _athread_stream(tokens):
+    # Pull a blocking token iterator from a worker thread, one token at a time
+    done = object()
+    try:
+        while True:
+            token = await asyncio.to_thread(next, tokens, done)
+            if token is done:
+                return
+            yield token
+    finally:
+        try:
+            tokens.close()
+        except ValueError:
+            # Cancelled while a thread is inside next(): the generator closes its
+            # response when that call returns and the generator is collected
+            pass
 
-def call_featherless(messages, model="deepseek-ai/DeepSeek-V3-0324", temperature=0.7, timeout=60):
-    if not FEATHERLESS_API_KEY:
-        raise RuntimeError(
+
+def call_featherless(messages, model="deepseek-ai/DeepSeek-V3-0324", temperature=0.7, timeout=None,
+                     cache=None, accept=None):
+    """
+    cache: an llm_cache.LLMCache to answer repeated prompts from (and single-flight
+    concurrent ones); accept(reply) decides whether a fresh reply is stored.
+    """
+    if cache is not None:
+        return cache.call(messages, model, temperature,
+                          lambda: call_featherless(messages, model, temperature, timeout), accept)
+
+    if not _client.api_key:
+        raise LLMError(
+            "FEATHERLESS_API_KEY is not set."
+        )
+
+    # timeout overrides the read timeout only; the connect timeout stays short
+    return _client.chat(messages, model=model, temperature=temperature, timeout=timeout)
+
+
+def stream_featherless(messages, model="deepseek-ai/DeepSeek-V3-0324", temperature=0.7, timeout=None):
+    """Like call_featherless, but yields the reply token by token."""
+    if not _client.api_key:
+        raise LLMError(
             "FEATHERLESS_API_KEY is not set."
         )
 
-    headers = {
-        "Authorization": f"Bearer {FEATHERLESS_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    return _client.chat_stream(messages, model=model, temperature=temperature, timeout=timeout)
 
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": temperature,
-    }
 
-    resp = requests.post(API_URL, headers=headers, json=payload, timeout=timeout)
+async def acall_featherless(messages, model="deepseek-ai/DeepSeek-V3-0324", temperature=0.7, timeout=None,
+                            cache=None, accept=None):
+    """Async call_featherless: awaits the reply without holding a thread."""
+    if cache is not None:
+        return await cache.acall(messages, model, temperature,
+                                 lambda: acall_featherless(messages, model, temperature, timeout), accept)
 
-    if resp.status_code != 200:
-        raise RuntimeError(f"Featherless error HTTP {resp.status_code}: {resp.text}")
+    if not _client.api_key:
+        raise LLMError(
+            "FEATHERLESS_API_KEY is not set."
+        )
+
+    client = get_async_client()
+    if client is None:
+        return await asyncio.to_thread(_client.chat, messages, model=model, temperature=temperature, timeout=timeout)
+    return await client.chat(messages, model=model, temperature=temperature, timeout=timeout)
+
+
+def astream_featherless(messages, model="deepseek-ai/DeepSeek-V3-0324", temperature=0.7, timeout=None):
+    """Async stream_featherless: returns an async iterator of reply tokens."""
+    if not _client.api_key:
+        raise LLMError(
+            "FEATHERLESS_API_KEY is not set."
+        )
 
-    data = resp.json()
-    return data["choices"][0]["message"]["content"]
\ No newline at end of file
+    client = get_async_client()
+    if client is None:
+        return _athread_stream(_client.chat_stream(messages, model=model, temperature=temperature, timeout=timeout))
+    return client.chat_stream(messages, model=model, temperature=temperature, timeout=timeout)
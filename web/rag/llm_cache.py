@@ -0,0 +1,293 @@
+"""
+Response cache for LLM calls, shared by every process on the machine.
+
+- Entries are keyed by (model, temperature, hash of the canonicalized messages)
+  and stored in a local SQLite file with a TTL; past LLM_CACHE_MAX_MB the least
+  recently used entries are evicted.
+- Concurrent identical calls in a process are single-flighted: one goes upstream,
+  the others wait for its reply.
+- Pipelines opt in (see RAG_PPD_LLM_CACHE / RAG_CHAT_LLM_CACHE); a cached reply
+  only makes sense where the same prompt should get the same answer.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import weakref
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+LLM_CACHE_DB_NAME = "llm_cache.sqlite3"
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag_index", LLM_CACHE_DB_NAME
+)
+
+LLM_CACHE_PATH = os.environ.get("RAG_LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+LLM_CACHE_TTL = float(os.environ.get("RAG_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_MB = float(os.environ.get("RAG_LLM_CACHE_MAX_MB", "64"))
+
+# Check the size limit every this many writes; evict down to this fraction of it
+EVICT_EVERY = 50
+EVICT_TO = 0.9
+
+
+def canonical_messages(messages: List[Dict[str, str]]) -> str:
+    """Only role and content count; line endings and surrounding whitespace don't"""
+    return json.dumps(
+        [
+            {"role": m.get("role", ""), "content": (m.get("content") or "").replace("\r\n", "\n").strip()}
+            for m in messages
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def cache_key(messages: List[Dict[str, str]], model: str, temperature: float) -> str:
+    h = hashlib.sha256()
+    h.update(f"{model}\0{float(temperature)!r}\0".encode("utf-8"))
+    h.update(canonical_messages(messages).encode("utf-8"))
+    return h.hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _LeaderCancelled(Exception):
+    """The async call followers were waiting on was cancelled; one of them runs it instead"""
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one run of the function (threads and event loops alike)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        # asyncio futures belong to one loop, so async flights are kept per loop
+        self._async_flights: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        flights = self._async_flights.setdefault(loop, {})
+        while True:
+            future = flights.get(key)
+            if future is None:
+                break
+            try:
+                # shield: a follower giving up must not cancel the leader's call
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # The leader's caller went away (e.g. a client disconnected):
+                # the first follower to wake up leads a new flight
+                continue
+
+        future = flights[key] = loop.create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Only this caller was cancelled; the followers still want the reply
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a flight nobody else joined doesn't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            del flights[key]
+
+
+class LLMCache:
+    """
+    SQLite table of replies: key, model, temperature, reply, created_at,
+    accessed_at (for LRU eviction) and size in bytes.
+    """
+
+    def __init__(self, db_path: str, ttl: float = LLM_CACHE_TTL, max_mb: float = LLM_CACHE_MAX_MB):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._stats_lock = threading.Lock()
+        self._flights = SingleFlight()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    temperature REAL NOT NULL,
+                    reply TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed_at);
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT reply FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0] if row is not None else None
+
+    def put(self, key: str, reply: str, model: str, temperature: float) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, temperature, reply, created_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, float(temperature), reply, now, now, len(reply.encode("utf-8")) + len(key)),
+            )
+            with self._stats_lock:
+                self._writes += 1
+                evict = self._writes % EVICT_EVERY == 1
+            if evict:
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO)
+        cutoff = None
+        for accessed_at, size in conn.execute("SELECT accessed_at, size FROM responses ORDER BY accessed_at"):
+            excess -= size
+            cutoff = accessed_at
+            if excess <= 0:
+                break
+        conn.execute("DELETE FROM responses WHERE accessed_at <= ?", (cutoff,))
+
+    def clear(self) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM responses")
+        with self._stats_lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._stats_lock:
+            return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def call(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        fetch: Callable[[], str],
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """
+        Cached reply for this prompt, or fetch() it (once for all concurrent callers)
+        and store it if accept(reply) allows.
+        """
+        key = cache_key(messages, model, temperature)
+        reply = self.get(key)
+        self._count(reply is not None)
+        if reply is not None:
+            return reply
+
+        def leader() -> str:
+            # Another process may have stored it meanwhile
+            reply = self.get(key)
+            if reply is None:
+                reply = fetch()
+                if accept is None or accept(reply):
+                    self.put(key, reply, model, temperature)
+            return reply
+
+        return self._flights.do(key, leader)
+
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        fetch: Callable[[], Awaitable[str]],
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """Async call(): the SQLite reads/writes run in a thread, fetch() is awaited."""
+        key = cache_key(messages, model, temperature)
+        reply = await asyncio.to_thread(self.get, key)
+        self._count(reply is not None)
+        if reply is not None:
+            return reply
+
+        async def leader() -> str:
+            reply = await asyncio.to_thread(self.get, key)
+            if reply is None:
+                reply = await fetch()
+                if accept is None or accept(reply):
+                    await asyncio.to_thread(self.put, key, reply, model, temperature)
+            return reply
+
+        return await self._flights.ado(key, leader)
+
+
+_SHARED: Optional[LLMCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_cache() -> LLMCache:
+    """The process-wide cache at RAG_LLM_CACHE_PATH, opened on first use"""
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = LLMCache(LLM_CACHE_PATH)
+    return _SHARED
@@ -0,0 +1,405 @@
+import os
+import json
+import time
+import asyncio
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMUnavailableError(LLMError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class LLMIncompleteStreamError(LLMError):
+    """A streamed reply whose body ended before [DONE] or a finish_reason (e.g. a dropped connection)."""
+
+
+@dataclass
+class CallMetrics:
+    started_at: float
+    latency_s: float
+    attempts: int
+    status: Optional[int]
+    ok: bool
+    error: Optional[str] = None
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls
+    for `reset_after` seconds; then lets one trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_after or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self) -> None:
+        """Give back a half-open trial that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class _BaseClient:
+    """Config, retry policy, circuit breaker and metrics shared by the sync and async clients."""
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: Optional[str],
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_size: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+        metrics_window: int = 500,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+
+        self._metrics: Deque[CallMetrics] = deque(maxlen=metrics_window)
+        self._metrics_lock = threading.Lock()
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.api_key:
+            raise LLMError("FEATHERLESS_API_KEY is not set.")
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, metrics: CallMetrics) -> None:
+        with self._metrics_lock:
+            self._metrics.append(metrics)
+
+    def _check_breaker(self) -> None:
+        if not self.breaker.allow():
+            raise LLMUnavailableError("LLM backend temporarily unavailable (circuit open).")
+
+    def _succeeded(self, started: float, t0: float, attempts: int, status: int) -> None:
+        self.breaker.record_success()
+        self._record(CallMetrics(started, time.perf_counter() - t0, attempts, status, True))
+
+    def _failed(self, started: float, t0: float, attempts: int, status: Optional[int], error: str) -> LLMError:
+        # Client errors (4xx other than 429) are our fault, not the backend's: they
+        # neither count towards opening the breaker nor reset its failure count
+        if status is None or status in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_trial()
+        self._record(CallMetrics(started, time.perf_counter() - t0, attempts, status, False, error))
+        return LLMError(error)
+
+    @staticmethod
+    def _payload(messages: List[Dict[str, str]], model: str, temperature: float, stream: bool = False) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def _parse_sse_line(line: str) -> Tuple[str, bool]:
+        """
+        (content delta, finished) for one SSE line: "" for lines without content;
+        finished at the [DONE] sentinel or a chunk carrying a finish_reason.
+        """
+        if not line or not line.startswith("data:"):
+            return "", False
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return "", True
+        try:
+            choice = json.loads(data)["choices"][0]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return "", False
+        return (choice.get("delta") or {}).get("content") or "", bool(choice.get("finish_reason"))
+
+    @staticmethod
+    def _incomplete() -> LLMIncompleteStreamError:
+        return LLMIncompleteStreamError("Featherless stream ended before the reply was complete.")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            calls = list(self._metrics)
+        latencies = sorted(m.latency_s for m in calls)
+
+        def pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)
+
+        return {
+            "calls": len(calls),
+            "errors": sum(1 for m in calls if not m.ok),
+            "retries": sum(m.attempts - 1 for m in calls),
+            "latency_p50_s": pct(0.50),
+            "latency_p95_s": pct(0.95),
+            "breaker": self.breaker.state,
+            "last": asdict(calls[-1]) if calls else None,
+        }
+
+
+class LLMClient(_BaseClient):
+    """
+    OpenAI-compatible chat completions client with:
+    - a pooled keep-alive requests.Session
+    - separate connect/read timeouts
+    - bounded retries with jittered exponential backoff on 429/5xx and connection errors
+    - a circuit breaker
+    - per-call latency/retry metrics (last `metrics_window` calls)
+    """
+
+    def __init__(self, api_url: str, api_key: Optional[str], **kwargs: Any):
+        super().__init__(api_url, api_key, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, payload: Dict[str, Any], stream: bool = False, read_timeout: Optional[float] = None) -> requests.Response:
+        """
+        POST payload to the chat completions endpoint with retries.
+        Returns the successful (HTTP 200) response; raises LLMError otherwise.
+        """
+        # Before the breaker: a config error must not take the half-open trial
+        headers = self._headers()
+        self._check_breaker()
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        started = time.time()
+        t0 = time.perf_counter()
+        attempts = 0
+
+        try:
+            while True:
+                attempts += 1
+                retry_after = None
+                try:
+                    resp = self.session.post(self.api_url, headers=headers, json=payload, timeout=timeout, stream=stream)
+                    status: Optional[int] = resp.status_code
+                    if status == 200:
+                        self._succeeded(started, t0, attempts, status)
+                        return resp
+                    error = f"Featherless error HTTP {status}: {resp.text[:500]}"
+                    retry_after = resp.headers.get("Retry-After")
+                    resp.close()
+                    retryable = status in RETRY_STATUSES
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    status = None
+                    error = f"Featherless request failed: {e}"
+                    retryable = True
+                except requests.RequestException as e:
+                    # ChunkedEncodingError, InvalidURL, ...: not worth retrying
+                    status = None
+                    error = f"Featherless request failed: {e!r}"
+                    retryable = False
+
+                if not retryable or attempts > self.max_retries:
+                    raise self._failed(started, t0, attempts, status, error)
+                time.sleep(self._backoff(attempts - 1, retry_after))
+        except BaseException:
+            # Anything that escaped unrecorded must not keep the half-open trial forever
+            self.breaker.release_trial()
+            raise
+
+    def chat(self, messages: List[Dict[str, str]], model: str, temperature: float = 0.7, timeout: Optional[float] = None) -> str:
+        resp = self.post(self._payload(messages, model, temperature), read_timeout=timeout)
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> Iterator[str]:
+        """
+        Stream a completion (OpenAI-style SSE with "stream": true) and yield
+        content deltas as they arrive. Retries only apply before the first byte.
+        Raises LLMIncompleteStreamError if the body ends without [DONE] or a
+        finish_reason, so a cut-off reply is never mistaken for a whole one.
+        """
+        resp = self.post(self._payload(messages, model, temperature, stream=True), stream=True, read_timeout=timeout)
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                token, finished = self._parse_sse_line(line)
+                if token:
+                    yield token
+                if finished:
+                    return
+            raise self._incomplete()
+        finally:
+            resp.close()
+
+
+class AsyncLLMClient(_BaseClient):
+    """
+    asyncio counterpart of LLMClient on a pooled httpx.AsyncClient, so waiting
+    on the LLM doesn't hold a thread. An httpx client is bound to the event loop
+    that first uses it, so keep one per long-lived loop (see llm.open_async_client).
+    """
+
+    def __init__(self, api_url: str, api_key: Optional[str], **kwargs: Any):
+        super().__init__(api_url, api_key, **kwargs)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def post(self, payload: Dict[str, Any], stream: bool = False, read_timeout: Optional[float] = None):
+        """Async post(): returns the HTTP 200 httpx.Response (unread if stream=True)."""
+        headers = self._headers()
+        self._check_breaker()
+        timeout = httpx.Timeout(read_timeout or self.read_timeout, connect=self.connect_timeout)
+        started = time.time()
+        t0 = time.perf_counter()
+        attempts = 0
+
+        try:
+            while True:
+                attempts += 1
+                retry_after = None
+                try:
+                    request = self.client.build_request("POST", self.api_url, headers=headers, json=payload, timeout=timeout)
+                    resp = await self.client.send(request, stream=stream)
+                    status: Optional[int] = resp.status_code
+                    if status == 200:
+                        self._succeeded(started, t0, attempts, status)
+                        return resp
+                    body = await resp.aread()
+                    await resp.aclose()
+                    error = f"Featherless error HTTP {status}: {body[:500].decode('utf-8', 'replace')}"
+                    retry_after = resp.headers.get("Retry-After")
+                    retryable = status in RETRY_STATUSES
+                except httpx.TransportError as e:
+                    status = None
+                    error = f"Featherless request failed: {e!r}"
+                    retryable = True
+                except (httpx.HTTPError, httpx.InvalidURL) as e:
+                    status = None
+                    error = f"Featherless request failed: {e!r}"
+                    retryable = False
+
+                if not retryable or attempts > self.max_retries:
+                    raise self._failed(started, t0, attempts, status, error)
+                await asyncio.sleep(self._backoff(attempts - 1, retry_after))
+        except BaseException:
+            # Cancellation included: don't keep the half-open trial forever
+            self.breaker.release_trial()
+            raise
+
+    async def chat(self, messages: List[Dict[str, str]], model: str, temperature: float = 0.7, timeout: Optional[float] = None) -> str:
+        resp = await self.post(self._payload(messages, model, temperature), read_timeout=timeout)
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        resp = await self.post(self._payload(messages, model, temperature, stream=True), stream=True, read_timeout=timeout)
+        try:
+            async for line in resp.aiter_lines():
+                token, finished = self._parse_sse_line(line)
+                if token:
+                    yield token
+                if finished:
+                    return
+            raise self._incomplete()
+        finally:
+            await resp.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def _env_config() -> Dict[str, Any]:
+    return {
+        "api_url": os.getenv("FEATHERLESS_API_URL", "https://api.featherless.ai/v1/chat/completions"),
+        "api_key": os.getenv("FEATHERLESS_API_KEY"),
+        "connect_timeout": float(os.getenv("FEATHERLESS_CONNECT_TIMEOUT", "5")),
+        "read_timeout": float(os.getenv("FEATHERLESS_READ_TIMEOUT", "60")),
+        "max_retries": int(os.getenv("FEATHERLESS_MAX_RETRIES", "2")),
+        "pool_size": int(os.getenv("FEATHERLESS_POOL_SIZE", "10")),
+    }
+
+
+def client_from_env(breaker: Optional[CircuitBreaker] = None) -> LLMClient:
+    return LLMClient(breaker=breaker, **_env_config())
+
+
+def async_client_from_env(breaker: Optional[CircuitBreaker] = None) -> AsyncLLMClient:
+    return AsyncLLMClient(breaker=breaker, **_env_config())
@@ -0,0 +1,134 @@
+"""
+Local stand-in for the Featherless chat completions API, for exercising the
+LLM client without network access or an API key.
+
+    python -m rag.llm_stub --port 8765 --fail-first 2 --delay 0.2
+    FEATHERLESS_API_URL=http://127.0.0.1:8765/v1/chat/completions FEATHERLESS_API_KEY=stub ...
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+
+class _StubState:
+    def __init__(self, reply: str, fail_first: int, fail_status: int, delay: float, cut_stream_after: Optional[int] = None):
+        self.reply = reply
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.delay = delay
+        self.cut_stream_after = cut_stream_after
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _make_handler(state: _StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, n: int) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i, word in enumerate(state.reply.split(" ")):
+                if state.cut_stream_after is not None and i >= state.cut_stream_after:
+                    # Connection dropped mid-body: no finish_reason, no [DONE]
+                    self.close_connection = True
+                    return
+                chunk = {"id": f"stub-{n}", "choices": [{"index": 0, "delta": {"content": word + " "}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if state.delay:
+                    time.sleep(state.delay / 10)
+            last = {"id": f"stub-{n}", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            self.wfile.write(f"data: {json.dumps(last)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            with state.lock:
+                state.requests += 1
+                n = state.requests
+
+            if state.delay:
+                time.sleep(state.delay)
+
+            if n <= state.fail_first:
+                self._send_json(state.fail_status, {"error": {"message": f"stub failure {n}"}})
+                return
+
+            if payload.get("stream"):
+                self._send_stream(n)
+                return
+
+            self._send_json(200, {
+                "id": f"stub-{n}",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": state.reply},
+                    "finish_reason": "stop",
+                }],
+            })
+
+    return Handler
+
+
+def start_stub_server(
+    port: int = 0,
+    reply: str = "Stub reply.",
+    fail_first: int = 0,
+    fail_status: int = 503,
+    delay: float = 0.0,
+    cut_stream_after: Optional[int] = None,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stub in a daemon thread. Returns (server, chat_completions_url);
+    server.state holds the settings (changeable while it runs) and the request count.
+    cut_stream_after drops streamed replies after that many words.
+    """
+    state = _StubState(reply, fail_first, fail_status, delay, cut_stream_after)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    return server, url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the Featherless chat completions API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reply", default="Stub reply.")
+    parser.add_argument("--fail-first", type=int, default=0, help="fail this many requests before succeeding")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before each response")
+    parser.add_argument("--cut-stream-after", type=int, help="drop streamed replies after this many words")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(
+        args.port, args.reply, args.fail_first, args.fail_status, args.delay, args.cut_stream_after
+    )
+    print(f"Stub LLM listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
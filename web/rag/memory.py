@@ -0,0 +1,275 @@
+"""
+Bounded conversation memory for chat prompts.
+
+A prompt used to carry the whole session transcript, so every turn cost more than
+the last. Instead, the history sent with a turn is:
+1) a rolling summary of the older turns, updated incrementally by the LLM on a
+   background thread (never on the request path),
+2) up to RECALL_MESSAGES older messages pulled back by embedding similarity to
+   the new question, when they are relevant,
+3) the last RECENT_TURNS turns verbatim,
+all within HISTORY_TOKENS, however long the conversation gets.
+
+Summaries are kept per process, keyed by a conversation id (the session key).
+While a summary is catching up, the messages it doesn't cover yet stay verbatim
+(up to SUMMARY_EVERY_TURNS turns) or reachable through recall.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .context import count_tokens, truncate_to_tokens
+from .llm import call_featherless
+from .retrieve import _LRUCache, get_encoder
+
+logger = logging.getLogger(__name__)
+
+# Turns (user message + reply) always sent verbatim
+RECENT_TURNS = int(os.environ.get("RAG_MEMORY_RECENT_TURNS", "4"))
+# Cap on everything a prompt carries from the conversation (summary, recalled and recent messages)
+HISTORY_TOKENS = int(os.environ.get("RAG_HISTORY_TOKENS", "1500"))
+# Length of the rolling summary
+SUMMARY_TOKENS = int(os.environ.get("RAG_SUMMARY_TOKENS", "300"))
+# Older messages recalled by similarity to the new question
+RECALL_MESSAGES = int(os.environ.get("RAG_MEMORY_RECALL", "2"))
+
+# Summarize once this many turns have left the verbatim window
+SUMMARY_EVERY_TURNS = 2
+# New messages folded into the summary per LLM call
+SUMMARY_INPUT_TOKENS = 2000
+# Cosine similarity a past message needs to be recalled
+RECALL_MIN_SIMILARITY = 0.35
+RECALL_MESSAGE_TOKENS = 150
+# Role/formatting tokens the chat template adds per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+MEMORY_MODEL = "all-MiniLM-L6-v2"
+MEMORY_CACHE_SIZE = 1024
+MEMORY_CACHE_TTL = 24 * 3600.0
+
+# conversation id -> (messages summarized, summary, fingerprint of those messages)
+_SUMMARIES = _LRUCache(MEMORY_CACHE_SIZE, ttl=MEMORY_CACHE_TTL)
+_MESSAGE_EMBEDDINGS = _LRUCache(4096, ttl=MEMORY_CACHE_TTL)
+
+# conversation id -> latest older-message list waiting to be summarized
+_PENDING: Dict[str, List[Dict[str, str]]] = {}
+_PENDING_LOCK = threading.Lock()
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a postpartum "
+    "mental health support assistant.\n"
+    "Update the current summary with the new messages. Keep what matters for later turns: "
+    "the user's situation, symptoms and feelings, anything said about safety, advice already "
+    "given, and open questions. Drop pleasantries and repetition.\n"
+    f"Write plain prose in the third person, at most {SUMMARY_TOKENS * 3 // 4} words. "
+    "Output only the summary."
+)
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def trim_history(messages: Optional[List[Dict[str, str]]], max_tokens: int = HISTORY_TOKENS) -> List[Dict[str, str]]:
+    """
+    The newest messages that fit in max_tokens, in order. The oldest message
+    kept is truncated rather than dropped when there's room for a useful part.
+    """
+    kept: List[Dict[str, str]] = []
+    remaining = max_tokens
+    for m in reversed(messages or []):
+        cost = message_tokens(m)
+        if cost > remaining:
+            room = remaining - MESSAGE_OVERHEAD_TOKENS
+            if room >= RECALL_MESSAGE_TOKENS // 3:
+                kept.append({"role": m["role"], "content": truncate_to_tokens(m["content"], room)})
+            break
+        kept.append(m)
+        remaining -= cost
+    kept.reverse()
+    return kept
+
+
+def _fingerprint(messages: List[Dict[str, str]]) -> str:
+    h = hashlib.sha1()
+    for m in messages:
+        h.update(m["role"].encode())
+        h.update(b"\0")
+        h.update(m["content"].encode("utf-8", "replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _summary_state(conversation_id: str, older: List[Dict[str, str]]) -> Tuple[int, str]:
+    """(messages covered, summary) for this transcript; (0, "") if it was cleared or edited"""
+    state = _SUMMARIES.get(conversation_id)
+    if state is None:
+        return 0, ""
+    upto, summary, fingerprint = state
+    if upto > len(older) or _fingerprint(older[:upto]) != fingerprint:
+        return 0, ""
+    return upto, summary
+
+
+def _format(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> str:
+    lines = []
+    for m in messages:
+        content = m["content"] if max_tokens is None else truncate_to_tokens(m["content"], max_tokens)
+        lines.append(f"{'User' if m['role'] == 'user' else 'Assistant'}: {content}")
+    return "\n".join(lines)
+
+
+def refresh_summary(conversation_id: str, older: List[Dict[str, str]]) -> str:
+    """
+    Fold the messages of older that the stored summary doesn't cover yet into it.
+    Blocking (one LLM call per SUMMARY_INPUT_TOKENS of new messages); see schedule_summary.
+    """
+    upto, summary = _summary_state(conversation_id, older)
+    while upto < len(older):
+        batch: List[Dict[str, str]] = []
+        used = 0
+        for m in older[upto:]:
+            cost = message_tokens(m)
+            if batch and used + cost > SUMMARY_INPUT_TOKENS:
+                break
+            batch.append(m)
+            used += cost
+
+        summary = call_featherless(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Current summary:\n{summary or '(none yet)'}\n\n"
+                        f"New messages:\n{_format(batch, SUMMARY_INPUT_TOKENS)}\n"
+                    ),
+                },
+            ],
+            temperature=0.2,
+        ).strip()
+        summary = truncate_to_tokens(summary, SUMMARY_TOKENS)
+        upto += len(batch)
+        _SUMMARIES.put(conversation_id, (upto, summary, _fingerprint(older[:upto])))
+    return summary
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _PENDING_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-memory")
+    return _EXECUTOR
+
+
+def _summarize_pending(conversation_id: str) -> None:
+    while True:
+        with _PENDING_LOCK:
+            older = _PENDING[conversation_id]
+        try:
+            refresh_summary(conversation_id, older)
+        except Exception as e:
+            logger.warning("Summary refresh for a conversation failed: %s", e)
+        with _PENDING_LOCK:
+            # A newer transcript arrived while this one was summarized: go again
+            if _PENDING[conversation_id] is older:
+                del _PENDING[conversation_id]
+                return
+
+
+def schedule_summary(conversation_id: str, older: List[Dict[str, str]]) -> None:
+    """Refresh the summary in the background; requests for a conversation already being summarized coalesce"""
+    with _PENDING_LOCK:
+        running = conversation_id in _PENDING
+        _PENDING[conversation_id] = older
+    if not running:
+        _executor().submit(_summarize_pending, conversation_id)
+
+
+def _embed(texts: List[str]) -> np.ndarray:
+    vectors: List[Any] = [_MESSAGE_EMBEDDINGS.get(t) for t in texts]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = get_encoder(MEMORY_MODEL).encode(
+            [texts[i] for i in missing],
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).astype(np.float32)
+        for row, i in enumerate(missing):
+            vectors[i] = fresh[row]
+            _MESSAGE_EMBEDDINGS.put(texts[i], fresh[row])
+    return np.stack(vectors)
+
+
+def recall(user_text: str, candidates: List[Dict[str, str]], limit: int = RECALL_MESSAGES) -> List[Dict[str, str]]:
+    """Up to limit candidates most similar to user_text (above RECALL_MIN_SIMILARITY), in conversation order"""
+    if not candidates or limit <= 0 or not user_text.strip():
+        return []
+    vectors = _embed([user_text] + [m["content"] for m in candidates])
+    scores = vectors[1:] @ vectors[0]
+    best = [int(i) for i in np.argsort(-scores)[:limit] if scores[i] >= RECALL_MIN_SIMILARITY]
+    return [candidates[i] for i in sorted(best)]
+
+
+def build_history(
+    conversation_id: Optional[str],
+    transcript: List[Dict[str, str]],
+    user_text: str,
+) -> List[Dict[str, str]]:
+    """
+    Bounded chat_history for the next reply to user_text.
+
+    transcript is the conversation so far, without user_text. Schedules a summary
+    refresh when enough turns have left the verbatim window. Without a
+    conversation_id there is no summary; the recent turns and recall still apply.
+    """
+    messages = [m for m in transcript if m.get("role") in ("user", "assistant") and m.get("content")]
+    recent_start = max(len(messages) - 2 * RECENT_TURNS, 0)
+    older = messages[:recent_start]
+
+    upto, summary = _summary_state(conversation_id, older) if conversation_id else (0, "")
+    # Not yet summarized messages stay verbatim, up to one summary batch
+    start = min(recent_start, max(upto, recent_start - 2 * SUMMARY_EVERY_TURNS))
+    if conversation_id and recent_start - upto >= 2 * SUMMARY_EVERY_TURNS:
+        schedule_summary(conversation_id, older)
+
+    history: List[Dict[str, str]] = []
+    if summary:
+        history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+
+    recalled = recall(user_text, messages[:start])
+    if recalled:
+        history.append({
+            "role": "system",
+            "content": (
+                "Earlier messages that may be relevant to the new question:\n"
+                + _format(recalled, RECALL_MESSAGE_TOKENS)
+            ),
+        })
+
+    used = sum(message_tokens(m) for m in history)
+    return history + trim_history(messages[start:], HISTORY_TOKENS - used)
+
+
+async def abuild_history(
+    conversation_id: Optional[str],
+    transcript: List[Dict[str, str]],
+    user_text: str,
+) -> List[Dict[str, str]]:
+    # Embedding and tokenizing are CPU work
+    return await asyncio.to_thread(build_history, conversation_id, transcript, user_text)
+
+
+def forget(conversation_id: Optional[str]) -> None:
+    """Drop the stored summary, e.g. when the chat is cleared"""
+    if conversation_id:
+        _SUMMARIES.put(conversation_id, (0, "", _fingerprint([])))
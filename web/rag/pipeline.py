@@ -1,37 +1,58 @@
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-from .retrieve import retrieve
-from .llm import call_featherless
+from . import answer_cache
+from .context import CHAT_CONTEXT_TOKENS, pack_context
+from .memory import trim_history
+from .retrieve import aretrieve, retrieve
+from .llm import acall_featherless, astream_featherless, call_featherless, stream_featherless
+from .llm_cache import shared_cache
     
-INDEX_DIR = "web/rag_index"
+# Absolute, so the index cache key is the same whatever the server's cwd (and matches warmup)
+INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag_index")
 print(os.getcwd())
 
-def generate_ai_reply(
+# Chat replies are sampled, so caching them is opt-in (RAG_CHAT_LLM_CACHE=1);
+# it covers the blocking replies, not the streamed ones
+CHAT_LLM_CACHE = os.environ.get("RAG_CHAT_LLM_CACHE", "0") == "1"
+
+
+def _llm_cache():
+    return shared_cache() if CHAT_LLM_CACHE else None
+
+
+def build_chat_messages(
     user_text: str,
     chat_history: Optional[List[Dict[str, str]]] = None,
     k: int = 5,
-) -> Tuple[str, List[Dict[str, Any]]]:
+) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
     """
-    Pure RAG pipeline:
-    - user_text: current user input
-    - chat_history: list like [{"role":"user","content":"..."}, {"role":"assistant","content":"..."}]
-    Returns: (assistant_reply, rag_results)
+    Retrieval + prompt assembly shared by the blocking and streaming replies.
+    Returns: (messages, rag_results)
     """
-    user_text = (user_text or "").strip()
-    if not user_text:
-        return "Please provide a message.", []
-
     rag_results = retrieve(user_text, INDEX_DIR, k=k)
+    return _messages_for(user_text, chat_history, rag_results), rag_results
+
 
-    # Build a concise RAG block (truncate each chunk to control prompt size)
-    rag_lines = []
-    for r in rag_results:
-        src = r.get("meta", {}).get("source", "unknown")
-        page = r.get("meta", {}).get("page", "?")
-        chunk = (r.get("text") or "")[:1200]
-        rag_lines.append(f"[{src} p.{page}] {chunk}")
-    rag_block = "\n\n".join(rag_lines)
+async def abuild_chat_messages(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    k: int = 5,
+) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    rag_results = await aretrieve(user_text, INDEX_DIR, k=k)
+    # Tokenizing for the budget is CPU work (and the tokenizer may still be loading)
+    messages = await asyncio.to_thread(_messages_for, user_text, chat_history, rag_results)
+    return messages, rag_results
+
+
+def _messages_for(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]],
+    rag_results: List[Dict[str, Any]],
+) -> List[Dict[str, str]]:
+    # Overlapping chunks merged, duplicates dropped, packed to a token budget
+    rag_block, _ = pack_context(rag_results, CHAT_CONTEXT_TOKENS)
 
     messages: List[Dict[str, str]] = [
         {
@@ -52,7 +73,8 @@ def generate_ai_reply(
     ]
 
     if chat_history:
-        messages.extend(chat_history)
+        # Capped whatever the caller passes (see memory.build_history)
+        messages.extend(trim_history(chat_history))
 
     messages.append(
         {
@@ -70,5 +92,133 @@ def generate_ai_reply(
         }
     )
 
-    reply = call_featherless(messages)
-    return reply, rag_results
\ No newline at end of file
+    return messages
+
+
+def generate_ai_reply(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    k: int = 5,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Pure RAG pipeline:
+    - user_text: current user input
+    - chat_history: list like [{"role":"user","content":"..."}, {"role":"assistant","content":"..."}]
+    Returns: (assistant_reply, rag_results)
+    """
+    user_text = (user_text or "").strip()
+    if not user_text:
+        return "Please provide a message.", []
+
+    # Stand-alone questions may be paraphrases of one already answered
+    probe = None
+    if not chat_history and answer_cache.cacheable(user_text):
+        probe = answer_cache.lookup(user_text, INDEX_DIR, k)
+        if probe.hit is not None:
+            return answer_cache.hit_result(probe)
+
+    messages, rag_results = build_chat_messages(user_text, chat_history, k=k)
+    reply = call_featherless(messages, cache=_llm_cache())
+    if probe is not None:
+        answer_cache.remember(probe, reply, rag_results, INDEX_DIR)
+    return reply, rag_results
+
+
+def stream_ai_reply(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    k: int = 5,
+) -> Tuple[Iterator[str], List[Dict[str, Any]]]:
+    """
+    Streaming variant of generate_ai_reply.
+    Retrieval runs up front; returns (token_iterator, rag_results).
+    """
+    user_text = (user_text or "").strip()
+    if not user_text:
+        return iter(["Please provide a message."]), []
+
+    probe = None
+    if not chat_history and answer_cache.cacheable(user_text):
+        probe = answer_cache.lookup(user_text, INDEX_DIR, k)
+        if probe.hit is not None:
+            answer, sources = answer_cache.hit_result(probe)
+            return iter([answer]), sources
+
+    messages, rag_results = build_chat_messages(user_text, chat_history, k=k)
+    tokens = stream_featherless(messages)
+    if probe is not None:
+        tokens = _remembering(tokens, probe, rag_results)
+    return tokens, rag_results
+
+
+def _remembering(tokens: Iterator[str], probe, rag_results: List[Dict[str, Any]]) -> Iterator[str]:
+    # Cache the answer once it has streamed completely: a stream cut off upstream
+    # raises (LLMIncompleteStreamError) and one the client abandons is closed here,
+    # so neither gets past the loop
+    parts = []
+    for token in tokens:
+        parts.append(token)
+        yield token
+    answer_cache.remember(probe, "".join(parts), rag_results, INDEX_DIR)
+
+
+async def agenerate_ai_reply(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    k: int = 5,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Async generate_ai_reply: retrieval runs on the retrieval thread pool and
+    the LLM call is awaited, so a waiting chat holds no thread.
+    """
+    user_text = (user_text or "").strip()
+    if not user_text:
+        return "Please provide a message.", []
+
+    probe = None
+    if not chat_history and answer_cache.cacheable(user_text):
+        probe = await answer_cache.alookup(user_text, INDEX_DIR, k)
+        if probe.hit is not None:
+            return answer_cache.hit_result(probe)
+
+    messages, rag_results = await abuild_chat_messages(user_text, chat_history, k=k)
+    reply = await acall_featherless(messages, cache=_llm_cache())
+    if probe is not None:
+        await asyncio.to_thread(answer_cache.remember, probe, reply, rag_results, INDEX_DIR)
+    return reply, rag_results
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def astream_ai_reply(
+    user_text: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    k: int = 5,
+) -> Tuple[AsyncIterator[str], List[Dict[str, Any]]]:
+    """Async stream_ai_reply: returns (async token iterator, rag_results)."""
+    user_text = (user_text or "").strip()
+    if not user_text:
+        return _single("Please provide a message."), []
+
+    probe = None
+    if not chat_history and answer_cache.cacheable(user_text):
+        probe = await answer_cache.alookup(user_text, INDEX_DIR, k)
+        if probe.hit is not None:
+            answer, sources = answer_cache.hit_result(probe)
+            return _single(answer), sources
+
+    messages, rag_results = await abuild_chat_messages(user_text, chat_history, k=k)
+    tokens = astream_featherless(messages)
+    if probe is not None:
+        tokens = _aremembering(tokens, probe, rag_results)
+    return tokens, rag_results
+
+
+async def _aremembering(tokens: AsyncIterator[str], probe, rag_results: List[Dict[str, Any]]) -> AsyncIterator[str]:
+    parts = []
+    async for token in tokens:
+        parts.append(token)
+        yield token
+    await asyncio.to_thread(answer_cache.remember, probe, "".join(parts), rag_results, INDEX_DIR)
@@ -1,36 +1,255 @@
 import os
-import pickle
-from typing import Any, Dict, List, Tuple
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
-import faiss
 from sentence_transformers import SentenceTransformer
 
+from .snapshots import current_version, snapshot_dir
+from .chunk_store import ChunkStore, has_chunks, load_chunks
+from .index_factory import load_index, search_subset
+
+# How often (seconds) a cached index checks whether a newer snapshot was published
+RELOAD_CHECK_SECONDS = 5.0
+
+# Query-side caches: query -> embedding, and (index, version, query, k) -> results.
+# Both are keyed by the whole query text: an embedding of "prefix + text" can't
+# reuse one of the prefix, so only repeated queries skip the encoder.
+QUERY_CACHE_SIZE = 2048
+RESULT_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 3600.0
+
+# Threads for encode + search behind the async API. Bounded so a burst of
+# concurrent chats queues up instead of oversubscribing the CPU.
+RETRIEVAL_THREADS = int(os.environ.get("RAG_RETRIEVAL_THREADS", "4"))
+
+# A meta["source"] prefix, or a tuple of them, that results are restricted to
+SourcePrefix = Union[str, Tuple[str, ...]]
+
+
+class _LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (self.ttl is None or time.monotonic() - item[0] < self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_QUERY_EMBEDDINGS = _LRUCache(QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+_RESULTS = _LRUCache(RESULT_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"query_embeddings": _QUERY_EMBEDDINGS.stats(), "results": _RESULTS.stats()}
+
+
+def clear_query_caches() -> None:
+    _QUERY_EMBEDDINGS.clear()
+    _RESULTS.clear()
+
+
+# One encoder instance per model name, shared by every index in the process
+_MODELS: Dict[str, SentenceTransformer] = {}
+_MODELS_LOCK = threading.Lock()
+
 # Simple in-process cache
 _CACHE: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_RELOAD_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
 
 
-def _load_resources(index_dir: str, model_name: str):
-    key = (index_dir, model_name)
-    if key in _CACHE:
-        return _CACHE[key]["model"], _CACHE[key]["index"], _CACHE[key]["chunks"]
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _LOCKS_GUARD:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="rag-retrieve")
+    return _EXECUTOR
+
+
+def get_encoder(model_name: str = "all-MiniLM-L6-v2") -> SentenceTransformer:
+    model = _MODELS.get(model_name)
+    if model is not None:
+        return model
+    with _MODELS_LOCK:
+        if model_name not in _MODELS:
+            _MODELS[model_name] = SentenceTransformer(model_name)
+        return _MODELS[model_name]
+
+
+def _reload_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _LOCKS_GUARD:
+        return _RELOAD_LOCKS.setdefault(key, threading.Lock())
 
-    index_path = os.path.join(index_dir, "index.faiss")
-    chunks_path = os.path.join(index_dir, "chunks.pkl")
 
-    if not os.path.exists(index_path) or not os.path.exists(chunks_path):
+def _read_snapshot(index_dir: str, version):
+    snap = snapshot_dir(index_dir, version)
+    index_path = os.path.join(snap, "index.faiss")
+
+    if not os.path.exists(index_path) or not has_chunks(snap):
         raise RuntimeError(
-            f"RAG index not found in '{index_dir}'. Run: python -m rag.ingest (or python rag/ingest.py)"
+            f"RAG index not found in '{index_dir}'. Run: python -m rag.ingest (from the web/ directory)"
         )
 
-    model = SentenceTransformer(model_name)
-    index = faiss.read_index(index_path)
+    # Applies the persisted nprobe/efSearch for ANN indexes
+    index = load_index(snap)
+    # Memory-mapped chunk store (or a legacy chunks.pkl list)
+    chunks = load_chunks(snap)
+    return index, chunks
+
+
+def _load_resources(index_dir: str, model_name: str) -> Dict[str, Any]:
+    """
+    Returns the cache entry {"model", "index", "chunks", "version", ...}
+    for index_dir, reloading it when a newer snapshot has been published.
+    """
+    key = (index_dir, model_name)
+    entry = _CACHE.get(key)
+    now = time.monotonic()
+
+    if entry is not None and now - entry["checked_at"] < RELOAD_CHECK_SECONDS:
+        return entry
+
+    version = current_version(index_dir)
+    if entry is not None and entry["version"] == version:
+        entry["checked_at"] = now
+        return entry
+
+    lock = _reload_lock(key)
+    if entry is not None:
+        # Another thread is already swapping in the new snapshot: keep serving the old one
+        if not lock.acquire(blocking=False):
+            return entry
+    else:
+        lock.acquire()
+
+    try:
+        current = _CACHE.get(key)
+        if current is not None and current["version"] == version and current is not entry:
+            return current
+
+        model = get_encoder(model_name)
+        index, chunks = _read_snapshot(index_dir, version)
 
-    with open(chunks_path, "rb") as f:
-        chunks = pickle.load(f)
+        # Replace the whole entry so in-flight queries keep their own consistent index/chunks pair
+        new_entry = {
+            "model": model,
+            "index": index,
+            "chunks": chunks,
+            "version": version,
+            "checked_at": time.monotonic(),
+            # source prefix -> chunk ids, for filtered searches on this snapshot
+            "source_ids": _LRUCache(64),
+        }
+        _CACHE[key] = new_entry
+        return new_entry
+    finally:
+        lock.release()
 
-    _CACHE[key] = {"model": model, "index": index, "chunks": chunks}
-    return model, index, chunks
+
+def warmup(index_dir: str = "rag_index", model_name: str = "all-MiniLM-L6-v2") -> Dict[str, Any]:
+    """
+    Load the encoder and index ahead of the first request and run one dummy
+    encode so lazy model initialisation is paid here, not by a user.
+    """
+    t0 = time.perf_counter()
+    entry = _load_resources(index_dir, model_name)
+    entry["model"].encode(["warmup"], convert_to_numpy=True, normalize_embeddings=True)
+    return {
+        "index_dir": index_dir,
+        "version": entry["version"],
+        "vectors": int(entry["index"].ntotal),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+def _copy_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Callers may mutate results (e.g. store them in the session); keep cached copies intact
+    return [{"score": r["score"], "text": r["text"], "meta": dict(r["meta"])} for r in results]
+
+
+def _source_ids(entry: Dict[str, Any], source_prefix: SourcePrefix) -> np.ndarray:
+    """Sorted ids of the chunks whose meta["source"] starts with source_prefix"""
+    ids = entry["source_ids"].get(source_prefix)
+    if ids is None:
+        chunks = entry["chunks"]
+        if isinstance(chunks, ChunkStore):
+            # Match the source name table, then select rows by packed source id
+            wanted = [i for i, name in enumerate(chunks.sources) if name.startswith(source_prefix)]
+            ids = np.flatnonzero(np.isin(chunks.meta["source"], wanted))
+        else:
+            ids = np.asarray(
+                [i for i, c in enumerate(chunks) if str(c["meta"].get("source", "")).startswith(source_prefix)]
+            )
+        ids = ids.astype(np.int64)
+        entry["source_ids"].put(source_prefix, ids)
+    return ids
+
+
+def _to_results(scores: np.ndarray, ids: np.ndarray, chunks) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for score, idx in zip(scores, ids):
+        if idx == -1:
+            continue
+        c = chunks[int(idx)]  # {"text": ..., "meta": ...}, decoded on demand
+        results.append({"score": float(score), "text": c["text"], "meta": c["meta"]})
+    return results
+
+
+def _encode_queries(model, model_name: str, queries: List[str], batch_size: int = 64) -> np.ndarray:
+    """Encode queries, running the model only for ones not in the query embedding cache."""
+    vectors: List[Any] = [_QUERY_EMBEDDINGS.get((model_name, q)) for q in queries]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = model.encode(
+            [queries[i] for i in missing],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).astype(np.float32)
+        for row, i in enumerate(missing):
+            vectors[i] = fresh[row]
+            _QUERY_EMBEDDINGS.put((model_name, queries[i]), fresh[row])
+    return np.ascontiguousarray(np.stack(vectors), dtype=np.float32)
 
 
 def retrieve(
@@ -38,20 +257,89 @@ def retrieve(
     index_dir: str = "rag_index",
     k: int = 5,
     model_name: str = "all-MiniLM-L6-v2",
+    source_prefix: Optional[SourcePrefix] = None,
 ) -> List[Dict[str, Any]]:
-    query = (query or "").strip()
-    if not query:
-        return []
+    return retrieve_many([query], index_dir=index_dir, k=k, model_name=model_name, source_prefix=source_prefix)[0]
 
-    model, index, chunks = _load_resources(index_dir, model_name)
 
-    q = model.encode([query], convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
-    scores, ids = index.search(q, k)
+def retrieve_many(
+    queries: List[str],
+    index_dir: str = "rag_index",
+    k: int = 5,
+    model_name: str = "all-MiniLM-L6-v2",
+    batch_size: int = 64,
+    source_prefix: Optional[SourcePrefix] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Batched retrieve(): encodes all queries in batches and runs a single
+    index.search on the stacked matrix. Returns one result list per query,
+    in input order (empty queries get []).
 
-    results: List[Dict[str, Any]] = []
-    for score, idx in zip(scores[0], ids[0]):
-        if idx == -1:
+    With source_prefix, only chunks whose meta["source"] starts with it (or with
+    one of a tuple of prefixes) are searched, e.g. one user's EMR partitions
+    (see pdf_generator.partition_source_prefixes).
+
+    Results are cached per (index_dir, model, snapshot version, query, k,
+    source_prefix), so a newly published snapshot never serves stale hits.
+    """
+    cleaned = [(q or "").strip() for q in queries]
+    out: List[List[Dict[str, Any]]] = [[] for _ in cleaned]
+    if not any(cleaned):
+        return out
+
+    entry = _load_resources(index_dir, model_name)
+    version = entry["version"]
+
+    pending: List[int] = []
+    for i, q in enumerate(cleaned):
+        if not q:
             continue
-        c = chunks[idx]  # now a dict: {"text": ..., "meta": ...}
-        results.append({"score": float(score), "text": c["text"], "meta": c["meta"]})
-    return results
\ No newline at end of file
+        cached = _RESULTS.get((index_dir, model_name, version, q, k, source_prefix))
+        if cached is not None:
+            out[i] = _copy_results(cached)
+        else:
+            pending.append(i)
+    if not pending:
+        return out
+
+    q_vecs = _encode_queries(entry["model"], model_name, [cleaned[i] for i in pending], batch_size=batch_size)
+    if source_prefix is None:
+        scores, ids = entry["index"].search(q_vecs, k)
+    else:
+        scores, ids = search_subset(entry["index"], q_vecs, k, _source_ids(entry, source_prefix))
+
+    for row, i in enumerate(pending):
+        results = _to_results(scores[row], ids[row], entry["chunks"])
+        _RESULTS.put((index_dir, model_name, version, cleaned[i], k, source_prefix), results)
+        out[i] = _copy_results(results)
+    return out
+
+
+async def aretrieve(
+    query: str,
+    index_dir: str = "rag_index",
+    k: int = 5,
+    model_name: str = "all-MiniLM-L6-v2",
+    source_prefix: Optional[SourcePrefix] = None,
+) -> List[Dict[str, Any]]:
+    return (await aretrieve_many(
+        [query], index_dir=index_dir, k=k, model_name=model_name, source_prefix=source_prefix
+    ))[0]
+
+
+async def aretrieve_many(
+    queries: List[str],
+    index_dir: str = "rag_index",
+    k: int = 5,
+    model_name: str = "all-MiniLM-L6-v2",
+    batch_size: int = 64,
+    source_prefix: Optional[SourcePrefix] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Async retrieve_many(): the CPU-bound encode/search runs on the bounded
+    retrieval thread pool so the event loop stays free.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor(), retrieve_many, queries, index_dir, k, model_name, batch_size, source_prefix
+    )
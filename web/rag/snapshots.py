@@ -0,0 +1,70 @@
+import os
+import shutil
+from typing import List, Optional
+
+CURRENT_NAME = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+
+
+def _snapshots_root(index_dir: str) -> str:
+    return os.path.join(index_dir, SNAPSHOTS_DIR)
+
+
+def current_version(index_dir: str) -> Optional[str]:
+    """Name of the published snapshot, or None for a legacy flat index_dir."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def snapshot_dir(index_dir: str, version: Optional[str]) -> str:
+    if version is None:
+        # Legacy layout: index.faiss/chunks.pkl directly in index_dir
+        return index_dir
+    return os.path.join(_snapshots_root(index_dir), version)
+
+
+def current_snapshot_dir(index_dir: str) -> str:
+    return snapshot_dir(index_dir, current_version(index_dir))
+
+
+def _list_versions(index_dir: str) -> List[str]:
+    root = _snapshots_root(index_dir)
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if v.startswith("v") and v[1:].isdigit())
+
+
+def new_snapshot_dir(index_dir: str) -> str:
+    """Create and return an empty, unpublished snapshot directory."""
+    root = _snapshots_root(index_dir)
+    os.makedirs(root, exist_ok=True)
+    versions = _list_versions(index_dir)
+    n = int(versions[-1][1:]) + 1 if versions else 1
+    while True:
+        path = os.path.join(root, f"v{n:06d}")
+        try:
+            os.makedirs(path)
+            return path
+        except FileExistsError:
+            n += 1
+
+
+def publish_snapshot(index_dir: str, snap_dir: str, keep: int = 3) -> str:
+    """
+    Atomically point CURRENT at snap_dir, then prune old snapshots
+    (the newest `keep` are retained). Returns the published version.
+    """
+    version = os.path.basename(os.path.normpath(snap_dir))
+    pointer = os.path.join(index_dir, CURRENT_NAME)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    versions = _list_versions(index_dir)
+    for old in versions[:-keep] if keep > 0 else []:
+        if old != version:
+            shutil.rmtree(os.path.join(_snapshots_root(index_dir), old), ignore_errors=True)
+    return version
@@ -0,0 +1,368 @@
+"""
+Structured nearest-neighbour search over the PPD survey datasets.
+
+Ingest turns every CSV row into a text chunk, so the rows are only found through
+fuzzy sentence similarity. Here each survey is loaded once into a compact code
+matrix (rows x questions, int16 answer codes, -1 = unanswered) and a symptom
+profile ({question: answer}) is matched against every row with a vectorized
+distance over the questions it answers:
+
+- hamming: mismatch rate; ordinal questions count |level difference| / (levels - 1)
+- cosine:  1 - cosine similarity of the one-hot answer vectors
+
+Label columns are only ever the target: the k nearest respondents (plus any tied
+with the k-th) come back with the distribution of the labels among them, next to
+the base rate over all respondents.
+
+    python -m rag.survey_index "I cry every day and can't sleep at night"
+"""
+import os
+import re
+import csv
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_NO_YES = ["No", "Sometimes", "Yes"]
+
+
+@dataclass
+class SurveySpec:
+    name: str
+    path: str
+    # Columns whose distribution among the neighbours is reported
+    labels: List[str]
+    # Not used at all (ids, timestamps, scores the labels are derived from)
+    skip: List[str] = field(default_factory=list)
+    # Ordered answer levels; other columns are nominal
+    ordinal: Dict[str, List[str]] = field(default_factory=dict)
+    # Columns ordered by their numeric value
+    numeric: List[str] = field(default_factory=list)
+
+
+SURVEYS: List[SurveySpec] = [
+    SurveySpec(
+        name="post natal data.csv",
+        path=os.path.join(_ROOT, "dataset", "post natal data.csv"),
+        labels=["Feeling anxious"],
+        skip=["Timestamp"],
+        ordinal={
+            "Age": ["25-30", "30-35", "35-40", "40-45", "45-50"],
+            "Feeling sad or Tearful": _NO_YES,
+            "Irritable towards baby & partner": _NO_YES,
+            "Problems of bonding with baby": _NO_YES,
+            "Feeling of guilt": ["No", "Maybe", "Yes"],
+        },
+    ),
+    SurveySpec(
+        name="PPD_dataset_v2.csv",
+        path=os.path.join(_ROOT, "web", "data", "pdfs", "PPD_dataset_v2.csv"),
+        labels=["PHQ9 Result", "EPDS Result"],
+        skip=["sr", "PHQ9 Score", "EPDS Score"],
+        ordinal={
+            "PHQ9 Result": ["Normal", "Minimal", "Mild", "Moderate", "Moderately Severe", "Severe"],
+            "EPDS Result": ["Low", "Medium", "High"],
+            "Recieved Support": ["Low", "Medium", "High"],
+            "Need for Support": ["None", "Low", "Medium", "High"],
+            "Number of household members": ["2 to 5", "6 to 8", "9 or more"],
+            "Age of newborn": ["0 to 6 months", "6 months to 1 year", "1 year to 1.5 year", "Older than 1.5 year"],
+        },
+        numeric=["Age", "Number of the latest pregnancy"],
+    ),
+]
+
+
+def _key(value: str) -> str:
+    # "High school" / "High School", "House wife" / "Housewife" are the same answer
+    return re.sub(r"\W+", "", value.casefold())
+
+
+@dataclass
+class SurveyMatrix:
+    name: str
+    rows: int
+    columns: List[str]
+    codes: np.ndarray          # (rows, columns) int16, -1 = unanswered
+    levels: List[List[str]]    # answer text per code, per column
+    scale: np.ndarray          # (columns,) 1 / (levels - 1) for ordered columns, 0 for nominal
+    labels: List[str]
+    _lookup: List[Dict[str, int]] = field(default_factory=list, repr=False)
+
+    def column(self, name: str) -> int:
+        try:
+            return self.columns.index(name)
+        except ValueError:
+            raise KeyError(f"{self.name} has no column {name!r}") from None
+
+    def code(self, column: int, value: str) -> int:
+        """Answer code, or -2 for an answer no respondent gave"""
+        return self._lookup[column].get(_key(value), -2)
+
+
+def load_survey(spec: SurveySpec) -> SurveyMatrix:
+    with open(spec.path, newline="", encoding="utf-8", errors="ignore") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        raw = [row for row in reader if any(cell.strip() for cell in row)]
+
+    keep = [i for i, c in enumerate(header) if c not in spec.skip]
+    columns = [header[i] for i in keep]
+    codes = np.full((len(raw), len(columns)), -1, dtype=np.int16)
+    levels: List[List[str]] = []
+    lookups: List[Dict[str, int]] = []
+    scale = np.zeros(len(columns), dtype=np.float32)
+
+    for j, i in enumerate(keep):
+        name = header[i]
+        values = [" ".join(row[i].split()) if i < len(row) else "" for row in raw]
+
+        # Level order: declared, numeric, or first-seen (nominal)
+        seen: Dict[str, str] = {}
+        for v in values:
+            if v and _key(v) not in seen:
+                seen[_key(v)] = v
+        if name in spec.ordinal:
+            order = list(spec.ordinal[name])
+            order += [v for k, v in seen.items() if k not in {_key(o) for o in order}]
+        elif name in spec.numeric:
+            def _num(v: str) -> float:
+                try:
+                    return float(v)
+                except ValueError:
+                    return float("inf")
+            order = sorted(seen.values(), key=_num)
+        else:
+            order = list(seen.values())
+
+        lookup = {_key(v): n for n, v in enumerate(order)}
+        codes[:, j] = [lookup[_key(v)] if v else -1 for v in values]
+        levels.append(order)
+        lookups.append(lookup)
+        if (name in spec.ordinal or name in spec.numeric) and len(order) > 1:
+            scale[j] = 1.0 / (len(order) - 1)
+
+    return SurveyMatrix(
+        name=spec.name,
+        rows=len(raw),
+        columns=columns,
+        codes=codes,
+        levels=levels,
+        scale=scale,
+        labels=[c for c in spec.labels if c in columns],
+        _lookup=lookups,
+    )
+
+
+_SURVEYS: Dict[str, SurveyMatrix] = {}
+_LOAD_LOCK = threading.Lock()
+
+
+def get_survey(name: str) -> SurveyMatrix:
+    """The survey's matrix, loaded on first use and kept for the process"""
+    survey = _SURVEYS.get(name)
+    if survey is not None:
+        return survey
+    with _LOAD_LOCK:
+        if name not in _SURVEYS:
+            spec = next((s for s in SURVEYS if s.name == name), None)
+            if spec is None:
+                raise KeyError(f"Unknown survey {name!r}")
+            _SURVEYS[name] = load_survey(spec)
+        return _SURVEYS[name]
+
+
+def available_surveys() -> List[str]:
+    return [s.name for s in SURVEYS if os.path.exists(s.path)]
+
+
+def distances(survey: SurveyMatrix, profile: Dict[str, str], metric: str = "hamming") -> Tuple[np.ndarray, List[str]]:
+    """
+    Distance in [0, 1] of every row to the profile, over the profile's questions.
+    Questions the survey doesn't have and label columns are ignored. Returns
+    (distances, questions used).
+    """
+    cols, query = [], []
+    for name, value in profile.items():
+        if name in survey.columns and name not in survey.labels and value:
+            j = survey.column(name)
+            cols.append(j)
+            query.append(survey.code(j, value))
+    if not cols:
+        return np.zeros(survey.rows, dtype=np.float32), []
+
+    q = np.asarray(query, dtype=np.int16)
+    sub = survey.codes[:, cols]
+    answered = sub >= 0
+
+    if metric == "hamming":
+        scale = survey.scale[cols]
+        ordinal = (scale > 0) & (q >= 0)
+        d = (sub != q).astype(np.float32)
+        d[:, ordinal] = np.abs(sub[:, ordinal] - q[ordinal]) * scale[ordinal]
+        d[~answered] = 1.0
+        dist = d.mean(axis=1)
+    elif metric == "cosine":
+        matches = ((sub == q) & answered).sum(axis=1)
+        norms = np.sqrt(len(cols) * np.maximum(answered.sum(axis=1), 1))
+        dist = 1.0 - matches / norms
+    else:
+        raise ValueError(f"Unknown metric {metric!r} (expected 'hamming' or 'cosine')")
+    return dist.astype(np.float32), [survey.columns[j] for j in cols]
+
+
+def _distribution(survey: SurveyMatrix, column: int, rows: Optional[np.ndarray] = None) -> Dict[str, float]:
+    codes = survey.codes[:, column] if rows is None else survey.codes[rows, column]
+    codes = codes[codes >= 0]
+    if not len(codes):
+        return {}
+    counts = np.bincount(codes, minlength=len(survey.levels[column]))
+    return {survey.levels[column][n]: float(c) / len(codes) for n, c in enumerate(counts) if c}
+
+
+def nearest(
+    survey_name: str,
+    profile: Dict[str, str],
+    k: int = 25,
+    metric: str = "hamming",
+) -> Dict[str, Any]:
+    """
+    The k respondents closest to profile ({question: answer}), plus every
+    respondent tied with the k-th: with a few categorical questions whole answer
+    groups tie, and cutting them at k would just pick the first rows of the file.
+    Returns {"survey", "respondents", "matched_on", "neighbours", "rows",
+    "distances", "labels"} where rows/distances are the k closest (1-based rows),
+    neighbours counts the whole neighbourhood and labels maps each label column to
+    {"neighbours": {answer: share}, "base": {answer: share}}.
+    """
+    survey = get_survey(survey_name)
+    dist, matched_on = distances(survey, profile, metric)
+    k = min(k, survey.rows)
+    radius = np.partition(dist, k - 1)[k - 1]
+    near = np.flatnonzero(dist <= radius)
+    # Closest first; ties in file order
+    near = near[np.lexsort((near, dist[near]))]
+
+    labels = {}
+    for name in survey.labels:
+        j = survey.column(name)
+        labels[name] = {"neighbours": _distribution(survey, j, near), "base": _distribution(survey, j)}
+
+    return {
+        "survey": survey.name,
+        "respondents": survey.rows,
+        "matched_on": {c: profile[c] for c in matched_on},
+        "neighbours": int(len(near)),
+        "rows": [int(i) + 1 for i in near[:k]],  # 1-based, like ingest's csv "row"
+        "distances": [round(float(dist[i]), 4) for i in near[:k]],
+        "mean_distance": round(float(dist[near].mean()), 4),
+        "labels": labels,
+    }
+
+
+# Free text -> survey answers. (pattern, value, value when negated or None).
+# No rules for label columns: they are what the neighbours are asked about.
+_NEG = r"\b(?:no|not|never|without|don'?t|doesn'?t|didn'?t|isn'?t|haven'?t|hardly)\b(?:\W+\w+){0,2}\W+"
+
+_TEXT_RULES: Dict[str, List[Tuple[str, str, str, Optional[str]]]] = {
+    "post natal data.csv": [
+        ("Feeling sad or Tearful", r"\b(sad|tearful|cry|crying|cried|depressed|hopeless|feel\w* down)\b", "Yes", "No"),
+        ("Irritable towards baby & partner", r"\b(irritab\w*|irritated|snap\w*|angry|anger|short[- ]tempered)\b", "Yes", "No"),
+        ("Trouble sleeping at night",
+         r"\b(insomnia|can'?t sleep|cannot sleep|trouble sleeping|unable to sleep|not sleeping|sleepless\w*|awake all night|lie awake)\b",
+         "Yes", None),
+        ("Problems concentrating or making decision", r"\b(concentrat\w*|can'?t focus|indecisive|making decisions|foggy|forgetful)\b", "Yes", "No"),
+        ("Overeating or loss of appetite", r"\b(appetite|not eating|overeat\w*|binge\w*)\b", "Yes", None),
+        ("Feeling of guilt", r"\b(guilt|guilty|bad mother|bad mom|failing as a mo\w+|failure)\b", "Yes", "No"),
+        ("Problems of bonding with baby",
+         r"\b(?:can'?t|cannot|don'?t|not|no|trouble|problems?|difficult\w*|struggl\w*)\W+(?:\w+\W+){0,2}(?:bond\w*|connect\w*)",
+         "Yes", None),
+        ("Suicide attempt", r"\b(suicid\w*|kill myself|end my life|take my (?:own )?life)\b", "Yes", "No"),
+    ],
+    "PPD_dataset_v2.csv": [
+        ("Angry after latest child birth", r"\b(angry|anger|irritab\w*|irritated|snap\w*|rage)\b", "Yes", "No"),
+        ("Worry about newborn", r"\b(worr\w* about (?:the |my )?(?:baby|newborn)|baby'?s health)\b", "Yes", "No"),
+        ("Relax/sleep when the newborn is asleep",
+         r"\b(can'?t|cannot|unable to) (sleep|rest|relax) (when|while) (the |my )?(baby|newborn)", "No", None),
+        ("Feeling about motherhood", r"\b(hate being a mo\w+|regret (?:having|becoming)|unhappy (?:as|being) a mo\w+)\b", "Sad", None),
+        ("Relationship with husband",
+         r"\b(husband|partner)\b(?:\W+\w+){0,4}\W+(fight\w*|argu\w*|distant|abusive|ignores?)\b", "Bad", None),
+        ("Recieved Support", r"\b(no (?:help|support)|on my own|nobody helps|no one helps|all alone)\b", "Low", None),
+        ("Trust and share feelings", r"\b(no ?one to talk to|nobody to talk to|can'?t talk to anyone)\b", "No", None),
+        ("Abuse", r"\b(abus\w*|hits? me|insult\w*)\b", "Yes", "No"),
+        ("Feeling for regular activities", r"\b(tired|exhausted|fatigue\w*|drained)\b", "Tired", None),
+        ("Breastfeed", r"\b(breastfeed\w*|breast-?feeding|nursing)\b", "Yes", "No"),
+        ("Depression during pregnancy (PHQ2)", r"\bdepress\w* (?:during|in) (?:my )?pregnan\w*", "Positive", None),
+        ("Depression before pregnancy (PHQ2)", r"\b(depress\w* before (?:my )?pregnan\w*|history of depression)\b", "Positive", None),
+    ],
+}
+
+
+def profile_from_text(survey_name: str, text: str) -> Dict[str, str]:
+    """
+    Best-effort survey answers mentioned in free text (keyword rules, with simple
+    negation: "not sad" -> Feeling sad or Tearful=No). Unmentioned questions are left out.
+    """
+    profile: Dict[str, str] = {}
+    lowered = text.lower()
+    for column, pattern, value, negated in _TEXT_RULES.get(survey_name, []):
+        match = re.search(pattern, lowered)
+        if match is None:
+            continue
+        if negated is not None and re.search(_NEG + r"$", lowered[max(match.start() - 40, 0):match.start()]):
+            profile[column] = negated
+        else:
+            profile[column] = value
+    return profile
+
+
+def format_evidence(result: Dict[str, Any]) -> str:
+    """Compact prompt text for one nearest() result, tagged [survey neighbours]"""
+    matched = ", ".join(f"{c}={v}" for c, v in result["matched_on"].items())
+    lines = [
+        f"[{result['survey']} neighbours] The {result['neighbours']} of {result['respondents']} respondents "
+        f"closest to the user on: {matched} (mean distance {result['mean_distance']:.2f})."
+    ]
+    for name, dist in result["labels"].items():
+        shares = ", ".join(
+            f"{answer} {share:.0%} (all respondents {dist['base'].get(answer, 0.0):.0%})"
+            for answer, share in sorted(dist["neighbours"].items(), key=lambda kv: -kv[1])
+        )
+        lines.append(f"- {name}: {shares}")
+    return "\n".join(lines)
+
+
+def survey_evidence(text: str, k: int = 25, min_questions: int = 1) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Nearest-neighbour evidence for free text from every available survey that it
+    answers at least min_questions questions of. Returns (prompt block, results).
+    """
+    blocks, results = [], []
+    for name in available_surveys():
+        profile = profile_from_text(name, text)
+        if len(profile) < min_questions:
+            continue
+        result = nearest(name, profile, k=k)
+        if len(result["matched_on"]) < min_questions:
+            continue
+        results.append(result)
+        blocks.append(format_evidence(result))
+    return "\n\n".join(blocks), results
+
+
+if __name__ == "__main__":
+    import time
+
+    text = " ".join(sys.argv[1:]) or "I cry every day, I can't sleep at night and I feel anxious and tired"
+    for name in available_surveys():
+        survey = get_survey(name)
+        print(f"{name}: {survey.rows} rows x {len(survey.columns)} questions, {survey.codes.nbytes:,} bytes")
+    survey_evidence(text)
+    t0 = time.perf_counter()
+    block, results = survey_evidence(text)
+    print(f"\n{block or '(no survey questions recognised)'}")
+    print(f"\n{(time.perf_counter() - t0) * 1e6:.0f} µs (surveys loaded)")
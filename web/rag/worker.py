@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import subprocess
+from contextlib import closing
+from typing import Any, Dict, Optional
+
+JOBS_DB_NAME = "ingest_jobs.sqlite3"
+
+# A worker that has not written a heartbeat for this long is considered dead
+WORKER_STALE_SECONDS = 30.0
+HEARTBEAT_INTERVAL = 5.0
+
+
+class IngestQueue:
+    """
+    SQLite-backed job table for RAG ingestion.
+
+    - enqueue() coalesces with an identical job that is still pending
+    - claim() hands out at most one running job at a time, so index updates are serialized
+    - the single-row worker table holds the heartbeat of the live worker process
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    result TEXT,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, id);
+                CREATE TABLE IF NOT EXISTS worker (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    pid INTEGER,
+                    heartbeat REAL
+                );
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, kind: str, params: Optional[Dict[str, Any]] = None) -> int:
+        params_json = json.dumps(params or {}, sort_keys=True)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'pending' AND kind = ? AND params = ? ORDER BY id LIMIT 1",
+                (kind, params_json),
+            ).fetchone()
+            if row is not None:
+                job_id = row["id"]
+            else:
+                cur = conn.execute(
+                    "INSERT INTO jobs (kind, params, created_at) VALUES (?, ?, ?)",
+                    (kind, params_json, time.time()),
+                )
+                job_id = cur.lastrowid
+            conn.execute("COMMIT")
+            return job_id
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            running = conn.execute("SELECT 1 FROM jobs WHERE status = 'running' LIMIT 1").fetchone()
+            row = None
+            if running is None:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                        (time.time(), row["id"]),
+                    )
+            conn.execute("COMMIT")
+            return self._row_to_dict(row) if row is not None else None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def finish(self, job_id: int, result: Any = None, error: Optional[str] = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                (
+                    "failed" if error else "done",
+                    time.time(),
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    job_id,
+                ),
+            )
+
+    def requeue_running(self) -> None:
+        """Put jobs left 'running' by a crashed worker back in the queue."""
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = 'pending', started_at = NULL WHERE status = 'running'")
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def summary(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            counts = {r["status"]: r["n"] for r in conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            )}
+            last = conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('done', 'failed') ORDER BY finished_at DESC LIMIT 1"
+            ).fetchone()
+        return {
+            "counts": counts,
+            "worker_alive": self.worker_alive(),
+            "last_finished": self._row_to_dict(last) if last is not None else None,
+        }
+
+    # ---------- worker registration ----------
+    def register_worker(self, pid: int) -> bool:
+        """Take the single worker slot unless another live worker holds it."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT pid, heartbeat FROM worker WHERE id = 1").fetchone()
+            now = time.time()
+            if row is not None and row["pid"] != pid and now - (row["heartbeat"] or 0) < WORKER_STALE_SECONDS:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT INTO worker (id, pid, heartbeat) VALUES (1, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET pid = excluded.pid, heartbeat = excluded.heartbeat",
+                (pid, now),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, pid: int) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE worker SET heartbeat = ? WHERE id = 1 AND pid = ?", (time.time(), pid))
+
+    def unregister_worker(self, pid: int) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM worker WHERE id = 1 AND pid = ?", (pid,))
+
+    def worker_alive(self) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT heartbeat FROM worker WHERE id = 1").fetchone()
+        return row is not None and time.time() - (row["heartbeat"] or 0) < WORKER_STALE_SECONDS
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        d = dict(row)
+        d["params"] = json.loads(d["params"]) if d.get("params") else {}
+        if d.get("result"):
+            d["result"] = json.loads(d["result"])
+        return d
+
+
+def ensure_worker(queue: IngestQueue, cwd: str, idle_exit: float = 300.0) -> bool:
+    """
+    Start a detached worker process if none is alive. Returns True if one was spawned.
+    Must be called with cwd set to the web/ directory (where `rag` is importable).
+    """
+    if queue.worker_alive():
+        return False
+    subprocess.Popen(
+        [sys.executable, "-m", "rag.worker", "--db", os.path.abspath(queue.db_path), "--idle-exit", str(idle_exit)],
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    return True
+
+
+def _run_job(job: Dict[str, Any], data_dir: str, index_dir: str) -> Dict[str, Any]:
+    from .ingest import ingest_docs
+
+    if job["kind"] != "ingest":
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+
+    params = job["params"]
+    n_files, n_chunks = ingest_docs(
+        data_dir=params.get("data_dir", data_dir),
+        index_dir=params.get("index_dir", index_dir),
+        incremental=params.get("incremental", True),
+    )
+    return {"files": n_files, "chunks": n_chunks}
+
+
+def run_worker(
+    db_path: str,
+    data_dir: str = "data/pdfs",
+    index_dir: str = "rag_index",
+    poll_interval: float = 1.0,
+    idle_exit: float = 0.0,
+) -> None:
+    """
+    Process ingest jobs one at a time until idle for idle_exit seconds (0 = run forever).
+    """
+    queue = IngestQueue(db_path)
+    pid = os.getpid()
+    if not queue.register_worker(pid):
+        print("Another ingest worker is already running.")
+        return
+
+    queue.requeue_running()
+
+    # Heartbeat from a side thread so long ingest jobs don't make the worker look dead
+    stop = threading.Event()
+
+    def _beat():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            queue.heartbeat(pid)
+
+    threading.Thread(target=_beat, daemon=True).start()
+
+    idle_since = time.monotonic()
+    try:
+        while True:
+            job = queue.claim()
+            if job is None:
+                if idle_exit and time.monotonic() - idle_since > idle_exit:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                result = _run_job(job, data_dir, index_dir)
+                queue.finish(job["id"], result=result)
+                print(f"Job {job['id']} done: {result}")
+            except Exception as e:
+                queue.finish(job["id"], error=str(e))
+                print(f"Job {job['id']} failed: {e}")
+            idle_since = time.monotonic()
+    finally:
+        stop.set()
+        queue.unregister_worker(pid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background RAG ingestion worker")
+    parser.add_argument("--db", default=os.path.join("rag_index", JOBS_DB_NAME))
+    parser.add_argument("--data-dir", default="data/pdfs")
+    parser.add_argument("--index-dir", default="rag_index")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--idle-exit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    run_worker(
+        args.db,
+        data_dir=args.data_dir,
+        index_dir=args.index_dir,
+        poll_interval=args.poll_interval,
+        idle_exit=args.idle_exit,
+    )
@@ -0,0 +1,103 @@
+"""
+Incrementally maintained per-user, per-day mood rollups (DailyMoodRollup).
+
+A new check-in is folded into its day's rollup row in the same transaction
+(web.signals). Edits and deletes recompute just the affected day(s) from their
+raw check-ins, and rebuild_all_rollups() backfills everything from scratch.
+Readers such as the history dashboard then scan O(days) rollup rows instead
+of every raw check-in.
+"""
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DailyMoodCheckIn, DailyMoodRollup
+
+# Check-ins read per database round trip while backfilling
+ITERATOR_CHUNK_SIZE = 2000
+
+_CHECKIN_FIELDS = ('created_at', 'user_identifier', 'mood_rating', 'hours_of_sleep', 'energy_level', 'stress_level')
+
+
+def rollup_key(checkin):
+    """(user_identifier or '', local date) of the rollup row a check-in belongs to"""
+    created_at = checkin.created_at
+    if timezone.is_aware(created_at):
+        created_at = timezone.localtime(created_at)
+    return (checkin.user_identifier or '', created_at.date())
+
+
+def _bump(counts, value):
+    if value:
+        counts[value] = counts.get(value, 0) + 1
+
+
+def _add(rollup, checkin):
+    rollup.checkin_count += 1
+    rollup.mood_total += checkin.mood_rating
+    if rollup.first_at is None or checkin.created_at < rollup.first_at:
+        rollup.first_at = checkin.created_at
+        rollup.first_sleep = checkin.hours_of_sleep or ''
+    if rollup.last_at is None or checkin.created_at >= rollup.last_at:
+        rollup.last_at = checkin.created_at
+        rollup.last_mood = checkin.mood_rating
+    _bump(rollup.sleep_counts, checkin.hours_of_sleep)
+    _bump(rollup.energy_counts, checkin.energy_level)
+    _bump(rollup.stress_counts, checkin.stress_level)
+
+
+def record_checkin(checkin):
+    """Fold a newly created check-in into its day's rollup"""
+    user_identifier, day = rollup_key(checkin)
+    with transaction.atomic():
+        rollup, _ = DailyMoodRollup.objects.select_for_update().get_or_create(
+            user_identifier=user_identifier, day=day
+        )
+        _add(rollup, checkin)
+        rollup.save()
+
+
+def _day_checkins(user_identifier, day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    qs = DailyMoodCheckIn.objects.filter(created_at__gte=start, created_at__lt=end)
+    if user_identifier:
+        qs = qs.filter(user_identifier=user_identifier)
+    else:
+        qs = qs.filter(Q(user_identifier__isnull=True) | Q(user_identifier=''))
+    return qs.only(*_CHECKIN_FIELDS).order_by('created_at')
+
+
+def rebuild_rollup(user_identifier, day):
+    """Recompute one (user, day) rollup from its check-ins; removes it once the day has none"""
+    with transaction.atomic():
+        DailyMoodRollup.objects.filter(user_identifier=user_identifier, day=day).delete()
+        rollup = DailyMoodRollup(user_identifier=user_identifier, day=day)
+        for checkin in _day_checkins(user_identifier, day):
+            _add(rollup, checkin)
+        if rollup.checkin_count:
+            rollup.save()
+            return rollup
+    return None
+
+
+def rebuild_all_rollups(batch_size=1000):
+    """Backfill: recompute every rollup from the raw check-ins; returns the number of rollup rows"""
+    rollups = {}
+    # Plain rows rather than model instances: no per-row model/post_init overhead
+    rows = DailyMoodCheckIn.objects.order_by('created_at').values(*_CHECKIN_FIELDS)
+    for row in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        checkin = SimpleNamespace(**row)
+        key = rollup_key(checkin)
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = DailyMoodRollup(user_identifier=key[0], day=key[1])
+        _add(rollup, checkin)
+
+    with transaction.atomic():
+        DailyMoodRollup.objects.all().delete()
+        DailyMoodRollup.objects.bulk_create(rollups.values(), batch_size=batch_size)
+    return len(rollups)
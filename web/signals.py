@@ -1,18 +1,71 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 from .models import DailyMoodCheckIn, PostpartumQuestionnaire
-from .pdf_generator import regenerate_all_pdfs
+from .emr_export import schedule_pdf_regeneration
+from .pdf_generator import partition_key
+from .rollups import rebuild_rollup, record_checkin, rollup_key
 
 
-@receiver(post_save, sender=DailyMoodCheckIn)
-def update_mood_checkin_pdf(sender, instance, created, **kwargs):
-    """Regenerate the complete DailyMoodCheckIn PDF when any row is added"""
-    if created:
-        regenerate_all_pdfs()
+def _loaded_partition(instance):
+    # Don't force a query for rows loaded with .only()/.defer()
+    if instance.pk is None or instance.get_deferred_fields() & {'created_at', 'user_identifier'}:
+        return None
+    return partition_key(instance)
+
+
+@receiver(post_init, sender=DailyMoodCheckIn)
+@receiver(post_init, sender=PostpartumQuestionnaire)
+def remember_emr_partition(sender, instance, **kwargs):
+    """Remember which EMR partition a loaded row came from, so a move re-renders both"""
+    instance._emr_partition = _loaded_partition(instance)
 
 
+@receiver(post_init, sender=DailyMoodCheckIn)
+def remember_mood_rollup(sender, instance, **kwargs):
+    """Remember which day's rollup a loaded check-in counted towards"""
+    instance._rollup_key = rollup_key(instance) if _loaded_partition(instance) is not None else None
+
+
+@receiver(post_save, sender=DailyMoodCheckIn)
 @receiver(post_save, sender=PostpartumQuestionnaire)
-def update_questionnaire_pdf(sender, instance, created, **kwargs):
-    """Regenerate the complete PostpartumQuestionnaire PDF when any row is added"""
+def update_emr_partition_pdf(sender, instance, created, raw=False, **kwargs):
+    """Schedule a (debounced, background) re-render of the row's user/month EMR PDF"""
+    # raw=True means loaddata; fixture loads are bulk imports
+    if raw:
+        return
+    partition = partition_key(instance)
+    schedule_pdf_regeneration(sender, partition)
+
+    previous = getattr(instance, '_emr_partition', None)
+    if previous is not None and previous != partition:
+        # created_at or user_identifier changed: the old partition loses the row
+        schedule_pdf_regeneration(sender, previous)
+    instance._emr_partition = partition
+
+
+@receiver(post_delete, sender=DailyMoodCheckIn)
+@receiver(post_delete, sender=PostpartumQuestionnaire)
+def remove_from_emr_partition_pdf(sender, instance, **kwargs):
+    schedule_pdf_regeneration(sender, getattr(instance, '_emr_partition', None) or partition_key(instance))
+
+
+@receiver(post_save, sender=DailyMoodCheckIn)
+def update_mood_rollup(sender, instance, created, raw=False, **kwargs):
+    """Keep DailyMoodRollup in step: fold new check-ins in, recompute the day(s) an edit touched"""
+    # Fixture loads are covered by the backfill_mood_rollups command
+    if raw:
+        return
+    key = rollup_key(instance)
     if created:
-        regenerate_all_pdfs()
+        record_checkin(instance)
+    else:
+        rebuild_rollup(*key)
+        previous = getattr(instance, '_rollup_key', None)
+        if previous is not None and previous != key:
+            rebuild_rollup(*previous)
+    instance._rollup_key = key
+
+
+@receiver(post_delete, sender=DailyMoodCheckIn)
+def remove_from_mood_rollup(sender, instance, **kwargs):
+    rebuild_rollup(*(getattr(instance, '_rollup_key', None) or rollup_key(instance)))
@@ -1,3 +1,533 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from pypdf import PdfReader
+from reportlab.pdfgen import canvas
+
+from . import pdf_generator
+from .models import DailyMoodCheckIn
+from .rag import context, llm, pipeline
+from .rag.llm_client import (
+    AsyncLLMClient,
+    CircuitBreaker,
+    LLMClient,
+    LLMError,
+    LLMIncompleteStreamError,
+    LLMUnavailableError,
+)
+from .rag.llm_stub import start_stub_server
+from .rag.worker import JOBS_DB_NAME, WORKER_STALE_SECONDS, IngestQueue
+from .views import LAST_SOURCES_KEY, SESSION_KEY
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class StubServerMixin:
+    """Runs rag.llm_stub on a free port for the duration of a test"""
+
+    def start_stub(self, **kwargs):
+        server, url = start_stub_server(0, **kwargs)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, url
+
+
+class LLMClientTests(StubServerMixin, SimpleTestCase):
+    def llm_client(self, url, **kwargs):
+        kwargs.setdefault("backoff_base", 0.01)
+        kwargs.setdefault("backoff_max", 0.05)
+        return LLMClient(url, "stub", **kwargs)
+
+    def test_retries_5xx_then_succeeds(self):
+        server, url = self.start_stub(reply="Hi there.", fail_first=2, fail_status=503)
+        client = self.llm_client(url, max_retries=2)
+        with mock.patch("web.rag.llm_client.time.sleep") as sleep:
+            self.assertEqual(client.chat(MESSAGES, model="m"), "Hi there.")
+        self.assertEqual(server.state.requests, 3)
+        self.assertEqual(client.stats()["retries"], 2)
+        # Full jitter: attempt n waits at most min(backoff_max, base * 2^n)
+        delays = [c.args[0] for c in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        for attempt, delay in enumerate(delays):
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(0.05, 0.01 * 2 ** attempt))
+
+    def test_retries_429(self):
+        server, url = self.start_stub(fail_first=1, fail_status=429)
+        client = self.llm_client(url, max_retries=1)
+        self.assertEqual(client.chat(MESSAGES, model="m"), "Stub reply.")
+        self.assertEqual(server.state.requests, 2)
+
+    def test_gives_up_after_max_retries(self):
+        server, url = self.start_stub(fail_first=10, fail_status=502)
+        client = self.llm_client(url, max_retries=2)
+        with self.assertRaisesMessage(LLMError, "HTTP 502"):
+            client.chat(MESSAGES, model="m")
+        self.assertEqual(server.state.requests, 3)
+        self.assertFalse(client.stats()["last"]["ok"])
+
+    def test_client_error_is_not_retried_and_leaves_breaker_alone(self):
+        server, url = self.start_stub(fail_first=10, fail_status=503)
+        breaker = CircuitBreaker(failure_threshold=2, reset_after=60)
+        client = self.llm_client(url, max_retries=0, breaker=breaker)
+        with self.assertRaises(LLMError):
+            client.chat(MESSAGES, model="m")
+
+        server.state.fail_status = 400
+        with self.assertRaisesMessage(LLMError, "HTTP 400"):
+            client.chat(MESSAGES, model="m")
+        self.assertEqual(server.state.requests, 2)
+        # The 400 neither reset the 503's failure nor counted as one
+        self.assertEqual(breaker.state, "closed")
+
+        server.state.fail_status = 503
+        with self.assertRaises(LLMError):
+            client.chat(MESSAGES, model="m")
+        self.assertEqual(breaker.state, "open")
+
+    def test_breaker_opens_and_rejects_without_calling_upstream(self):
+        server, url = self.start_stub(fail_first=10, fail_status=500)
+        client = self.llm_client(url, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_after=60))
+        for _ in range(2):
+            with self.assertRaises(LLMError):
+                client.chat(MESSAGES, model="m")
+        with self.assertRaises(LLMUnavailableError):
+            client.chat(MESSAGES, model="m")
+        self.assertEqual(server.state.requests, 2)
+        self.assertEqual(client.stats()["breaker"], "open")
+
+    def test_half_open_lets_one_trial_through(self):
+        server, url = self.start_stub(fail_first=1, fail_status=500)
+        client = self.llm_client(url, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_after=0.05))
+        with self.assertRaises(LLMError):
+            client.chat(MESSAGES, model="m")
+        time.sleep(0.06)
+        self.assertEqual(client.breaker.state, "half_open")
+
+        # While the (slow) trial is in flight, other calls are rejected
+        server.state.delay = 0.3
+        trial = threading.Thread(target=client.chat, args=(MESSAGES,), kwargs={"model": "m"})
+        trial.start()
+        time.sleep(0.1)
+        with self.assertRaises(LLMUnavailableError):
+            client.chat(MESSAGES, model="m")
+        trial.join()
+
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual(server.state.requests, 2)
+
+    def test_failed_trial_reopens_breaker(self):
+        server, url = self.start_stub(fail_first=10, fail_status=503)
+        client = self.llm_client(url, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_after=0.05))
+        with self.assertRaises(LLMError):
+            client.chat(MESSAGES, model="m")
+        time.sleep(0.06)
+        with self.assertRaises(LLMError):
+            client.chat(MESSAGES, model="m")
+        self.assertEqual(client.breaker.state, "open")
+
+    def test_half_open_trial_is_not_taken_by_a_missing_key(self):
+        server, url = self.start_stub(fail_first=1, fail_status=500)
+        breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+        with self.assertRaises(LLMError):
+            self.llm_client(url, max_retries=0, breaker=breaker).chat(MESSAGES, model="m")
+        time.sleep(0.06)
+
+        with self.assertRaisesMessage(LLMError, "FEATHERLESS_API_KEY"):
+            LLMClient(url, None, breaker=breaker).chat(MESSAGES, model="m")
+
+        # It didn't keep the trial: a working call still gets it and closes the breaker
+        self.assertEqual(self.llm_client(url, breaker=breaker).chat(MESSAGES, model="m"), "Stub reply.")
+        self.assertEqual(breaker.state, "closed")
+
+    def test_half_open_trial_is_released_on_unexpected_errors(self):
+        server, url = self.start_stub()
+        breaker = CircuitBreaker(failure_threshold=1, reset_after=0)
+        breaker.record_failure()
+        client = self.llm_client(url, breaker=breaker)
+        with mock.patch.object(client.session, "post", side_effect=RuntimeError("boom")):
+            with self.assertRaisesMessage(RuntimeError, "boom"):
+                client.chat(MESSAGES, model="m")
+        self.assertTrue(breaker.allow())
+
+    def test_read_timeout_is_retried_then_fails(self):
+        server, url = self.start_stub(delay=0.5)
+        client = self.llm_client(url, read_timeout=0.1, max_retries=1)
+        t0 = time.perf_counter()
+        with self.assertRaisesMessage(LLMError, "request failed"):
+            client.chat(MESSAGES, model="m")
+        self.assertLess(time.perf_counter() - t0, 0.5 * 2)
+        self.assertEqual(client.stats()["last"]["attempts"], 2)
+        self.assertIsNone(client.stats()["last"]["status"])
+
+    def test_stream_yields_tokens(self):
+        server, url = self.start_stub(reply="one two three")
+        tokens = list(self.llm_client(url).chat_stream(MESSAGES, model="m"))
+        self.assertEqual(tokens, ["one ", "two ", "three "])
+
+    def test_stream_cut_off_raises(self):
+        server, url = self.start_stub(reply="one two three", cut_stream_after=2)
+        tokens = []
+        with self.assertRaises(LLMIncompleteStreamError):
+            for token in self.llm_client(url).chat_stream(MESSAGES, model="m"):
+                tokens.append(token)
+        self.assertEqual(tokens, ["one ", "two "])
+
+
+class AsyncLLMClientTests(StubServerMixin, SimpleTestCase):
+    def run_async(self, url, fn, **kwargs):
+        async def main():
+            client = AsyncLLMClient(url, "stub", backoff_base=0.01, backoff_max=0.05, **kwargs)
+            try:
+                return await fn(client)
+            finally:
+                await client.aclose()
+        return asyncio.run(main())
+
+    def test_retries_then_succeeds(self):
+        server, url = self.start_stub(reply="Hi.", fail_first=1, fail_status=503)
+        reply = self.run_async(url, lambda c: c.chat(MESSAGES, model="m"), max_retries=1)
+        self.assertEqual(reply, "Hi.")
+        self.assertEqual(server.state.requests, 2)
+
+    def test_client_error_is_not_retried(self):
+        server, url = self.start_stub(fail_first=1, fail_status=404)
+        with self.assertRaisesMessage(LLMError, "HTTP 404"):
+            self.run_async(url, lambda c: c.chat(MESSAGES, model="m"), max_retries=2)
+        self.assertEqual(server.state.requests, 1)
+
+    def test_read_timeout(self):
+        server, url = self.start_stub(delay=0.5)
+        with self.assertRaisesMessage(LLMError, "ReadTimeout"):
+            self.run_async(url, lambda c: c.chat(MESSAGES, model="m"), read_timeout=0.1, max_retries=0)
+
+    def test_cancelled_trial_is_released(self):
+        server, url = self.start_stub(delay=0.5)
+        breaker = CircuitBreaker(failure_threshold=1, reset_after=0)
+        breaker.record_failure()
+
+        async def cancel_trial(client):
+            task = asyncio.create_task(client.chat(MESSAGES, model="m"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.run_async(url, cancel_trial, breaker=breaker)
+        self.assertTrue(breaker.allow())
+
+    def test_stream(self):
+        async def collect(client):
+            return [t async for t in client.chat_stream(MESSAGES, model="m")]
+
+        server, url = self.start_stub(reply="one two three")
+        self.assertEqual(self.run_async(url, collect), ["one ", "two ", "three "])
+
+        server.state.cut_stream_after = 1
+        with self.assertRaises(LLMIncompleteStreamError):
+            self.run_async(url, collect)
+
+
+class ContextTokenizerTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "tokenizer.json")
+        patcher = mock.patch.multiple(context, CONTEXT_TOKENIZER=self.path, _TOKENIZER=None,
+                                      _TOKENIZER_LOADED=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save_tokenizer(self):
+        from tokenizers import Tokenizer
+        from tokenizers.models import WordLevel
+        from tokenizers.pre_tokenizers import Whitespace
+
+        tokenizer = Tokenizer(WordLevel({"[UNK]": 0, "postpartum": 1}, unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = Whitespace()
+        tokenizer.save(self.path)
+
+    def test_measures_with_local_tokenizer(self):
+        self.save_tokenizer()
+        self.assertEqual(context.count_tokens("postpartum depression screening"), 3)
+
+    def test_missing_file_estimates_without_fetching(self):
+        with mock.patch("tokenizers.Tokenizer.from_pretrained") as from_pretrained:
+            self.assertEqual(context.count_tokens("postpartum depression screening"), 8)
+        from_pretrained.assert_not_called()
+
+    def test_fetch_saves_tokenizer_json_and_replaces_the_estimate(self):
+        self.assertIsNone(context._tokenizer())
+
+        def from_pretrained(hub_id):
+            self.assertEqual(hub_id, context.CONTEXT_TOKENIZER_HUB)
+            self.save_tokenizer()
+            from tokenizers import Tokenizer
+            return Tokenizer.from_file(self.path)
+
+        with mock.patch("tokenizers.Tokenizer.from_pretrained", side_effect=from_pretrained):
+            self.assertIsNotNone(context.load_tokenizer(fetch=True))
+        self.assertTrue(os.path.isfile(self.path))
+        self.assertEqual(context.count_tokens("postpartum depression screening"), 3)
+
+    def test_failed_fetch_falls_back_to_estimate(self):
+        with mock.patch("tokenizers.Tokenizer.from_pretrained", side_effect=OSError("offline")):
+            self.assertIsNone(context.load_tokenizer(fetch=True))
+        self.assertEqual(context.count_tokens("abcdefgh"), 2)
+
+
+class PartitionPdfTests(TestCase):
+    ROWS = 150
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(BASE_DIR=tmp.name, EMR_RAG_INGEST=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        start = datetime(2025, 3, 1, 8, tzinfo=dt_timezone.utc)
+        # bulk_create skips the signals, so nothing is scheduled in the background
+        DailyMoodCheckIn.objects.bulk_create(
+            DailyMoodCheckIn(
+                created_at=start + timedelta(hours=4 * i),
+                user_identifier="alice",
+                mood_rating=i % 10 + 1,
+                mood_description="Tired but okay " * (i % 5),
+                hours_of_sleep="4_5",
+                energy_level="low",
+                stress_level="calm",
+                intrusive_thoughts="no",
+                notes=f"Check-in {i}",
+            )
+            for i in range(self.ROWS)
+        )
+
+    def render(self):
+        path = pdf_generator.regenerate_partition_pdf(DailyMoodCheckIn, "alice", "2025-03")
+        self.assertTrue(path.endswith(".pdf"))
+        return PdfReader(path)
+
+    def test_multi_page_partition_matches_a_plain_reportlab_build(self):
+        pdf = self.render()
+        pages = len(pdf.pages)
+        self.assertGreater(pages, 30)
+        self.assertIn(f"Total Records: {self.ROWS}", pdf.pages[-1].extract_text())
+        self.assertIn(f"Record {self.ROWS} (ID:", pdf.pages[-1].extract_text())
+        self.assertNotIn("Total Records", pdf.pages[-2].extract_text())
+
+        # The same story laid out by stock ReportLab, with a plain list and canvas
+        with mock.patch.object(pdf_generator, "_FlowableStream", list), \
+                mock.patch.object(pdf_generator, "_CompressingCanvas", canvas.Canvas):
+            plain = self.render()
+        self.assertEqual(len(plain.pages), pages)
+        generated = re.compile(r"Generated: [\d:\- ]+")
+        for page, plain_page in zip(pdf.pages, plain.pages):
+            self.assertEqual(generated.sub("", page.extract_text()), generated.sub("", plain_page.extract_text()))
+
+
+RAG_RESULTS = [{"score": 0.9, "text": "Sleep when the baby sleeps.", "meta": {"source": "guide.pdf", "page": 3}}]
+
+
+class ChatViewTestMixin(StubServerMixin):
+    """Chat views answered by rag.llm_stub, with retrieval stubbed out"""
+
+    def setUp(self):
+        self.stub, url = self.start_stub(reply="Try to rest when the baby sleeps.")
+        for patcher in (
+            mock.patch.object(llm, "_client", LLMClient(url, "stub", max_retries=0)),
+            mock.patch.object(pipeline, "aretrieve", mock.AsyncMock(return_value=RAG_RESULTS)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def session_messages(self):
+        session = await self.async_client.asession()
+        return await session.aget(SESSION_KEY), await session.aget(LAST_SOURCES_KEY)
+
+
+class ChatViewTests(ChatViewTestMixin, TestCase):
+    async def test_post_saves_reply_and_redirects(self):
+        response = await self.async_client.post(reverse("chat"), {"message": "I can't sleep"})
+        self.assertRedirects(response, reverse("chat"), fetch_redirect_response=False)
+
+        chat_messages, sources = await self.session_messages()
+        self.assertEqual(chat_messages, [
+            {"role": "user", "content": "I can't sleep"},
+            {"role": "assistant", "content": "Try to rest when the baby sleeps."},
+        ])
+        self.assertEqual(sources, RAG_RESULTS)
+        self.assertEqual(self.stub.state.requests, 1)
+
+        response = await self.async_client.get(reverse("chat"))
+        self.assertContains(response, "Try to rest when the baby sleeps.")
+
+    async def test_empty_message_redirects_without_calling_llm(self):
+        response = await self.async_client.post(reverse("chat"), {"message": "  "})
+        self.assertRedirects(response, reverse("chat"), fetch_redirect_response=False)
+        self.assertEqual(self.stub.state.requests, 0)
+
+    async def test_llm_failure_renders_error(self):
+        self.stub.state.fail_status = 503
+        self.stub.state.fail_first = 1
+        response = await self.async_client.post(reverse("chat"), {"message": "I can't sleep"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "HTTP 503")
+
+        chat_messages, _ = await self.session_messages()
+        self.assertEqual(chat_messages, [{"role": "user", "content": "I can't sleep"}])
+
+
+class ChatStreamViewTests(ChatViewTestMixin, TestCase):
+    async def stream(self, message):
+        response = await self.async_client.post(reverse("chat_stream"), {"message": message})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = []
+        for block in body.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+    async def test_streams_tokens_then_done_and_saves_reply(self):
+        events = await self.stream("I can't sleep")
+        self.assertEqual([e for e, _ in events], ["token"] * 7 + ["done"])
+        reply = "".join(data["token"] for event, data in events if event == "token")
+        self.assertEqual(reply, "Try to rest when the baby sleeps. ")
+        self.assertEqual(events[-1][1], {"reply": reply})
+
+        chat_messages, sources = await self.session_messages()
+        self.assertEqual(chat_messages, [
+            {"role": "user", "content": "I can't sleep"},
+            {"role": "assistant", "content": reply},
+        ])
+        self.assertEqual(sources, RAG_RESULTS)
+
+    async def test_empty_message_is_rejected(self):
+        response = await self.async_client.post(reverse("chat_stream"), {"message": ""})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_llm_failure_sends_error_event(self):
+        self.stub.state.fail_status = 500
+        self.stub.state.fail_first = 1
+        events = await self.stream("I can't sleep")
+        self.assertEqual(events, [("error", {"error": mock.ANY})])
+        self.assertIn("HTTP 500", events[0][1]["error"])
+
+        chat_messages, _ = await self.session_messages()
+        self.assertEqual(chat_messages, [{"role": "user", "content": "I can't sleep"}])
+
+    async def test_cut_off_stream_sends_error_after_tokens(self):
+        self.stub.state.cut_stream_after = 2
+        events = await self.stream("I can't sleep")
+        self.assertEqual([e for e, _ in events], ["token", "token", "error"])
+
+        chat_messages, _ = await self.session_messages()
+        self.assertEqual(chat_messages, [{"role": "user", "content": "I can't sleep"}])
+
+
+class IngestQueueTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.queue = IngestQueue(os.path.join(tmp.name, JOBS_DB_NAME))
+
+    def test_enqueue_coalesces_pending_jobs(self):
+        first = self.queue.enqueue("ingest", {"incremental": True})
+        self.assertEqual(self.queue.enqueue("ingest", {"incremental": True}), first)
+        self.assertNotEqual(self.queue.enqueue("ingest", {"incremental": False}), first)
+
+        # Once it is running, a new request queues another pass
+        self.assertEqual(self.queue.claim()["id"], first)
+        self.assertNotEqual(self.queue.enqueue("ingest", {"incremental": True}), first)
+
+    def test_claim_runs_one_job_at_a_time(self):
+        first = self.queue.enqueue("ingest", {"incremental": True})
+        second = self.queue.enqueue("ingest", {"incremental": False})
+
+        job = self.queue.claim()
+        self.assertEqual((job["id"], job["kind"], job["params"]), (first, "ingest", {"incremental": True}))
+        self.assertEqual(self.queue.get(first)["status"], "running")
+        self.assertIsNone(self.queue.claim())
+
+        self.queue.finish(first, result={"files": 2, "chunks": 10})
+        done = self.queue.get(first)
+        self.assertEqual((done["status"], done["result"], done["error"]), ("done", {"files": 2, "chunks": 10}, None))
+
+        self.assertEqual(self.queue.claim()["id"], second)
+        self.queue.finish(second, error="ValueError: bad pdf")
+        failed = self.queue.get(second)
+        self.assertEqual((failed["status"], failed["error"]), ("failed", "ValueError: bad pdf"))
+        self.assertIsNone(self.queue.claim())
+
+    def test_stale_worker_is_replaced_and_its_job_reclaimed(self):
+        job_id = self.queue.enqueue("ingest")
+        self.assertTrue(self.queue.register_worker(1))
+        self.queue.claim()
+
+        # A second worker can't take over from a live one
+        self.assertFalse(self.queue.register_worker(2))
+        self.assertTrue(self.queue.worker_alive())
+
+        later = time.time() + WORKER_STALE_SECONDS + 1
+        with mock.patch("web.rag.worker.time.time", return_value=later):
+            self.assertFalse(self.queue.worker_alive())
+            self.assertTrue(self.queue.register_worker(2))
+            self.queue.requeue_running()
+            job = self.queue.claim()
+        self.assertEqual((job["id"], self.queue.get(job_id)["status"]), (job_id, "running"))
+
+        # The stale worker's heartbeat no longer touches the slot
+        self.queue.heartbeat(1)
+        self.queue.unregister_worker(1)
+        self.assertFalse(self.queue.register_worker(3))
+
+    def test_summary(self):
+        self.assertEqual(self.queue.summary(), {"counts": {}, "worker_alive": False, "last_finished": None})
+
+        done = self.queue.enqueue("ingest", {"incremental": True})
+        self.queue.claim()
+        self.queue.finish(done, result={"files": 1, "chunks": 4})
+        self.queue.enqueue("ingest", {"incremental": True})
+        self.queue.register_worker(1)
+
+        summary = self.queue.summary()
+        self.assertEqual(summary["counts"], {"done": 1, "pending": 1})
+        self.assertTrue(summary["worker_alive"])
+        self.assertEqual(summary["last_finished"]["id"], done)
+
+
+class IngestStatusViewTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.queue = IngestQueue(os.path.join(tmp.name, JOBS_DB_NAME))
+        patcher = mock.patch("web.views._ingest_queue", return_value=self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_summary(self):
+        self.queue.enqueue("ingest", {"incremental": True})
+        response = self.client.get(reverse("ingest_status"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"counts": {"pending": 1}, "worker_alive": False, "last_finished": None})
+
+    def test_job(self):
+        job_id = self.queue.enqueue("ingest", {"incremental": True})
+        self.queue.claim()
+        self.queue.finish(job_id, result={"files": 3, "chunks": 12})
+
+        job = self.client.get(reverse("ingest_status"), {"job": job_id}).json()
+        self.assertEqual((job["id"], job["status"], job["result"]), (job_id, "done", {"files": 3, "chunks": 12}))
+
+        self.assertEqual(self.client.get(reverse("ingest_status"), {"job": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("ingest_status"), {"job": job_id + 1}).status_code, 404)
@@ -12,4 +12,6 @@ urlpatterns = [
     path("history/", views.history, name="history"),  # /history/
     path("chat/", views.chat, name="chat"),  # /chat/
     path("chat/clear/", views.chat_clear, name="chat_clear"),  # /chat/clear/
+    path("chat/stream/", views.chat_stream, name="chat_stream"),  # /chat/stream/
+    path("chat/ingest-status/", views.ingest_status, name="ingest_status"),  # /chat/ingest-status/
 ]
\ No newline at end of file
@@ -1,17 +1,19 @@
 from io import BytesIO
 from datetime import datetime
 import os
-import subprocess
-import sys
 from django.conf import settings
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from .models import PostpartumQuestionnaire, DailyMoodCheckIn
+from .models import PostpartumQuestionnaire, DailyMoodCheckIn, DailyMoodRollup
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages as dj_messages
 import json
-from .rag.pipeline import generate_ai_reply
+from .rag.memory import abuild_history, forget
+from .rag.pipeline import agenerate_ai_reply, astream_ai_reply
+from .rag.worker import IngestQueue, ensure_worker, JOBS_DB_NAME
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -21,6 +23,10 @@ SESSION_KEY = "chat_messages"
 LAST_SOURCES_KEY = "last_rag_sources"
 
 
+def _ingest_queue():
+    return IngestQueue(os.path.join(settings.BASE_DIR, "web", "rag_index", JOBS_DB_NAME))
+
+
 
 def _save_chat_pdf(msgs):
     export_dir = os.path.join(settings.BASE_DIR, "web", "data", "pdfs")
@@ -90,30 +96,49 @@ def _set_messages(request, msgs):
     request.session.modified = True
 
 
+def _chat_state(request):
+    # First session access loads it from the DB, so async views call this via sync_to_async
+    return _get_messages(request), request.session.get(LAST_SOURCES_KEY, [])
+
+
+def _conversation_id(request):
+    # The session key names the conversation's summary in rag.memory; create it on first use
+    if request.session.session_key is None:
+        request.session.save()
+    return request.session.session_key
+
+
+def _export_chat(request, chat_messages):
+    try:
+        filename = _save_chat_pdf(chat_messages)
+        # Queue an incremental re-index for the background worker instead of blocking here
+        try:
+            queue = _ingest_queue()
+            job_id = queue.enqueue("ingest", {"incremental": True})
+            ensure_worker(queue, cwd=os.path.join(settings.BASE_DIR, "web"))
+            dj_messages.success(request, f"Exported PDF {filename} (index update queued, job {job_id})")
+        except Exception as e:
+            dj_messages.success(request, f"Exported PDF {filename}")
+            dj_messages.error(request, f"Could not queue index update: {str(e)}")
+    except Exception as e:
+        dj_messages.error(request, f"Export failed: {str(e)}")
+
+
 @require_http_methods(["GET", "POST"])
-def chat(request):
-    chat_messages = _get_messages(request)
+async def chat(request):
+    # Async so a request waiting on the LLM doesn't pin a worker thread under ASGI
+    chat_messages, sources = await sync_to_async(_chat_state)(request)
     error = None
-    sources = request.session.get(LAST_SOURCES_KEY, [])
 
     if request.method == "POST":
         action = (request.POST.get("action") or "").strip()
 
         # ✅ Export PDF (no redirect, stay on chat page)
         if action == "export_pdf":
-            try:
-                filename = _save_chat_pdf(chat_messages)
-                dj_messages.success(request, f"Exported PDF {filename}")
-                script_path = os.path.join(settings.BASE_DIR, "web", "rag", "ingest.py")
-                try:
-                    subprocess.run([sys.executable, script_path], capture_output=True,text=True)
-                except Exception as e:
-                    dj_messages.error(request, f"Something went wrong")
-            except Exception as e:
-                dj_messages.error(request, f"Export failed: {str(e)}")
+            await sync_to_async(_export_chat)(request, chat_messages)
 
             # render the same page (no redirect)
-            return render(request, "chat.html", {
+            return await sync_to_async(render)(request, "chat.html", {
                 "chat_messages": chat_messages,
                 "error": None,
                 "sources": sources,
@@ -128,10 +153,12 @@ def chat(request):
         _set_messages(request, chat_messages)
 
         try:
-            chat_history = [m for m in chat_messages if m["role"] in ("user", "assistant")]
-            reply, rag_results = generate_ai_reply(
+            # Summary + recalled + recent turns within a token cap, not the whole transcript
+            conversation_id = await sync_to_async(_conversation_id)(request)
+            chat_history = await abuild_history(conversation_id, chat_messages[:-1], user_text)
+            reply, rag_results = await agenerate_ai_reply(
                 user_text=user_text,
-                chat_history=chat_history[:-1],
+                chat_history=chat_history,
                 k=5
             )
             chat_messages.append({"role": "assistant", "content": reply})
@@ -145,14 +172,90 @@ def chat(request):
         except Exception as e:
             error = str(e)
 
-    return render(request, "chat.html", {
+    return await sync_to_async(render)(request, "chat.html", {
         "chat_messages": chat_messages,
         "error": error,
         "sources": sources,
     })
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_reply_events(request, tokens, chat_messages):
+    """
+    Relay LLM tokens as Server-Sent Events, then persist the full reply.
+    Async so ASGI servers flush each event instead of buffering the response.
+    """
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield _sse("token", {"token": token})
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+        return
+
+    reply = "".join(parts)
+    chat_messages.append({"role": "assistant", "content": reply})
+    request.session[SESSION_KEY] = chat_messages
+    # SessionMiddleware already saved before the body started streaming; save again with the reply
+    await sync_to_async(request.session.save)()
+    yield _sse("done", {"reply": reply})
+
+
+@require_http_methods(["POST"])
+async def chat_stream(request):
+    """Streaming chat endpoint: POST message=..., responds with text/event-stream (token/done/error events)"""
+    user_text = (request.POST.get("message") or "").strip()
+    if not user_text:
+        return JsonResponse({"error": "empty message"}, status=400)
+
+    chat_messages, _ = await sync_to_async(_chat_state)(request)
+    chat_messages.append({"role": "user", "content": user_text})
+    _set_messages(request, chat_messages)
+
+    try:
+        conversation_id = await sync_to_async(_conversation_id)(request)
+        chat_history = await abuild_history(conversation_id, chat_messages[:-1], user_text)
+        tokens, rag_results = await astream_ai_reply(
+            user_text=user_text,
+            chat_history=chat_history,
+            k=5
+        )
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=502)
+
+    request.session[LAST_SOURCES_KEY] = rag_results
+    request.session.modified = True
+
+    response = StreamingHttpResponse(
+        _stream_reply_events(request, tokens, chat_messages),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_http_methods(["GET"])
+def ingest_status(request):
+    """JSON status of the background ingest queue, or of one job with ?job=<id>"""
+    queue = _ingest_queue()
+    job_id = request.GET.get("job")
+    if job_id:
+        try:
+            job = queue.get(int(job_id))
+        except ValueError:
+            return JsonResponse({"error": "invalid job id"}, status=400)
+        if job is None:
+            return JsonResponse({"error": "job not found"}, status=404)
+        return JsonResponse(job)
+    return JsonResponse(queue.summary())
+
 @require_http_methods(["POST"])
 def chat_clear(request):
+    forget(request.session.session_key)
     request.session[SESSION_KEY] = []
     request.session[LAST_SOURCES_KEY] = []
     request.session.modified = True
@@ -254,46 +357,70 @@ def medication(request):
 
 def history(request):
     """Display mood statistics and trends"""
-    from datetime import datetime, timedelta
-    from django.db.models import Avg
-
-    # Get all questionnaires
-    questionnaires = PostpartumQuestionnaire.objects.all().order_by('-created_at')[:10]
+    from datetime import timedelta
+    from django.db.models import Max, Min, Q, Sum
+    from django.utils import timezone
 
-    # Get all daily check-ins
-    daily_checkins = DailyMoodCheckIn.objects.all().order_by('-created_at')[:30]
+    # Latest questionnaires and check-ins (evaluated once, reused below and in the template)
+    questionnaires = list(PostpartumQuestionnaire.objects.all().order_by('-created_at')[:10])
+    daily_checkins = list(DailyMoodCheckIn.objects.all().order_by('-created_at')[:30])
 
     # Get latest questionnaire for risk level
-    latest_questionnaire = questionnaires.first() if questionnaires.exists() else None
+    latest_questionnaire = questionnaires[0] if questionnaires else None
 
     # Calculate average mood if data exists
     avg_mood = None
-    if daily_checkins.exists():
-        total_mood = sum([checkin.mood_rating for checkin in daily_checkins])
-        avg_mood = round(total_mood / len(daily_checkins), 1)
+    if daily_checkins:
+        avg_mood = round(sum(c.mood_rating for c in daily_checkins) / len(daily_checkins), 1)
 
-    # Weekly data for charts (last 7 days)
-    today = datetime.now().date()
+    # Every chart comes from the precomputed per-user daily rollups of the last
+    # 4 weeks plus today, summed per day in SQL. Sums (not per-day averages) so
+    # week averages stay exact.
+    today = timezone.localdate()
     week_ago = today - timedelta(days=6)
-    weekly_checkins = DailyMoodCheckIn.objects.filter(
-        created_at__date__gte=week_ago
-    ).order_by('created_at')
+    month_ago = today - timedelta(days=28)
+    days = {
+        row['day']: row
+        for row in DailyMoodRollup.objects
+        .filter(day__gte=month_ago)
+        .order_by()
+        .values('day')
+        .annotate(n=Sum('checkin_count'), total=Sum('mood_total'), first_at=Min('first_at'), last_at=Max('last_at'))
+    }
+
+    # The rollups holding each week day's first check-in (sleep) and today's latest one (mood)
+    wanted = Q(pk__in=[])
+    for day, row in days.items():
+        if day >= week_ago:
+            wanted |= Q(day=day, first_at=row['first_at'])
+    if today in days:
+        wanted |= Q(day=today, last_at=days[today]['last_at'])
+    firsts, latest = {}, None
+    for rollup in DailyMoodRollup.objects.filter(wanted, day__gte=week_ago).only('day', 'first_at', 'first_sleep', 'last_at', 'last_mood'):
+        if rollup.first_at == days[rollup.day]['first_at']:
+            firsts[rollup.day] = rollup
+        if rollup.day == today and rollup.last_at == days[today]['last_at']:
+            latest = rollup
+
+    def window(first_day, last_day):
+        # Mean mood over [first_day, last_day], or None without check-ins
+        rows = [r for d, r in days.items() if first_day <= d <= last_day]
+        n = sum(r['n'] for r in rows)
+        return (sum(r['total'] for r in rows) / n) if n else None
+
+    week_days = [week_ago + timedelta(days=i) for i in range(7)]
 
+    # Weekly data for charts (last 7 days)
     weekly_chart_data = []
     day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
-    for i in range(7):
-        day = week_ago + timedelta(days=i)
-        day_checkins = [c for c in weekly_checkins if c.created_at.date() == day]
-
-        if day_checkins:
-            avg_mood_day = sum(c.mood_rating for c in day_checkins) / len(day_checkins)
-            sleep_val = day_checkins[0].get_hours_of_sleep_display() if day_checkins else ''
-
+    for day in week_days:
+        avg_mood_day = window(day, day)
+        if avg_mood_day is not None:
             weekly_chart_data.append({
                 'day': day_names[day.weekday()],
                 'mood': round(avg_mood_day, 1),
-                'sleep': sleep_val
+                'sleep': firsts[day].get_first_sleep_display() if day in firsts else ''
             })
         else:
             weekly_chart_data.append({
@@ -306,33 +433,19 @@ def history(request):
     monthly_chart_data = []
     for week_num in range(4):
         week_start = today - timedelta(days=(week_num + 1) * 7)
-        week_end = week_start + timedelta(days=6)
-
-        week_checkins = DailyMoodCheckIn.objects.filter(
-            created_at__date__gte=week_start,
-            created_at__date__lte=week_end
-        )
-
-        if week_checkins.exists():
-            avg = week_checkins.aggregate(Avg('mood_rating'))['mood_rating__avg']
-            monthly_chart_data.insert(0, {
-                'week': f'Week {4-week_num}',
-                'avg_mood': round(avg, 1) if avg else 0
-            })
-        else:
-            monthly_chart_data.insert(0, {
-                'week': f'Week {4-week_num}',
-                'avg_mood': 0
-            })
+        avg = window(week_start, week_start + timedelta(days=6))
+        monthly_chart_data.insert(0, {
+            'week': f'Week {4-week_num}',
+            'avg_mood': round(avg, 1) if avg else 0
+        })
 
     # Today's mood
-    today_checkin = DailyMoodCheckIn.objects.filter(created_at__date=today).first()
-    today_mood = today_checkin.mood_rating if today_checkin else None
+    today_mood = latest.last_mood if latest else None
 
     # Calculate weekly average
-    weekly_avg = None
-    if weekly_checkins.exists():
-        weekly_avg = round(sum(c.mood_rating for c in weekly_checkins) / len(weekly_checkins), 1)
+    weekly_avg = window(week_ago, today)
+    if weekly_avg is not None:
+        weekly_avg = round(weekly_avg, 1)
 
     # Mood trend
     mood_trend = "No data"
@@ -375,7 +488,9 @@ def daily_checkin(request):
                 intrusive_thoughts=request.POST.get('intrusive_thoughts'),
                 notes=request.POST.get('notes', '')
             )
-            checkin.save()
+            # The row and its daily rollup update (post_save) commit together
+            with transaction.atomic():
+                checkin.save()
 
             messages.success(request, 'Thank you for checking in today! Your data has been saved.')
             return redirect('history')